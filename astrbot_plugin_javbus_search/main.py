@@ -1,3 +1,5 @@
+import asyncio
+from pathlib import Path
 import random
 import re
 from typing import AsyncGenerator, Any, List, Optional, Dict, Coroutine
@@ -7,9 +9,11 @@ from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger, AstrBotConfig
 import astrbot.api.message_components as comp
+from astrbot.core.utils.astrbot_path import get_astrbot_data_path
 
 
 from .utils.translate import BaiduTranslator
+from .utils.movie_index import MovieIndex
 
 
 @register("JavBus Serach", "cloudcranesss", "一个基于JavBus API的搜索服务", "v1.0.1",
@@ -24,13 +28,70 @@ class JavBusSerach(Star):
         self.baidu_api_key = config.get("baidu_api_key", "")
         self.baidu_secret_key = config.get("baidu_secret_key", "")
         self.qq_access_token = config.get("qq_access_token", "")
+        self.enable_local_index = config.get("enable_local_index", False)
+        self.local_index_ttl = config.get("local_index_ttl", 24)
+        self.enable_index_crawler = config.get("enable_index_crawler", False)
+        self.index_crawler_pages = config.get("index_crawler_pages", 5)
+        self.index_crawler_interval = config.get("index_crawler_interval", 360)
         logger.info(
             f"初始化JavBus搜索插件，API地址: {self.javbus_api_url}\n"
             f"转发地址配置: {'已配置' if self.forward_url else '未配置'}\n"
-            f"JavBus 图片代理地址: {self.javbus_image_proxy}")
-        self.api = JavBusAPI(self.javbus_api_url)
+            f"JavBus 图片代理地址: {self.javbus_image_proxy}\n"
+            f"本地索引: {'已启用' if self.enable_local_index else '未启用'}")
+
+        # 本地影片索引（可选）
+        self.index: Optional[MovieIndex] = None
+        if self.enable_local_index:
+            db_path = Path(get_astrbot_data_path()) / "plugin_data" / "astrbot_plugin_javbus_search" / "movie_index.db"
+            self.index = MovieIndex(db_path, ttl=int(self.local_index_ttl) * 3600)
+        self.crawler_task: Optional[asyncio.Task] = None
+
+        self.api = JavBusAPI(self.javbus_api_url, index=self.index)
         self.trans = BaiduTranslator(self.baidu_api_key, self.baidu_secret_key)
 
+    @filter.on_astrbot_loaded()
+    async def on_start(self):
+        """AstrBot 加载完成后打开本地索引并启动索引爬取任务"""
+        if self.index:
+            # 在线程池中建表和迁移，不阻塞插件加载；失败时首次使用索引时重试
+            try:
+                await self.index.open()
+            except Exception as e:
+                logger.error(f"本地索引打开失败: {str(e)}")
+        if self.index and self.enable_index_crawler:
+            logger.info(f"启动本地索引爬取任务，每轮 {self.index_crawler_pages} 页，间隔 {self.index_crawler_interval} 分钟")
+            self.crawler_task = asyncio.create_task(self._crawl_movies())
+
+    async def terminate(self):
+        """插件卸载时停止爬取任务并释放资源"""
+        if self.crawler_task:
+            self.crawler_task.cancel()
+            self.crawler_task = None
+        await self.api.close()
+        if self.index:
+            self.index.close()
+            self.index = None
+        logger.info("JavBus搜索插件已清理")
+
+    async def _crawl_movies(self):
+        """后台按页拉取最新影片列表，写入本地索引"""
+        while True:
+            for page in range(1, int(self.index_crawler_pages) + 1):
+                try:
+                    # get_movies 会自动将响应写入索引
+                    datas = await self.api.get_movies(page=page)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"索引爬取第 {page} 页失败: {str(e)}")
+                    break
+                if not datas.get("pagination", {}).get("hasNextPage", True):
+                    break
+                # 放缓请求节奏，避免给 API 带来压力
+                await asyncio.sleep(random.uniform(1, 3))
+            logger.info("本地索引爬取完成一轮")
+            await asyncio.sleep(int(self.index_crawler_interval) * 60)
+
 
     async def send_reply(
             self,
@@ -147,8 +208,12 @@ class JavBusSerach(Star):
 
             logger.info(f"用户 {event.get_sender_id()} 在群组 {event.get_group_id()} 搜索影片: {keyword}")
 
-            logger.info(f"开始调用搜索API，关键词: {keyword}")
-            datas = await self.api.search_movies(keyword=keyword)
+            datas = None
+            if self.index:
+                datas = await self.index.search(keyword)
+            if datas is None:
+                logger.info(f"开始调用搜索API，关键词: {keyword}")
+                datas = await self.api.search_movies(keyword=keyword)
             logger.info(f"搜索完成，找到 {len(datas.get('movies', []))} 个结果")
 
             if not datas.get("movies"):
@@ -337,8 +402,10 @@ class JavBusSerach(Star):
 
 
 class JavBusAPI:
-    def __init__(self, base_url: str = None):
+    def __init__(self, base_url: str = None, index: Optional[MovieIndex] = None):
         self.base_url = base_url.rstrip('/') if base_url else ""
+        # 可选的本地索引，影片列表响应会增量写入
+        self.index = index
         logger.info(f"JavBus API初始化成功，基础URL为：{self.base_url}")
         
         # 默认headers
@@ -405,7 +472,10 @@ class JavBusAPI:
             })
 
         url = f"{self.base_url}/api/movies"
-        return await self._request(url, params)
+        data = await self._request(url, params)
+        if self.index:
+            await self.index.add_movies(data.get("movies", []))
+        return data
 
     async def search_movies(
             self,
@@ -422,7 +492,13 @@ class JavBusAPI:
         }
 
         url = f"{self.base_url}/api/movies/search"
-        return await self._request(url, params)
+        data = await self._request(url, params)
+        if self.index:
+            await self.index.add_movies(data.get("movies", []))
+            # 只有与搜关键词相同参数的请求才能代表该关键词的搜索结果
+            if page == 1 and magnet == "exist" and movie_type == "normal":
+                await self.index.record_search(keyword)
+        return data
 
     async def get_movie_detail(self, movie_id: str) -> Dict[str, Any]:
         url = f"{self.base_url}/api/movies/{movie_id}"
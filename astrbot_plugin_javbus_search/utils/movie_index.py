@@ -0,0 +1,264 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+from astrbot.core import logger
+
+
+class MovieIndex():
+    """
+    本地影片全文索引
+
+    功能:
+    - 基于 SQLite FTS5 (trigram 分词) 的关键词检索，与搜索 API 一致只匹配番号和标题的子串
+    - 由 get_movies / search_movies 的响应增量写入
+    - 只回答有效期内通过 search_movies 请求过的关键词；爬取的列表页无法完整覆盖任何关键词，
+      未请求过或已过期的关键词由调用方回源 API
+
+    若当前 SQLite 不支持 FTS5/trigram，则退化为 LIKE 查询。
+
+    数据库在首次使用或调用 open() 时于线程池中打开，建表和重建检索文本不会阻塞事件循环。
+
+    使用示例:
+    index = MovieIndex("movie_index.db", ttl=86400)
+    await index.open()
+    await index.add_movies(datas["movies"])
+    await index.record_search("ABP")
+    result = await index.search("ABP")
+    """
+
+    # trigram 分词器至少需要 3 个字符才能命中
+    MIN_FTS_LENGTH = 3
+    # 检索文本的格式版本，变化时重建已有条目的检索文本
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path: Union[str, Path], ttl: int = 86400, limit: int = 30):
+        """初始化索引
+
+        Args:
+            db_path: 数据库文件路径
+            ttl: 数据有效期（秒），超过该时间的条目视为过期
+            limit: 单次查询返回的最大条目数
+        """
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.limit = limit
+        self.fts_enabled = False
+
+        # sqlite 连接在线程池中使用，需要加锁串行化
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._open_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def open(self):
+        """在线程池中打开数据库并建表，并发调用共享同一次初始化，失败时下次调用重试"""
+        if self._conn is not None:
+            return
+        if self._closed:
+            raise sqlite3.ProgrammingError("本地索引已关闭")
+        task = self._open_task
+        if task is None or (task.done() and (task.cancelled() or task.exception())):
+            self._open_task = asyncio.create_task(asyncio.to_thread(self._open_sync))
+        await asyncio.shield(self._open_task)
+
+    def _open_sync(self):
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            # 目录无法创建时由 sqlite3.connect 抛出 sqlite3.Error，与其他数据库错误一起处理
+            logger.warning(f"创建本地索引目录失败: {str(e)}")
+        with self._lock:
+            if self._closed:
+                return
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn = conn
+                self.fts_enabled = self._init_schema()
+            except Exception:
+                self._conn = None
+                conn.close()
+                raise
+        logger.info(f"本地影片索引初始化完成: {self.db_path}，全文检索: {'启用' if self.fts_enabled else '不可用，使用LIKE'}")
+
+    def _init_schema(self) -> bool:
+        """建表，返回是否支持全文检索"""
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS movies ("
+                "id INTEGER PRIMARY KEY, "
+                "movie_id TEXT NOT NULL UNIQUE, "
+                "content TEXT NOT NULL, "
+                "date TEXT, "
+                "data TEXT NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            # 通过搜索 API 请求过的关键词及请求时间
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                "keyword TEXT PRIMARY KEY, "
+                "fetched_at REAL NOT NULL)"
+            )
+        try:
+            with self._conn:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts "
+                    "USING fts5(content, tokenize='trigram')"
+                )
+            fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite 不支持 FTS5 trigram 分词: {str(e)}")
+            fts_enabled = False
+
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            self._rebuild_content(fts_enabled)
+        return fts_enabled
+
+    def _rebuild_content(self, fts_enabled: bool):
+        """按当前格式重建已有条目的检索文本"""
+        with self._conn:
+            rows = self._conn.execute("SELECT id, data FROM movies").fetchall()
+            for row_id, data in rows:
+                content = self._build_content(json.loads(data))
+                self._conn.execute("UPDATE movies SET content = ? WHERE id = ?", (content, row_id))
+                if fts_enabled:
+                    self._conn.execute("DELETE FROM movies_fts WHERE rowid = ?", (row_id,))
+                    self._conn.execute("INSERT INTO movies_fts (rowid, content) VALUES (?, ?)", (row_id, content))
+            self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        if rows:
+            logger.info(f"本地索引已重建 {len(rows)} 条影片的检索文本")
+
+    @staticmethod
+    def _build_content(movie: Dict[str, Any]) -> str:
+        """拼接用于检索的文本：番号、标题，与搜索 API 的匹配范围一致"""
+        parts = [str(movie.get("id", "")), str(movie.get("title", ""))]
+        return " ".join(p for p in parts if p)
+
+    @staticmethod
+    def _normalize(keyword: str) -> str:
+        """关键词的统一形式，trigram 与 LIKE 查询均不区分大小写"""
+        return keyword.strip().lower()
+
+    def _add_movies_sync(self, movies: List[Dict[str, Any]]) -> int:
+        now = time.time()
+        count = 0
+        with self._lock, self._conn:
+            for movie in movies:
+                movie_id = movie.get("id") if isinstance(movie, dict) else None
+                if not movie_id:
+                    continue
+                content = self._build_content(movie)
+                self._conn.execute(
+                    "INSERT INTO movies (movie_id, content, date, data, updated_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(movie_id) DO UPDATE SET content=excluded.content, date=excluded.date, "
+                    "data=excluded.data, updated_at=excluded.updated_at",
+                    (movie_id, content, movie.get("date", ""), json.dumps(movie, ensure_ascii=False), now)
+                )
+                row = self._conn.execute("SELECT id FROM movies WHERE movie_id = ?", (movie_id,)).fetchone()
+                if self.fts_enabled:
+                    self._conn.execute("DELETE FROM movies_fts WHERE rowid = ?", (row[0],))
+                    self._conn.execute("INSERT INTO movies_fts (rowid, content) VALUES (?, ?)", (row[0], content))
+                count += 1
+        return count
+
+    def _record_search_sync(self, keyword: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO searches (keyword, fetched_at) VALUES (?, ?) "
+                "ON CONFLICT(keyword) DO UPDATE SET fetched_at=excluded.fetched_at",
+                (keyword, time.time())
+            )
+
+    def _fetched_at_sync(self, keyword: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT fetched_at FROM searches WHERE keyword = ?", (keyword,)).fetchone()
+        return row[0] if row else None
+
+    def _search_sync(self, keyword: str) -> List[tuple]:
+        with self._lock:
+            if self.fts_enabled and len(keyword) >= self.MIN_FTS_LENGTH:
+                # 以短语形式查询，避免关键词中的特殊字符被解析为 FTS 语法
+                phrase = '"' + keyword.replace('"', '""') + '"'
+                return self._conn.execute(
+                    "SELECT m.data, m.updated_at FROM movies_fts f JOIN movies m ON m.id = f.rowid "
+                    "WHERE movies_fts MATCH ? ORDER BY m.date DESC LIMIT ?",
+                    (phrase, self.limit)
+                ).fetchall()
+
+            pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            return self._conn.execute(
+                "SELECT data, updated_at FROM movies WHERE content LIKE ? ESCAPE '\\' "
+                "ORDER BY date DESC LIMIT ?",
+                (pattern, self.limit)
+            ).fetchall()
+
+    async def add_movies(self, movies: List[Dict[str, Any]]) -> int:
+        """写入或更新影片，返回写入条数"""
+        if not movies:
+            return 0
+        try:
+            await self.open()
+            count = await asyncio.to_thread(self._add_movies_sync, movies)
+            logger.debug(f"本地索引写入 {count} 条影片")
+            return count
+        except sqlite3.Error as e:
+            logger.error(f"本地索引写入失败: {str(e)}")
+            return 0
+
+    async def record_search(self, keyword: str):
+        """记录关键词已通过搜索 API 请求，有效期内的同一关键词可由本地索引回答"""
+        keyword = self._normalize(keyword)
+        if not keyword:
+            return
+        try:
+            await self.open()
+            await asyncio.to_thread(self._record_search_sync, keyword)
+        except sqlite3.Error as e:
+            logger.error(f"本地索引记录搜索失败: {str(e)}")
+
+    async def search(self, keyword: str) -> Optional[Dict[str, Any]]:
+        """本地检索关键词
+
+        Args:
+            keyword: 搜索关键词
+
+        Returns:
+            与 search_movies 响应结构一致的字典；关键词未通过 API 请求过或已过期时返回None
+        """
+        keyword = self._normalize(keyword)
+        if not keyword:
+            return None
+
+        start_time = time.perf_counter()
+        try:
+            await self.open()
+            fetched_at = await asyncio.to_thread(self._fetched_at_sync, keyword)
+            if fetched_at is None:
+                logger.info(f"本地索引未收录关键词: {keyword}，将回源API")
+                return None
+            if time.time() - fetched_at > self.ttl:
+                logger.info(f"本地索引关键词已过期: {keyword}，将回源API")
+                return None
+            rows = await asyncio.to_thread(self._search_sync, keyword)
+        except sqlite3.Error as e:
+            logger.error(f"本地索引查询失败: {str(e)}")
+            return None
+        elapsed = (time.perf_counter() - start_time) * 1000
+
+        logger.info(f"本地索引命中: {keyword}，{len(rows)} 条结果，耗时 {elapsed:.2f}ms")
+        return {"movies": [json.loads(data) for data, _ in rows]}
+
+    def close(self):
+        """关闭数据库连接"""
+        if self._open_task is not None and not self._open_task.done():
+            self._open_task.cancel()
+        with self._lock:
+            self._closed = True
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,44 +1,177 @@
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
-from astrbot.api import logger
+from astrbot.api import logger, AstrBotConfig
 import aiohttp
+import asyncio
 import re
+import time
 
 @register("astrbot_plugin_jm_domain", "cloudcranesss", "检测JM国内域名", "v1.0", "https://github.com/cloudcranesss/astrbot_plugins")
 class JMDomain(Star):
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, config: AstrBotConfig = None):
         super().__init__(context)
-        self.target_url = "https://jmcomicne.net/"
+        self.config = config or {}
+        # 发布页镜像，并发访问并采用最先解析成功的结果
+        self.target_urls = self.config.get("target_urls") or [
+            "https://jmcomicne.net/",
+            "https://jmcomic1.bet/",
+            "https://jmcomic.me/"
+        ]
         # 匹配规则：查找"国内域名"附近的链接
         # 匹配规则：查找 class="china" 后的链接
         # HTML示例: <div class="china"><span>https://jm18c-oec.cc</span></div>
         self.pattern = re.compile(r'class=["\']china["\'].*?(https?://[\w.-]+)', re.DOTALL | re.IGNORECASE)
 
+        # 域名缓存：过期后仍先返回旧值，同时在后台刷新
+        self.cache_ttl = int(self.config.get("cache_ttl", 600))
+        self.cached_domain = None
+        self.fetched_at = 0
+        self.refresh_task = None
+        self.session = None
+        # 各发布页最近一次的访问延迟与状态，以及提供当前缓存域名的发布页
+        self.mirror_stats = {}
+        self.source_url = None
+        self.source_latency = 0.0
+
+    @filter.on_astrbot_loaded()
+    async def on_start(self):
+        """AstrBot 加载完成后预热缓存"""
+        self._trigger_refresh()
+
+    async def terminate(self):
+        """插件卸载时取消刷新任务并关闭会话"""
+        if self.refresh_task and not self.refresh_task.done():
+            self.refresh_task.cancel()
+        if self.session and not self.session.closed:
+            await self.session.close()
+
     @filter.command("jm")
     async def check_jm_domain(self, event: AstrMessageEvent):
         """获取JM最新的国内域名"""
+        # 有缓存时立即返回，过期则在后台刷新
+        if self.cached_domain:
+            age = time.monotonic() - self.fetched_at
+            if age >= self.cache_ttl:
+                self._trigger_refresh()
+            yield event.plain_result(
+                f"✅ 检测成功！\n目前最新的国内域名为：\n{self.cached_domain}\n(更新于 {int(age // 60)} 分钟前)"
+                f"{self._format_source()}"
+            )
+            return
+
         yield event.plain_result("正在检测最新的国内域名，请稍候...")
-        
+
         try:
-            async with aiohttp.ClientSession() as session:
-                # 设置User-Agent避免被简单的反爬拦截
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                }
-                async with session.get(self.target_url, headers=headers, timeout=10) as resp:
-                    if resp.status != 200:
-                        yield event.plain_result(f"无法访问发布页，状态码: {resp.status}")
-                        return
-                    
-                    html = await resp.text()
-                    match = self.pattern.search(html)
-                    
-                    if match:
-                        domain = match.group(1)
-                        yield event.plain_result(f"✅ 检测成功！\n目前最新的国内域名为：\n{domain}")
-                    else:
-                        yield event.plain_result("⚠️ 未能在页面中找到国内域名信息，请检查发布页结构是否变更。")
-                        
+            domain = await self._refresh()
+            if domain:
+                yield event.plain_result(f"✅ 检测成功！\n目前最新的国内域名为：\n{domain}{self._format_source()}")
+            else:
+                yield event.plain_result("⚠️ 未能在页面中找到国内域名信息，请检查发布页结构是否变更。")
+
         except Exception as e:
             logger.error(f"JM插件出错: {e}")
             yield event.plain_result(f"❌ 检测过程中发生错误: {str(e)}")
+
+    @filter.command("jm_stats")
+    async def mirror_stats_command(self, event: AstrMessageEvent):
+        """查看各发布页最近一次的访问延迟与状态"""
+        lines = ["📊 发布页状态 (最近一次检测):"]
+        for url in self.target_urls:
+            stats = self.mirror_stats.get(url)
+            if stats is None:
+                # 其他发布页先返回结果时，较慢的请求会被取消
+                lines.append(f"⚪ {url}: 未完成")
+            elif stats["ok"]:
+                source = " (当前来源)" if url == self.source_url else ""
+                lines.append(f"🟢 {url}: {stats['latency'] * 1000:.0f}ms{source}")
+            else:
+                lines.append(f"🔴 {url}: {stats['latency'] * 1000:.0f}ms，{stats['error']}")
+        yield event.plain_result("\n".join(lines))
+
+    def _format_source(self):
+        """提供当前域名的发布页及其响应耗时"""
+        if not self.source_url:
+            return ""
+        return f"\n来源: {self.source_url} ({self.source_latency * 1000:.0f}ms)"
+
+    def _trigger_refresh(self):
+        """在后台刷新缓存，已有刷新任务时不重复启动"""
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._do_refresh())
+            self.refresh_task.add_done_callback(self._on_refresh_done)
+
+    def _on_refresh_done(self, task):
+        if not task.cancelled() and task.exception():
+            # 刷新失败时保留上次成功的结果
+            logger.warning(f"JM域名后台刷新失败，继续使用缓存: {task.exception()}")
+
+    async def _refresh(self):
+        """刷新缓存并返回最新域名，并发调用共享同一次请求"""
+        self._trigger_refresh()
+        return await asyncio.shield(self.refresh_task)
+
+    async def _do_refresh(self):
+        # 每次刷新重新记录各发布页的状态，被取消的较慢请求显示为未完成
+        self.mirror_stats = {}
+        url, domain = await self._fetch_domain()
+        if domain:
+            self.source_url = url
+            self.source_latency = self.mirror_stats[url]["latency"]
+            self.cached_domain = domain
+            self.fetched_at = time.monotonic()
+            logger.info(f"JM域名缓存已更新: {domain}")
+        return domain
+
+    async def _fetch_domain(self):
+        """并发访问所有发布页，返回最先解析到的国内域名并取消其余请求
+
+        返回 (发布页, 域名)，所有发布页均可访问但未找到域名时域名为None，全部访问失败时抛出异常
+        """
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+
+        tasks = [asyncio.create_task(self._fetch_from(url)) for url in self.target_urls]
+        errors = []
+        try:
+            for future in asyncio.as_completed(tasks):
+                try:
+                    url, domain = await future
+                except Exception as e:
+                    errors.append(str(e))
+                    continue
+                if domain:
+                    logger.info(f"从发布页 {url} 获取到域名: {domain}")
+                    return url, domain
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if len(errors) == len(tasks):
+            raise Exception("；".join(errors))
+        return None, None
+
+    async def _fetch_from(self, url):
+        """访问单个发布页并解析国内域名，记录访问延迟"""
+        # 设置User-Agent避免被简单的反爬拦截
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        }
+        start = time.perf_counter()
+        try:
+            async with self.session.get(url, headers=headers, timeout=10) as resp:
+                if resp.status != 200:
+                    raise Exception(f"无法访问发布页 {url}，状态码: {resp.status}")
+
+                html = await resp.text()
+                match = self.pattern.search(html)
+                domain = match.group(1) if match else None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.mirror_stats[url] = {"latency": time.perf_counter() - start, "ok": False, "error": str(e)}
+            raise
+
+        latency = time.perf_counter() - start
+        self.mirror_stats[url] = {"latency": latency, "ok": bool(domain), "error": None if domain else "未找到域名"}
+        logger.debug(f"发布页 {url} 响应耗时 {latency * 1000:.0f}ms")
+        return url, domain
@@ -0,0 +1,320 @@
+"""本地模拟 JM 站点及批量签到压测
+
+在 AstrBot 环境中于仓库根目录运行:
+    python -m astrbot_plugin_jm_sign.benchmark --accounts 1000
+
+模拟站点包含发布页、/login、/ajax/user_daily_sign 和 /user，
+可配置延迟、失败率和用户页 HTML 结构，压测结束后输出总耗时、每账号请求数和内存峰值。
+模拟站点与插件运行在同一事件循环中，耗时包含模拟站点自身的开销。
+
+对比 /user 页面新旧两种解析方式读取的字节数、CPU 耗时和内存峰值 (使用 fixtures/user_page.html):
+    python -m astrbot_plugin_jm_sign.benchmark --extractor
+"""
+import argparse
+import asyncio
+import atexit
+import codecs
+import os
+import re
+import random
+import secrets
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+from aiohttp import web
+
+# AstrBot 导入时会在根目录 (默认为当前目录) 下创建 data 目录，压测时指向临时目录
+if "ASTRBOT_ROOT" not in os.environ:
+    os.environ["ASTRBOT_ROOT"] = tempfile.mkdtemp(prefix="jmsign_bench_")
+    atexit.register(shutil.rmtree, os.environ["ASTRBOT_ROOT"], True)
+
+from . import main as plugin_main
+from .main import JMSign
+from .user_info import UserInfoExtractor
+
+
+USER_PAGE_FIXTURE = Path(__file__).parent / "fixtures" / "user_page.html"
+
+LOGIN_PAGE = '<html><body><form action="/login" method="post"><input name="username"></form></body></html>'
+
+USER_HEADER = (
+    '<div class="header-right-username">@{name}</div>\n'
+    '<div class="header-profile-row-value"> 8 <span class="header-profile-exp">(18603/28350)</span> </div>\n'
+    '<div class="header-profile-row-name">等级</div>\n'
+    '<div class="header-profile-row-value">1,200</div>\n'
+    '<div class="header-profile-row-name">可收藏数</div>\n'
+    '<div class="header-profile-row-value">23262</div>\n'
+    '<div class="header-profile-row-name">J Coins</div>\n'
+    '<div class="header-profile-row-value user-current-title"> 蕴含的太阳 <!-- title -->\n'
+)
+
+
+class FakeJMSite:
+    """模拟的 JM 发布页与镜像站
+
+    latency: 每个请求的平均延迟 (秒)，实际延迟在 0.5 ~ 1.5 倍之间抖动
+    failure_rate: 镜像站请求返回 503 的概率
+    html_variant: /user 页面结构，top (资料在页首)、bottom (资料在大段内容之后)、missing (无资料)
+    mirrors: 镜像站数量，dead_first 为 True 时发布页中的第一个镜像站无法连接
+    """
+
+    def __init__(self, latency=0.02, failure_rate=0.0, html_variant="top", mirrors=2, dead_first=False):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.html_variant = html_variant
+        self.mirrors = mirrors
+        self.dead_first = dead_first
+
+        self.requests = Counter()
+        self.sessions = {}
+        self.signed = set()
+        self.publish_url = ""
+        self.mirror_urls = []
+        self._runners = []
+
+    async def start(self, host="127.0.0.1"):
+        publish = web.Application()
+        publish.router.add_get("/", self.handle_publish)
+        self.publish_url = await self._serve(publish, host) + "/"
+
+        for _ in range(self.mirrors):
+            mirror = web.Application()
+            mirror.router.add_get("/", self.handle_index)
+            mirror.router.add_post("/login", self.handle_login)
+            mirror.router.add_post("/ajax/user_daily_sign", self.handle_sign)
+            mirror.router.add_get("/user", self.handle_user)
+            self.mirror_urls.append(await self._serve(mirror, host))
+
+        if self.dead_first:
+            # 发布页列出一个无人监听的端口
+            runner = self._runners.pop()
+            await runner.cleanup()
+            self.mirror_urls.insert(0, self.mirror_urls.pop())
+
+    async def _serve(self, app, host):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, 0)
+        await site.start()
+        self._runners.append(runner)
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners.clear()
+
+    async def _simulate(self, request):
+        self.requests[request.path] += 1
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        if request.path != "/" and random.random() < self.failure_rate:
+            raise web.HTTPServiceUnavailable()
+
+    def _user(self, request):
+        return self.sessions.get(request.cookies.get("AVS"))
+
+    async def handle_publish(self, request):
+        self.requests["publish"] += 1
+        links = "".join(f'<div class="china"><span>{url}</span></div>' for url in self.mirror_urls)
+        return web.Response(text=f"<html><body>{links}</body></html>", content_type="text/html")
+
+    async def handle_index(self, request):
+        await self._simulate(request)
+        return web.Response(text="ok")
+
+    async def handle_login(self, request):
+        await self._simulate(request)
+        form = await request.post()
+        if not form.get("username") or not form.get("password"):
+            return web.Response(text=LOGIN_PAGE, content_type="text/html")
+        token = secrets.token_hex(16)
+        self.sessions[token] = form["username"]
+        response = web.Response(text="ok")
+        response.set_cookie("AVS", token, max_age=86400)
+        return response
+
+    async def handle_sign(self, request):
+        await self._simulate(request)
+        user = self._user(request)
+        if not user:
+            return web.Response(text=LOGIN_PAGE, content_type="text/html")
+        key = (user, date.today())
+        if key in self.signed:
+            return web.json_response({"msg": "", "error": "finished"})
+        self.signed.add(key)
+        return web.json_response({"msg": "", "error": ""})
+
+    async def handle_user(self, request):
+        await self._simulate(request)
+        user = self._user(request)
+        if not user:
+            return web.Response(text=LOGIN_PAGE, content_type="text/html")
+        filler = '<div class="comic-item"><a href="/album/1">album</a></div>\n' * 3000
+        header = USER_HEADER.format(name=user) if self.html_variant != "missing" else ""
+        if self.html_variant == "bottom":
+            body = filler + header
+        else:
+            body = header + filler
+        return web.Response(text=f"<html><body>{body}</body></html>", content_type="text/html")
+
+
+def build_user_page(repeat=10, header_position="top"):
+    """以 fixture 为基础生成 /user 页面，收藏列表重复 repeat 次，header_position 为 bottom 时资料移到页尾"""
+    html = USER_PAGE_FIXTURE.read_text(encoding="utf-8")
+    head, rest = html.split("<!-- album-list -->", 1)
+    albums, tail = rest.split("<!-- /album-list -->", 1)
+    html = head + albums * repeat + tail
+    if header_position == "bottom":
+        start, end = html.index("<!-- header-profile -->"), html.index("<!-- /header-profile -->")
+        header = html[start:end]
+        html = html[:start] + html[end:]
+        html = html.replace("</body>", header + "</body>")
+    return html.encode("utf-8")
+
+
+def iter_chunks(data, size=8192):
+    """模拟 resp.content.iter_chunked"""
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def legacy_user_info(data):
+    """旧的解析方式：读取完整页面后逐个字段正则匹配，返回 (读取字节数, 字段)"""
+    html = b"".join(iter_chunks(data)).decode("utf-8", errors="replace")
+    info = {}
+    name_match = re.search(r'class="header-right-username">@?(.*?)<', html)
+    if name_match:
+        info['name'] = name_match.group(1).strip()
+    level_match = re.search(r'(\d+)\s*<span class="header-profile-exp">\((.*?)\)</span>[\s\S]*?等级', html)
+    if level_match:
+        info['level'] = level_match.group(1)
+        info['exp'] = level_match.group(2)
+    fav_match = re.search(r'>([\d,]+)</div>\s*<div class="header-profile-row-name">.*?可收藏数', html)
+    if fav_match:
+        info['fav_count'] = fav_match.group(1)
+    if 'exp' in info:
+        info['exp_percent'] = info['exp']
+    jcoins_idx = html.find("J Coins")
+    if jcoins_idx != -1:
+        snippet = html[max(0, jcoins_idx - 500):jcoins_idx]
+        matches = re.findall(r'class="header-profile-row-value">\s*([\d,]+)\s*</div>', snippet)
+        if matches:
+            info['coins'] = matches[-1]
+    title_match = re.search(r'class="header-profile-row-value user-current-title">\s*(.*?)\s*<!--', html)
+    if title_match:
+        info['title'] = title_match.group(1).strip()
+    return len(data), info
+
+
+def streaming_user_info(data):
+    """当前的解析方式：分块增量解析，字段全部找到后停止读取，返回 (读取字节数, 字段)"""
+    extractor = UserInfoExtractor()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in iter_chunks(data):
+        if extractor.feed(decoder.decode(chunk), len(chunk)):
+            break
+    return extractor.bytes_read, extractor.info
+
+
+def run_extractor(args):
+    data = build_user_page(args.page_repeat, args.header_position)
+    print(f"=== /user 页面 {len(data) / 1024:.0f} KiB，资料位于{'页首' if args.header_position == 'top' else '页尾'}，"
+          f"每种方式执行 {args.iterations} 次 ===")
+    results = {}
+    for name, extract in (("legacy", legacy_user_info), ("current", streaming_user_info)):
+        bytes_read, info = extract(data)
+        start = time.process_time()
+        for _ in range(args.iterations):
+            extract(data)
+        cpu = (time.process_time() - start) / args.iterations
+        tracemalloc.start()
+        extract(data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = info
+        print(f"{name:8s} 读取 {bytes_read / 1024:7.1f} KiB  CPU {cpu * 1000:6.3f} ms  内存峰值 {peak / 1024:7.1f} KiB  "
+              f"字段 {len(info)}")
+    print(f"解析结果一致: {results['legacy'] == results['current']}")
+
+
+async def run_benchmark(args):
+    site = FakeJMSite(
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        html_variant=args.html_variant,
+        mirrors=args.mirrors,
+        dead_first=args.dead_first
+    )
+    await site.start()
+
+    config = {
+        "accounts": [f"user{i}:pass{i}" for i in range(args.accounts)],
+        "concurrency": args.concurrency,
+        "per_domain_limit": args.per_domain_limit,
+        "enable_hedge": args.hedge,
+        "hedge_delay": args.hedge_delay,
+        "probe_timeout": 2
+    }
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # 持久化数据写入临时目录，不影响真实数据
+        with mock.patch.object(plugin_main, "get_astrbot_data_path", return_value=data_dir):
+            plugin = JMSign(None, config)
+        plugin.target_urls = [site.publish_url]
+        plugin.prober.target_urls = plugin.target_urls
+        if args.no_ledger:
+            plugin.ledger = None
+
+        for run in range(1, args.runs + 1):
+            site.requests.clear()
+            tracemalloc.start()
+            start = time.perf_counter()
+            async for _ in plugin.run_batch_sign(is_cron=True):
+                pass
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            mirror_requests = sum(n for path, n in site.requests.items() if path != "publish")
+            print(f"=== 第 {run} 轮: {args.accounts} 个账号 ===")
+            print(f"总耗时: {elapsed:.2f}s ({args.accounts / elapsed:.1f} 账号/秒)")
+            print(f"每账号请求数: {mirror_requests / args.accounts:.2f}  明细: {dict(site.requests)}")
+            print(f"内存峰值: {peak / 1024 / 1024:.1f} MiB")
+
+    await site.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JM签到模拟站点压测")
+    parser.add_argument("--accounts", type=int, default=1000, help="模拟账号数")
+    parser.add_argument("--runs", type=int, default=2, help="连续执行轮数，第二轮起可观察会话复用与签到记录的效果")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发签到账号数")
+    parser.add_argument("--per-domain-limit", type=int, default=20, help="单域名最大连接数")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟站点平均延迟 (秒)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="镜像站请求失败概率")
+    parser.add_argument("--html-variant", choices=["top", "bottom", "missing"], default="top", help="/user 页面结构")
+    parser.add_argument("--mirrors", type=int, default=2, help="镜像站数量")
+    parser.add_argument("--dead-first", action="store_true", help="发布页中的第一个镜像站无法连接")
+    parser.add_argument("--hedge", action="store_true", help="启用域名对冲签到")
+    parser.add_argument("--hedge-delay", type=int, default=500, help="对冲延迟 (毫秒)")
+    parser.add_argument("--no-ledger", action="store_true", help="不使用签到记录，每轮都完整签到")
+    parser.add_argument("--extractor", action="store_true", help="对比 /user 页面新旧解析方式的开销")
+    parser.add_argument("--page-repeat", type=int, default=10, help="/user 页面中收藏列表的重复次数")
+    parser.add_argument("--header-position", choices=["top", "bottom"], default="top", help="/user 页面中资料的位置")
+    parser.add_argument("--iterations", type=int, default=200, help="解析方式对比的执行次数")
+    args = parser.parse_args()
+    if args.extractor:
+        run_extractor(args)
+    else:
+        asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
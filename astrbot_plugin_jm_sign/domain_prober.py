@@ -0,0 +1,145 @@
+import asyncio
+import ssl
+import time
+
+import aiohttp
+from yarl import URL
+from astrbot.api import logger
+
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+
+class DomainProber:
+    """并发探测JM域名，按延迟排序并缓存结果
+
+    - 并发访问所有发布页，汇总其中的域名
+    - 对每个域名分别测量 TCP 连接、TLS 握手和 HTTP 首包延迟
+    - 健康的域名按 HTTP 延迟升序排列，不健康的排在末尾作为兜底
+    - 排序结果在 ttl 秒内复用，不重复探测
+    """
+
+    def __init__(self, target_urls, pattern, ttl=1800, timeout=5):
+        self.target_urls = target_urls
+        self.pattern = pattern
+        self.ttl = ttl
+        self.timeout = timeout
+
+        # 最近一次的探测结果
+        self.results = []
+        self.expires_at = 0
+        self._lock = asyncio.Lock()
+
+        # 发布页与镜像站多为自签名证书，不校验
+        self._ssl_ctx = ssl.create_default_context()
+        self._ssl_ctx.check_hostname = False
+        self._ssl_ctx.verify_mode = ssl.CERT_NONE
+
+    async def get_domains(self, configured=None, force=False):
+        """返回排序后的域名列表
+
+        configured: 配置的域名，健康时始终排在首位
+        force: 忽略缓存，重新探测
+        """
+        async with self._lock:
+            if force or not self.results or time.monotonic() >= self.expires_at:
+                self.results = await self.probe(configured)
+                self.expires_at = time.monotonic() + self.ttl
+            else:
+                logger.info("使用缓存的域名排序结果")
+        return [r["domain"] for r in self.results]
+
+    async def probe(self, configured=None):
+        """探测所有发布页及其中的域名，返回排序后的探测结果"""
+        domains = []
+        if configured:
+            domains.append(configured.rstrip('/'))
+
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
+            pages = await asyncio.gather(*(self._fetch_publish_page(session, url) for url in self.target_urls))
+            for urls in pages:
+                for d in urls:
+                    d = d.rstrip('/')
+                    if d not in domains:
+                        domains.append(d)
+
+            if not domains:
+                return []
+
+            results = await asyncio.gather(*(self._measure(session, d) for d in domains))
+
+        healthy = sorted((r for r in results if r["healthy"]), key=lambda r: r["http"])
+        unhealthy = [r for r in results if not r["healthy"]]
+        if configured:
+            # 配置的域名健康时优先使用
+            configured = configured.rstrip('/')
+            healthy.sort(key=lambda r: r["domain"] != configured)
+
+        ranked = healthy + unhealthy
+        for r in ranked:
+            if r["healthy"]:
+                logger.info(
+                    f"域名 {r['domain']}: TCP {r['tcp'] * 1000:.0f}ms | "
+                    f"TLS {r['tls'] * 1000:.0f}ms | HTTP {r['http'] * 1000:.0f}ms"
+                )
+            else:
+                logger.warning(f"域名 {r['domain']} 不可用: {r['error']}")
+        return ranked
+
+    async def _fetch_publish_page(self, session, url):
+        """访问发布页并提取其中的域名"""
+        try:
+            logger.info(f"尝试从发布页获取域名: {url}")
+            async with session.get(url, headers={"User-Agent": USER_AGENT}, timeout=self.timeout) as resp:
+                if resp.status != 200:
+                    logger.warning(f"访问发布页 {url} 失败: HTTP {resp.status}")
+                    return []
+                urls = self.pattern.findall(await resp.text())
+                logger.info(f"从 {url} 获取到域名: {urls}")
+                return urls
+        except Exception as e:
+            logger.warning(f"访问发布页 {url} 失败: {e}")
+            return []
+
+    async def _measure(self, session, domain):
+        """测量单个域名的 TCP / TLS / HTTP 延迟"""
+        result = {"domain": domain, "tcp": None, "tls": None, "http": None, "healthy": False, "error": None}
+        url = URL(domain)
+        host = url.host
+        port = url.port or (443 if url.scheme == "https" else 80)
+        loop = asyncio.get_running_loop()
+
+        try:
+            # TCP 连接 (含 DNS 解析)
+            start = time.perf_counter()
+            transport, protocol = await asyncio.wait_for(
+                loop.create_connection(asyncio.Protocol, host, port), self.timeout
+            )
+            result["tcp"] = time.perf_counter() - start
+            try:
+                # TLS 握手
+                if url.scheme == "https":
+                    start = time.perf_counter()
+                    transport = await asyncio.wait_for(
+                        loop.start_tls(transport, protocol, self._ssl_ctx, server_hostname=host), self.timeout
+                    )
+                    result["tls"] = time.perf_counter() - start
+                else:
+                    result["tls"] = 0.0
+            finally:
+                transport.close()
+
+            # HTTP 首包延迟
+            start = time.perf_counter()
+            async with session.get(domain, headers={"User-Agent": USER_AGENT}, timeout=self.timeout,
+                                   allow_redirects=False) as resp:
+                result["http"] = time.perf_counter() - start
+                if resp.status >= 500:
+                    result["error"] = f"HTTP {resp.status}"
+                else:
+                    result["healthy"] = True
+        except asyncio.TimeoutError:
+            result["error"] = "超时"
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+        return result
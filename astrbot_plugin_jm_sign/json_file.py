@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+from astrbot.api import logger
+
+
+class DebouncedJsonFile:
+    """数据目录下的 JSON 文件，修改后延迟写盘，短时间内的多次修改合并为一次写入
+
+    子类设置 FILENAME 和 LABEL (日志中的名称)，实现 _payload 返回要写入的数据，修改数据后调用 _schedule_save。
+    没有运行中的事件循环时立即写入。
+    """
+
+    FILENAME = ""
+    LABEL = ""
+    # 修改后延迟写盘的时间 (秒)
+    SAVE_DELAY = 1.0
+    # json.dump 的缩进，None 表示不缩进
+    INDENT = None
+
+    def __init__(self, base_dir):
+        self.path = Path(base_dir) / self.FILENAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._save_handle = None
+        self._dirty = False
+
+    def _load(self):
+        """读取文件，不存在或损坏时返回空字典"""
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取{self.LABEL}失败，将重新记录: {e}")
+            return {}
+
+    def _payload(self):
+        raise NotImplementedError
+
+    def _save(self):
+        # 先写临时文件再替换，避免写入中断导致文件损坏
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._payload(), f, ensure_ascii=False, indent=self.INDENT)
+        os.replace(tmp_path, self.path)
+
+    def _schedule_save(self):
+        self._dirty = True
+        if self._save_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._save_handle = loop.call_later(self.SAVE_DELAY, self.flush)
+
+    def flush(self):
+        """立即写入尚未保存的修改"""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            self._save()
+        except Exception as e:
+            logger.warning(f"保存{self.LABEL}失败: {e}")
@@ -1,14 +1,28 @@
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger, AstrBotConfig
+from astrbot.core.utils.astrbot_path import get_astrbot_data_path
 import aiohttp
 import re
 import os
+import codecs
 import json
 import asyncio
+import random
+import time
+import contextlib
+from datetime import datetime
+from pathlib import Path
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+
+from .session_store import SessionStore
+from .domain_prober import DomainProber
+from .user_info import UserInfoExtractor
+from .sign_ledger import SignLedger
+from .sign_schedule import SignSchedule
 
 @register("astrbot_plugin_jm_sign", "cloudcranesss", "JMComic每日签到", "1.0.0", "https://github.com/cloudcranesss/astrbot_plugins")
 class JMSign(Star):
@@ -24,7 +38,25 @@ class JMSign(Star):
             "https://jmcomic.me/"
         ]
         # 匹配规则：查找 class="china" 后的链接
-        self.pattern = re.compile(r'class=["\']china["\'].*?(https?://[\w.-]+)', re.DOTALL | re.IGNORECASE)
+        self.pattern = re.compile(r'class=["\']china["\'].*?(https?://[\w.-]+(?::\d+)?)', re.DOTALL | re.IGNORECASE)
+
+        # 并发探测发布页与域名，按延迟排序并缓存
+        self.prober = DomainProber(
+            self.target_urls,
+            self.pattern,
+            ttl=int(self.config.get("domain_cache_ttl", 30)) * 60,
+            timeout=int(self.config.get("probe_timeout", 5))
+        )
+
+        # 插件数据目录
+        self.data_dir = Path(get_astrbot_data_path()) / "plugin_data" / "astrbot_plugin_jm_sign"
+        # 按账号持久化登录 Cookie
+        self.session_store = SessionStore(self.data_dir) if self.config.get("persist_session", True) else None
+        # 按天记录签到状态，今天已完成的账号不再重复签到
+        self.ledger = SignLedger(self.data_dir) if self.config.get("skip_signed_today", True) else None
+        self._account_locks = {}
+        # 错峰签到的排期，重启后恢复
+        self.schedule = SignSchedule(self.data_dir)
 
         # 注册定时任务
         if self.config.get("enable_cron", False):
@@ -53,12 +85,19 @@ class JMSign(Star):
                 # 添加任务
                 self.scheduler.add_job(self.run_cron_job, trigger)
                 self.scheduler.start()
+
+                # 错峰模式下恢复重启前未执行的账号任务
+                if self.config.get("cron_mode", "batch") == "staggered":
+                    self._restore_staggered_jobs()
             except Exception as e:
                 logger.error(f"启动定时任务失败: {e}")
 
     async def run_cron_job(self):
         """定时任务执行入口"""
         logger.info("JM签到定时任务：开始执行...")
+        if self.config.get("cron_mode", "batch") == "staggered":
+            self.schedule_staggered()
+            return
         try:
             # 必须使用 async for 消耗生成器
             async for item in self.run_batch_sign(is_cron=True):
@@ -68,15 +107,87 @@ class JMSign(Star):
         except Exception as e:
             logger.error(f"JM签到定时任务执行异常: {e}")
 
+    def schedule_staggered(self):
+        """将账号分散到错峰窗口内，每个账号作为独立任务执行"""
+        task_list = [a for a in self._load_accounts() if not (self.ledger and self.ledger.get(a["username"]))]
+        if not task_list:
+            logger.info("JM签到错峰任务：没有需要签到的账号")
+            return
+
+        window = max(0, int(self.config.get("stagger_window", 60))) * 60
+        slot = window / len(task_list)
+        now = time.time()
+        for i, account in enumerate(task_list):
+            # 每个账号落在各自的时间槽内，并在槽内随机抖动
+            run_at = now + i * slot + random.uniform(0, slot)
+            self._schedule_account(account["username"], run_at)
+        # 所有账号的排期一次写入
+        self.schedule.flush()
+        logger.info(f"JM签到错峰任务：已将 {len(task_list)} 个账号分散到 {window // 60} 分钟内执行")
+
+    def _schedule_account(self, username, run_at, attempt=0):
+        """为单个账号添加一次性任务并持久化排期"""
+        self.schedule.set(username, run_at, attempt)
+        self.scheduler.add_job(
+            self.run_account_job,
+            DateTrigger(run_date=datetime.fromtimestamp(run_at)),
+            args=[username],
+            id=f"jmsign_{username}",
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+
+    def _restore_staggered_jobs(self):
+        """恢复重启前持久化的排期，已过期的任务在一分钟内分散补执行"""
+        now = time.time()
+        for username, job in list(self.schedule.jobs.items()):
+            run_at = job.get("run_at", now)
+            if run_at < now:
+                run_at = now + random.uniform(5, 60)
+            self._schedule_account(username, run_at, job.get("attempt", 0))
+        self.schedule.flush()
+        if self.schedule.jobs:
+            logger.info(f"JM签到错峰任务：已恢复 {len(self.schedule.jobs)} 个账号的排期")
+
+    async def run_account_job(self, username):
+        """错峰模式下单个账号的签到任务，失败时按指数退避重试"""
+        account = next((a for a in self._load_accounts() if a["username"] == username), None)
+        if not account:
+            # 账号已从配置中移除
+            self.schedule.remove(username)
+            return
+
+        attempt = (self.schedule.get(username) or {}).get("attempt", 0)
+        try:
+            domains = await self.get_domains()
+            res = await self.sign_account(account, domains)
+        except Exception as e:
+            res = f"❌ 失败: {e}"
+
+        if res.startswith("❌"):
+            max_retries = int(self.config.get("retry_times", 3))
+            if attempt < max_retries:
+                backoff = int(self.config.get("retry_backoff", 60)) * (2 ** attempt)
+                delay = backoff + random.uniform(0, backoff)
+                logger.warning(f"JM签到错峰任务：{username} 签到失败，{delay:.0f} 秒后第 {attempt + 1} 次重试: {res}")
+                self._schedule_account(username, time.time() + delay, attempt + 1)
+                return
+            logger.error(f"JM签到错峰任务：{username} 重试 {max_retries} 次后仍失败: {res}")
+        else:
+            logger.info(f"JM签到错峰任务进度: {self._format_result(username, res)}")
+        self.schedule.remove(username)
+
     async def terminate(self):
         """插件卸载时停止调度器"""
+        if self.ledger:
+            self.ledger.flush()
+        self.schedule.flush()
         if self.scheduler.running:
             self.scheduler.shutdown()
             logger.info("JM签到插件：定时任务调度器已停止")
 
-    async def run_batch_sign(self, is_cron=False, event: AstrMessageEvent = None):
-        """批量执行签到"""
-        # 获取配置的账号
+    def _load_accounts(self):
+        """解析配置中的账号列表"""
         accounts_conf = self.config.get("accounts", [])
         
         task_list = []
@@ -100,7 +211,25 @@ class JMSign(Star):
                         if user and pwd:
                             if not any(t["username"] == user for t in task_list):
                                 task_list.append({"username": user, "password": pwd})
-    
+        return task_list
+
+    def _format_result(self, username, res):
+        """将单个账号的签到结果格式化为报告条目"""
+        # 尝试从结果中提取更友好的用户名
+        display_name = username
+        if "👤 用户:" in res:
+            try:
+                match = re.search(r"👤 用户: (.*?)\n", res)
+                if match:
+                    display_name = match.group(1).strip()
+            except:
+                pass
+        return f"用户: {display_name}\n{res}"
+
+    async def run_batch_sign(self, is_cron=False, event: AstrMessageEvent = None):
+        """批量执行签到"""
+        # 获取配置的账号
+        task_list = self._load_accounts()
         
         if not task_list:
             msg = "❌ 未配置任何账号，无法执行签到。"
@@ -108,38 +237,55 @@ class JMSign(Star):
             else: logger.warning(msg)
             return
 
+        # 今天已完成签到的账号直接复用记录，全部完成时无需获取域名
+        pending = [a for a in task_list if not (self.ledger and self.ledger.get(a["username"]))]
+        if len(pending) < len(task_list):
+            logger.info(f"JM签到：{len(task_list) - len(pending)} 个账号今天已完成签到，将复用记录")
+
         # 获取域名
-        if event: yield event.plain_result("⏳ 正在获取域名列表...")
-        domains = await self.get_domains()
+        domains = []
+        if pending:
+            if event: yield event.plain_result("⏳ 正在获取域名列表...")
+            domains = await self.get_domains()
         
-        if not domains:
+        if pending and not domains:
             msg = "❌ 无法获取有效域名，签到中止。"
             if event: yield event.plain_result(msg)
             else: logger.error(msg)
             return
             
-        # 结果汇总
-        results = []
-        
-        for account in task_list:
-            username = account["username"]
-            password = account["password"]
-            
-            if event: yield event.plain_result(f"⏳ 正在为 {username} 签到...")
-            
-            # 执行单个账号签到
-            res = await self.sign_one_account(username, password, domains)
-            # 尝试从结果中提取更友好的用户名
-            display_name = username
-            if "👤 用户:" in res:
-                try:
-                    match = re.search(r"👤 用户: (.*?)\n", res)
-                    if match:
-                        display_name = match.group(1).strip()
-                except:
-                    pass
-            
-            results.append(f"用户: {display_name}\n{res}")
+        # 并发数与单域名连接上限
+        concurrency = max(1, int(self.config.get("concurrency", 5)))
+        per_domain_limit = max(1, int(self.config.get("per_domain_limit", 4)))
+        if event: yield event.plain_result(f"⏳ 正在为 {len(task_list)} 个账号签到 (并发: {concurrency})...")
+
+        semaphore = asyncio.Semaphore(concurrency)
+        # 所有账号共享连接池，limit_per_host 限制每个域名的并发连接数
+        connector = aiohttp.TCPConnector(ssl=False, limit_per_host=per_domain_limit)
+
+        async def sign_with_limit(index, account):
+            res = await self.sign_account(account, domains, connector=connector, semaphore=semaphore)
+            return index, account["username"], res
+
+        # 结果汇总 (按配置顺序)
+        results = [None] * len(task_list)
+        tasks = [asyncio.create_task(sign_with_limit(i, account)) for i, account in enumerate(task_list)]
+        try:
+            done = 0
+            # 每个账号完成后立即汇报
+            for future in asyncio.as_completed(tasks):
+                index, username, res = await future
+                done += 1
+                results[index] = self._format_result(username, res)
+                progress = f"[{done}/{len(task_list)}] {results[index]}"
+                if event: yield event.plain_result(progress)
+                else: logger.info(f"JM签到进度: {progress}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await connector.close()
+            if self.ledger:
+                self.ledger.flush()
             
         final_msg = "=== JMComic 批量签到报告 ===\n\n" + "\n\n".join(results)
         
@@ -150,91 +296,220 @@ class JMSign(Star):
             # 定时任务触发时，仅记录日志，不再推送通知
             logger.info(final_msg)
 
-    async def sign_one_account(self, username, password, domains):
-        """执行单个账号的签到逻辑"""
-        success = False
-        last_error = None
-        result_msg = ""
-        
-        for domain in domains:
-            domain = domain.rstrip('/')
-            
-            login_url = f"{domain}/login"
-            sign_url = f"{domain}/ajax/user_daily_sign"
+    async def sign_account(self, account, domains, connector=None, semaphore=None):
+        """签到单个账号，今天已完成时直接复用记录"""
+        username = account["username"]
+        # 同一账号同时只有一个签到流程，避免定时任务与手动指令重复签到
+        async with self._account_locks.setdefault(username, asyncio.Lock()):
+            entry = self.ledger.get(username) if self.ledger else None
+            if entry:
+                return f"{entry['report']}\n🗂️ 今日已完成签到 (记录于 {entry['time']})"
+            async with semaphore or contextlib.nullcontext():
+                try:
+                    return await self.sign_one_account(username, account["password"], domains, connector=connector)
+                except Exception as e:
+                    return f"❌ 失败: {e}"
 
-            logger.info(f"正在为 {username} 签到，域名: {domain}")
-            
-            try:
-                # 禁用SSL验证以绕过自签名证书问题
-                async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-                    headers = {
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-                        "Referer": domain
-                    }
-                    
-                    # 1. 登录
-                    try:
-                        async with session.post(login_url, data={
-                            "username": username,
-                            "password": password,
-                            "submit_login": "1"
-                        }, headers=headers, timeout=10) as login_resp:
-                            if login_resp.status >= 400:
-                                last_error = f"登录失败 {login_resp.status}"
-                                continue
-                    except Exception as e:
-                        last_error = str(e)
-                        continue
-
-                    # 2. 签到
-                    async with session.post(sign_url, headers=headers, timeout=10) as sign_resp:
-                        if sign_resp.status == 200:
-                            try:
-                                # 指定 content_type=None 以兼容非标准 MIME 类型
-                                result = await sign_resp.json(content_type=None)
-                                
-                                msg = "未知结果"
-                                if "msg" in result:
-                                    msg = result["msg"]
-                                    if not msg:
-                                        if result.get("error") == "finished":
-                                            msg = "今天已经签到过了 (finished)"
-                                        else:
-                                            msg = "签到成功"
-                                elif "message" in result:
-                                    msg = result["message"]
-                                else:
-                                    msg = str(result)
-                                
-                                # 3. 获取用户信息
-                                user_info = await self.get_user_info(session, domain)
-                                info_str = ""
-                                if user_info:
-                                    info_str = (
-                                        f"\n🔰 Lv.{user_info.get('level', '?')} | 💰 {user_info.get('coins', '?')}\n"
-                                        f"⭐ 可收藏: {user_info.get('fav_count', '?')} | 📈 经验: {user_info.get('exp', '?')}\n"
-                                        f"🏷️ 称号: {user_info.get('title', '无')}"
-                                    )
-                                    
-                                result_msg = f"✅ {msg}{info_str}"
-                                success = True
-                                break 
-                            except Exception as e:
-                                result_msg = f"⚠️ 请求成功但解析失败: {e}"
-                                success = True
-                                break
-                        else:
-                            last_error = f"接口错误 {sign_resp.status}"
-            except Exception as e:
-                last_error = str(e)
+    async def sign_one_account(self, username, password, domains, connector=None):
+        """执行单个账号的签到逻辑
+
+        connector: 可选的共享连接池，由批量签到传入；为空时为本次签到单独创建
+        """
+        # 加载账号已保存的 Cookie，会话有效时跳过登录
+        jar = self.session_store.load(username) if self.session_store else aiohttp.CookieJar(unsafe=True)
+        remaining = [domain.rstrip('/') for domain in domains]
+        success, result_msg, last_error, user_info, signed = False, "", None, None, False
+
+        # 对冲模式：在排名前两位的域名上并行尝试
+        if self.config.get("enable_hedge", False) and len(remaining) >= 2:
+            success, result_msg, last_error, user_info, signed = await self._hedged_sign(
+                username, password, remaining[:2], jar, connector
+            )
+            remaining = remaining[2:] if not success else []
+
+        for domain in remaining:
+            success, result_msg, error, user_info, signed = await self._sign_on_domain(
+                username, password, domain, jar, connector
+            )
+            if success:
+                break
+            last_error = error
                 
         if not success:
-            result_msg = f"❌ 失败: {last_error}"
-            
+            return f"❌ 失败: {last_error}"
+
+        if self.session_store:
+            self.session_store.save(username, jar)
+        # 只有接口明确表示签到成功或今天已签到时才记录，错误提示不会被当作已完成
+        if self.ledger and signed:
+            self.ledger.record(username, result_msg, user_info)
         return result_msg
 
+    async def _hedged_sign(self, username, password, domains, jar, connector):
+        """在两个域名上对冲签到
+
+        先在第一个域名上签到，超过对冲延迟仍未完成 (或已失败) 时启动第二个域名，
+        采用先成功的结果并取消另一个
+        """
+        delay = max(0, int(self.config.get("hedge_delay", 500))) / 1000
+        tasks = [asyncio.create_task(self._sign_on_domain(username, password, domains[0], jar, connector))]
+        last = (False, "", None, None, False)
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                last = tasks[0].result()
+                if last[0]:
+                    return last
+                tasks = []
+
+            logger.info(f"{username} 在 {domains[0]} 上未在 {delay * 1000:.0f}ms 内成功，并行尝试 {domains[1]}")
+            tasks.append(asyncio.create_task(self._sign_on_domain(username, password, domains[1], jar, connector)))
+            while tasks:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                tasks = list(pending)
+                for task in done:
+                    result = task.result()
+                    if result[0]:
+                        return result
+                    last = result
+            return last
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _sign_on_domain(self, username, password, domain, jar, connector=None):
+        """在单个域名上登录并签到
+
+        返回 (是否成功, 结果描述, 错误信息, 用户信息, 今天是否已完成签到)
+        """
+        logger.info(f"正在为 {username} 签到，域名: {domain}")
+        
+        try:
+            # 禁用SSL验证以绕过自签名证书问题
+            async with aiohttp.ClientSession(
+                connector=connector or aiohttp.TCPConnector(ssl=False),
+                connector_owner=connector is None,
+                cookie_jar=jar
+            ) as session:
+                headers = {
+                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+                    "Referer": domain
+                }
+                
+                # 1. 登录 (本地已有未过期的会话时跳过)
+                reused = bool(self.session_store) and self.session_store.has_session(jar, domain)
+                if reused:
+                    logger.info(f"{username} 复用已保存的会话: {domain}")
+                else:
+                    error = await self._login(session, domain, username, password, headers)
+                    if error:
+                        return False, "", error, None, False
+
+                # 2. 签到
+                status, result = await self._post_sign(session, domain, headers)
+                if reused and self._is_login_required(status, result):
+                    # 会话已在服务端失效，重新登录后再签到一次
+                    logger.info(f"{username} 的会话已失效，重新登录: {domain}")
+                    self.session_store.invalidate(jar, domain)
+                    error = await self._login(session, domain, username, password, headers)
+                    if error:
+                        return False, "", error, None, False
+                    status, result = await self._post_sign(session, domain, headers)
+
+                if self._is_login_required(status, result):
+                    # 刚登录后仍要求登录，通常是账号或密码错误，不能视为签到结果
+                    if self.session_store:
+                        self.session_store.invalidate(jar, domain)
+                    return False, "", "登录后签到接口仍要求登录，请检查账号密码", None, False
+
+                if status != 200:
+                    return False, "", f"接口错误 {status}", None, False
+
+                msg = self._format_sign_msg(result)
+                signed = self._is_signed(result)
+
+                # 3. 获取用户信息
+                user_info = await self.get_user_info(session, domain)
+                info_str = ""
+                if user_info:
+                    info_str = (
+                        f"\n🔰 Lv.{user_info.get('level', '?')} | 💰 {user_info.get('coins', '?')}\n"
+                        f"⭐ 可收藏: {user_info.get('fav_count', '?')} | 📈 经验: {user_info.get('exp', '?')}\n"
+                        f"🏷️ 称号: {user_info.get('title', '无')}"
+                    )
+                    
+                return True, f"✅ {msg}{info_str}", None, user_info, signed
+        except Exception as e:
+            return False, "", str(e), None, False
+
+    async def _login(self, session, domain, username, password, headers):
+        """登录，成功返回None，失败返回错误描述"""
+        try:
+            async with session.post(f"{domain}/login", data={
+                "username": username,
+                "password": password,
+                "submit_login": "1"
+            }, headers=headers, timeout=10) as login_resp:
+                if login_resp.status >= 400:
+                    return f"登录失败 {login_resp.status}"
+        except Exception as e:
+            return str(e)
+        return None
+
+    async def _post_sign(self, session, domain, headers):
+        """提交签到请求，返回 (状态码, 解析后的JSON)，JSON解析失败时返回错误描述字符串"""
+        async with session.post(f"{domain}/ajax/user_daily_sign", headers=headers, timeout=10) as sign_resp:
+            if sign_resp.status != 200:
+                return sign_resp.status, None
+            try:
+                # 指定 content_type=None 以兼容非标准 MIME 类型
+                return sign_resp.status, await sign_resp.json(content_type=None)
+            except Exception as e:
+                return sign_resp.status, str(e)
+
+    def _is_login_required(self, status, result):
+        """判断签到响应是否表明会话已失效"""
+        if status in (401, 403):
+            return True
+        if status != 200:
+            return False
+        # 未登录时接口通常返回登录页 HTML，而非 JSON
+        if not isinstance(result, dict):
+            return True
+        text = f"{result.get('msg', '')}{result.get('message', '')}{result.get('error', '')}".lower()
+        return any(k in text for k in ("登入", "登录", "登錄", "login"))
+
+    def _is_signed(self, result):
+        """根据签到接口响应中的字段判断今天是否已完成签到，不依赖展示文本"""
+        if result.get("error") == "finished":
+            return True
+        # 部分镜像返回显式的成功标记
+        if result.get("success") is True or str(result.get("status", "")).lower() in ("1", "ok", "success"):
+            return True
+        # 签到成功时 msg 与 error 均为空；msg 不为空时可能是错误提示，不记录
+        return "msg" in result and not result["msg"] and not result.get("error")
+
+    def _format_sign_msg(self, result):
+        """将签到接口的响应转换为结果描述"""
+        msg = "未知结果"
+        if "msg" in result:
+            msg = result["msg"]
+            if not msg:
+                if result.get("error") == "finished":
+                    msg = "今天已经签到过了 (finished)"
+                else:
+                    msg = "签到成功"
+        elif "message" in result:
+            msg = result["message"]
+        else:
+            msg = str(result)
+        return msg
+
     async def get_user_info(self, session, domain):
-        """获取用户信息"""
+        """获取用户信息
+
+        分块读取 /user 页面并增量解析头部资料，字段全部找到后立即停止读取
+        """
         try:
             # 访问用户页面以获取头部信息
             url = f"{domain}/user"
@@ -242,97 +517,25 @@ class JMSign(Star):
                 if resp.status != 200:
                     return None
                 
-                html = await resp.text()
-                
-                info = {}
+                extractor = UserInfoExtractor()
+                decoder = codecs.getincrementaldecoder(resp.charset or "utf-8")(errors="replace")
+                async for chunk in resp.content.iter_chunked(8192):
+                    if extractor.feed(decoder.decode(chunk), len(chunk)):
+                        break
                 
-                # 提取昵称
-                name_match = re.search(r'class="header-right-username">@?(.*?)<', html)
-                if name_match:
-                    info['name'] = name_match.group(1).strip()
-                    
-                # 提取等级和经验
-                # 匹配结构: <div class="header-profile-row-value"> 8 <span class="header-profile-exp">(18603/28350)</span> </div> <div class="header-profile-row-name">等级</div>
-                level_match = re.search(r'(\d+)\s*<span class="header-profile-exp">\((.*?)\)</span>[\s\S]*?等级', html)
-                if level_match:
-                    info['level'] = level_match.group(1)
-                    info['exp'] = level_match.group(2)
-                    
-                # 提取收藏数
-                # 结构：<div class="header-profile-row-value">1,200</div> <div class="header-profile-row-name">可收藏数</div>
-                fav_match = re.search(r'>([\d,]+)</div>\s*<div class="header-profile-row-name">.*?可收藏数', html)
-                if fav_match:
-                    info['fav_count'] = fav_match.group(1)
-
-                # 提取等级进度百分比
-                # 从经验值计算或直接提取，这里使用已提取的经验值字符串 (18603/28350)
-                if 'exp' in info:
-                    info['exp_percent'] = info['exp']
-
-                # 提取 J Coins
-                # 尝试更简单的正则：在 "J Coins" 之前寻找最近的数字 div
-                # ... <div class="header-profile-row-value">23262</div>...J Coins
-                try:
-                    # 截取 "J Coins" 之前的 500 个字符
-                    jcoins_idx = html.find("J Coins")
-                    if jcoins_idx != -1:
-                        # 从 "J Coins" 往前截取
-                        snippet = html[max(0, jcoins_idx-500):jcoins_idx]
-                        # 查找最后一个 header-profile-row-value 的内容
-                        # <div class="header-profile-row-value">23262</div>
-                        # <div class="header-profile-row-name">
-                        matches = re.findall(r'class="header-profile-row-value">\s*([\d,]+)\s*</div>', snippet)
-                        if matches:
-                            # 最后一个匹配项应该是 J Coins 对应的数值
-                            info['coins'] = matches[-1]
-                except Exception as e:
-                    logger.error(f"提取 J Coins 失败: {e}")
-                    
-                # 提取称号
-                title_match = re.search(r'class="header-profile-row-value user-current-title">\s*(.*?)\s*<!--', html)
-                if title_match:
-                    info['title'] = title_match.group(1).strip()
-                    
-                return info
+                logger.debug(f"用户信息解析完成，读取 {extractor.bytes_read} 字节，字段: {list(extractor.info)}")
+                return extractor.info
         except Exception as e:
             logger.error(f"获取用户信息失败: {e}")
             return None
 
-    async def get_domains(self):
-        """获取JM域名列表，优先使用配置"""
-        domains = []
-        
-        # 1. 配置的域名
+    async def get_domains(self, force=False):
+        """获取按延迟排序的JM域名列表，配置的域名健康时优先"""
         domain_conf = self.config.get("domain")
         if domain_conf:
             logger.info(f"添加配置的域名: {domain_conf}")
-            domains.append(domain_conf)
-        
-        # 2. 自动获取
-        # 遍历所有发布页
-        for url in self.target_urls:
-            try:
-                logger.info(f"尝试从发布页获取域名: {url}")
-                async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-                    headers = {
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                    }
-                    async with session.get(url, headers=headers, timeout=5) as resp:
-                        if resp.status == 200:
-                            html = await resp.text()
-                            # 查找所有链接
-                            urls = self.pattern.findall(html)
-                            
-                            if urls:
-                                logger.info(f"从 {url} 获取到域名: {urls}")
-                                for d in urls:
-                                    if d not in domains:
-                                        domains.append(d)
-                                # 如果成功获取到，就不再尝试其他发布页
-                                break
-            except Exception as e:
-                logger.warning(f"访问发布页 {url} 失败: {e}")
-            
+        domains = await self.prober.get_domains(configured=domain_conf, force=force)
+        logger.info(f"域名排序结果: {domains}")
         return domains
 
     @filter.command("jmsign")
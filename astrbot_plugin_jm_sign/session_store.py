@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.cookies import SimpleCookie
+from pathlib import Path
+
+import aiohttp
+from yarl import URL
+from astrbot.api import logger
+
+
+class SessionStore:
+    """按账号持久化登录 Cookie，避免每次签到都重新登录
+
+    Cookie 以 JSON 保存名称、值、域名、路径和过期时间，加载时通过 update_cookies 重建，不使用 pickle。
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = Path(base_dir) / "cookies"
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, username, suffix=".json"):
+        # 文件名使用用户名摘要，避免特殊字符
+        digest = hashlib.sha1(username.encode("utf-8")).hexdigest()
+        return self.base_dir / f"{digest}{suffix}"
+
+    def load(self, username):
+        """加载账号的 CookieJar，不存在或损坏时返回空 Jar"""
+        jar = aiohttp.CookieJar(unsafe=True)
+        # 旧版本以 pickle 保存的文件不再读取，直接删除后重新登录
+        legacy = self._path(username, ".cookies")
+        if legacy.exists():
+            legacy.unlink(missing_ok=True)
+        path = self._path(username)
+        if not path.exists():
+            return jar
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            now = time.time()
+            for entry in entries:
+                expires = entry.get("expires")
+                if expires is not None and expires <= now:
+                    continue
+                cookie = SimpleCookie()
+                cookie[entry["name"]] = entry["value"]
+                morsel = cookie[entry["name"]]
+                morsel["domain"] = entry["domain"]
+                morsel["path"] = entry.get("path") or "/"
+                if expires is not None:
+                    morsel["expires"] = formatdate(expires, usegmt=True)
+                if entry.get("secure"):
+                    morsel["secure"] = True
+                if entry.get("httponly"):
+                    morsel["httponly"] = True
+                jar.update_cookies(cookie, URL.build(scheme="https", host=entry["domain"]))
+        except Exception as e:
+            logger.warning(f"加载 {username} 的 Cookie 失败，将重新登录: {e}")
+            jar.clear()
+        return jar
+
+    def save(self, username, jar):
+        """保存账号的 CookieJar"""
+        now = time.time()
+        entries = []
+        for morsel in jar:
+            if not morsel["domain"]:
+                continue
+            expires = None
+            try:
+                if morsel["max-age"]:
+                    # max-age 只出现在本次会话收到的 Cookie 中，签到在数秒内完成，按当前时间换算为过期时间
+                    expires = now + int(morsel["max-age"])
+                elif morsel["expires"]:
+                    expires = parsedate_to_datetime(morsel["expires"]).timestamp()
+            except (TypeError, ValueError):
+                # 无法解析的过期时间按会话 Cookie 处理
+                expires = None
+            entries.append({
+                "name": morsel.key,
+                "value": morsel.value,
+                "domain": morsel["domain"],
+                "path": morsel["path"],
+                "expires": expires,
+                "secure": bool(morsel["secure"]),
+                "httponly": bool(morsel["httponly"]),
+            })
+        path = self._path(username)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"保存 {username} 的 Cookie 失败: {e}")
+
+    @staticmethod
+    def has_session(jar, domain):
+        """本地检查该域名下是否有未过期的 Cookie，无需网络请求"""
+        return len(jar.filter_cookies(URL(domain))) > 0
+
+    @staticmethod
+    def invalidate(jar, domain):
+        """清除该域名下的 Cookie"""
+        host = URL(domain).host
+        if host:
+            jar.clear_domain(host)
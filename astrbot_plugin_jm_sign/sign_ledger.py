@@ -0,0 +1,39 @@
+import time
+from datetime import date
+
+from .json_file import DebouncedJsonFile
+
+
+class SignLedger(DebouncedJsonFile):
+    """按天记录每个账号的签到状态及最近一次的用户信息
+
+    文件结构: {"2026-01-01": {"username": {"report": ..., "user_info": {...}, "time": ...}}}
+    只保留当天的记录，跨天后自动清空。
+    批量签到时短时间内的多次记录合并为一次写入。
+    """
+
+    FILENAME = "sign_ledger.json"
+    LABEL = "签到记录"
+
+    def __init__(self, base_dir):
+        super().__init__(base_dir)
+        self.data = self._load()
+
+    def _payload(self):
+        return self.data
+
+    def get(self, username):
+        """返回账号今天的签到记录，未签到时返回None"""
+        return self.data.get(date.today().isoformat(), {}).get(username)
+
+    def record(self, username, report, user_info=None):
+        """记录账号今天已完成签到"""
+        today = date.today().isoformat()
+        entries = self.data.get(today, {})
+        entries[username] = {
+            "report": report,
+            "user_info": user_info or {},
+            "time": time.strftime("%H:%M:%S")
+        }
+        self.data = {today: entries}
+        self._schedule_save()
@@ -0,0 +1,32 @@
+from .json_file import DebouncedJsonFile
+
+
+class SignSchedule(DebouncedJsonFile):
+    """持久化错峰签到的排期，重启后可恢复未执行的账号任务
+
+    文件结构: {"username": {"run_at": 时间戳, "attempt": 已重试次数}}
+    不保存密码，执行时从配置中读取。
+    与签到记录相同，短时间内的多次修改合并为一次写入。
+    """
+
+    FILENAME = "sign_schedule.json"
+    LABEL = "签到排期"
+    INDENT = 2
+
+    def __init__(self, base_dir):
+        super().__init__(base_dir)
+        self.jobs = self._load()
+
+    def _payload(self):
+        return self.jobs
+
+    def set(self, username, run_at, attempt=0):
+        self.jobs[username] = {"run_at": run_at, "attempt": attempt}
+        self._schedule_save()
+
+    def get(self, username):
+        return self.jobs.get(username)
+
+    def remove(self, username):
+        if self.jobs.pop(username, None) is not None:
+            self._schedule_save()
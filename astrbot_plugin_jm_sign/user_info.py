@@ -0,0 +1,80 @@
+import re
+
+
+class UserInfoExtractor:
+    """增量解析 /user 页面头部的个人资料
+
+    页面按块喂入 feed()，单个正则一次扫描所有字段；
+    昵称、等级、经验、可收藏数、J Coins、称号全部找到后即可停止读取。
+
+    头部资料的结构:
+    <div class="header-right-username">@name<
+    <div class="header-profile-row-value"> 8 <span class="header-profile-exp">(18603/28350)</span> </div> <div class="header-profile-row-name">等级</div>
+    <div class="header-profile-row-value">1,200</div> <div class="header-profile-row-name">可收藏数</div>
+    <div class="header-profile-row-value">23262</div> <div class="header-profile-row-name">J Coins</div>
+    <div class="header-profile-row-value user-current-title"> 称号 <!--
+    """
+
+    FIELDS = ("name", "level", "exp", "fav_count", "coins", "title")
+
+    # 单个令牌的最大长度，缓冲区只保留这么多未匹配的尾部数据
+    MAX_TOKEN_LEN = 2048
+
+    TOKEN = re.compile(
+        r'class="header-right-username">@?(?P<name>[^<]*)<'
+        r'|class="header-profile-row-value user-current-title">\s*(?P<title>[^<\n]*?)\s*<!--'
+        r'|class="header-profile-row-value">(?P<value>[^<]*(?:<span class="header-profile-exp">[^<]*</span>)?[^<]*)</div>'
+        r'\s*<div class="header-profile-row-name">(?P<label>[^<]*)<'
+    )
+    LEVEL = re.compile(r'(\d+)\s*<span class="header-profile-exp">\((.*?)\)</span>')
+    NUMBER = re.compile(r'[\d,]+')
+
+    def __init__(self):
+        self.info = {}
+        self.bytes_read = 0
+        self._buffer = ""
+
+    @property
+    def done(self):
+        return all(field in self.info for field in self.FIELDS)
+
+    def feed(self, text, nbytes=0):
+        """喂入一段页面文本，所有字段都已找到时返回 True"""
+        self.bytes_read += nbytes or len(text)
+        self._buffer += text
+
+        last_end = 0
+        for match in self.TOKEN.finditer(self._buffer):
+            self._handle(match)
+            last_end = match.end()
+            if self.done:
+                break
+
+        # 丢弃已扫描的部分，只保留可能包含不完整令牌的尾部
+        cut = max(last_end, len(self._buffer) - self.MAX_TOKEN_LEN)
+        self._buffer = self._buffer[cut:]
+        return self.done
+
+    def _handle(self, match):
+        if match.group("name") is not None:
+            self.info.setdefault("name", match.group("name").strip())
+        elif match.group("title") is not None:
+            self.info.setdefault("title", match.group("title").strip())
+        else:
+            value = match.group("value")
+            label = match.group("label")
+            if "等级" in label:
+                level = self.LEVEL.search(value)
+                if level:
+                    self.info.setdefault("level", level.group(1))
+                    self.info.setdefault("exp", level.group(2))
+                    # 等级进度直接使用经验值字符串 (18603/28350)
+                    self.info.setdefault("exp_percent", level.group(2))
+            elif "可收藏数" in label:
+                number = self.NUMBER.search(value)
+                if number:
+                    self.info.setdefault("fav_count", number.group())
+            elif "J Coins" in label:
+                number = self.NUMBER.search(value)
+                if number:
+                    self.info.setdefault("coins", number.group())
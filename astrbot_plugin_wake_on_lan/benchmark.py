@@ -0,0 +1,191 @@
+"""Wake-on-LAN 发送性能测试
+
+在 AstrBot 环境中于仓库根目录运行:
+    python -m astrbot_plugin_wake_on_lan.benchmark --devices 1000 --rounds 20
+
+魔术包发往本机的 UDP 接收端，对比两种发送方式每秒可唤醒的设备数:
+- legacy: 每次唤醒重新构建魔术包并新建、配置、关闭一个阻塞 socket (旧实现)
+- current: 使用预先构建的魔术包，通过复用的异步 UDP 端点发送
+
+启动检测 (连接本机延迟启动和从不监听的端口):
+    python -m astrbot_plugin_wake_on_lan.benchmark --reachability
+检查设备上线的耗时、未上线设备的超时结果，以及所有设备上线后是否立即返回，不符合预期时以非零状态退出。
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+from .main import WakeOnLan
+from .reachability import wait_until_reachable
+
+
+class _Receiver(threading.Thread):
+    """在独立线程中接收数据包，避免与被测的发送方争用事件循环"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self.received = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                self.sock.recv(256)
+                self.received += 1
+            except socket.timeout:
+                continue
+        self.sock.close()
+
+
+def legacy_wake(mac, broadcast, port):
+    mac_bytes = bytes.fromhex(mac.replace(":", "").replace("-", "").replace(" ", ""))
+    magic_packet = b'\xff' * 6 + mac_bytes * 16
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.sendto(magic_packet, (broadcast, port))
+    sock.close()
+
+
+async def _drain(receiver, expected, timeout=1.0):
+    # 等待接收端处理完已发出的数据包
+    deadline = time.perf_counter() + timeout
+    while receiver.received < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def run_benchmark(args):
+    receiver = _Receiver()
+    receiver.start()
+    port = receiver.port
+
+    devices = [
+        {"name": f"pc{i}", "mac": f"02:00:00:{i >> 16 & 0xFF:02X}:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}",
+         "broadcast": "127.0.0.1", "port": port, "group": "lab"}
+        for i in range(args.devices)
+    ]
+    plugin = WakeOnLan(None, {"devices": devices, "repeat": 1, "interval": 0})
+    total = args.devices * args.rounds
+
+    receiver.received = 0
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for device in devices:
+            legacy_wake(device["mac"], device["broadcast"], device["port"])
+    legacy_elapsed = time.perf_counter() - start
+    await _drain(receiver, total)
+    legacy_received = receiver.received
+
+    names = plugin._resolve_targets("lab")
+    # 预热: 创建 UDP 端点
+    await plugin._wake_devices(names[:1])
+    await _drain(receiver, legacy_received + 1)
+    receiver.received = 0
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        await plugin._wake_devices(names)
+    current_elapsed = time.perf_counter() - start
+    await _drain(receiver, total)
+    current_received = receiver.received
+
+    await plugin.terminate()
+    receiver.running = False
+
+    print(f"=== {args.devices} 个设备 x {args.rounds} 轮 ===")
+    print(f"legacy:  {total / legacy_elapsed:,.0f} 设备/秒 ({legacy_elapsed:.3f}s, 收到 {legacy_received}/{total})")
+    print(f"current: {total / current_elapsed:,.0f} 设备/秒 ({current_elapsed:.3f}s, 收到 {current_received}/{total})")
+
+
+def _free_port() -> int:
+    # 绑定后立即关闭，得到一个当前没有监听的端口
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _listen_later(port, delay):
+    """delay 秒后开始在 port 上监听，模拟设备启动完成"""
+    await asyncio.sleep(delay)
+    return await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", port)
+
+
+async def run_reachability(args):
+    late_port, never_port, ready_port = _free_port(), _free_port(), _free_port()
+    ready = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", ready_port)
+    servers = [ready]
+    failures = []
+
+    def check(ok, message):
+        print(f"{'✅' if ok else '❌'} {message}")
+        if not ok:
+            failures.append(message)
+
+    try:
+        # 一台延迟启动、一台从不监听：延迟启动的设备按上线时间返回，另一台等满超时后返回 (None, None)
+        print(f"=== 延迟 {args.boot_delay:g}s 上线的端口 {late_port}，从不监听的端口 {never_port}，"
+              f"轮询间隔 {args.check_interval:g}s ===")
+        listener = asyncio.create_task(_listen_later(late_port, args.boot_delay))
+        start = time.perf_counter()
+        results = await wait_until_reachable({
+            "late": ("127.0.0.1", [never_port, late_port], args.boot_delay * 4),
+            "never": ("127.0.0.1", [never_port], args.boot_delay * 2),
+        }, args.check_interval, 0.5)
+        elapsed = time.perf_counter() - start
+        servers.append(await listener)
+        late_elapsed, late_open = results["late"]
+        check(late_open == late_port, f"late 通过端口 {late_open} 连接成功")
+        limit = args.boot_delay + args.check_interval + 0.5
+        check(late_elapsed is not None and args.boot_delay <= late_elapsed <= limit,
+              f"late 上线耗时 {late_elapsed or 0:.2f}s，应在 {args.boot_delay:g}s 到 {limit:g}s 之间")
+        check(results["never"] == (None, None), f"never 超时结果为 {results['never']}")
+        check(args.boot_delay * 2 <= elapsed < args.boot_delay * 4,
+              f"总耗时 {elapsed:.2f}s，等满 never 的超时 {args.boot_delay * 2:g}s，未等 late 的超时 {args.boot_delay * 4:g}s")
+
+        # 最后一台设备上线后立即返回，不等超时
+        print("=== 所有设备上线后立即返回 ===")
+        late_port = _free_port()
+        listener = asyncio.create_task(_listen_later(late_port, args.boot_delay))
+        start = time.perf_counter()
+        results = await wait_until_reachable({
+            "late": ("127.0.0.1", [late_port], 60),
+            "ready": ("127.0.0.1", [ready_port], 60),
+        }, args.check_interval, 0.5)
+        elapsed = time.perf_counter() - start
+        servers.append(await listener)
+        check(results["late"][1] == late_port and results["ready"][1] == ready_port,
+              f"late 通过端口 {results['late'][1]}、ready 通过端口 {results['ready'][1]} 连接成功")
+        check(results["ready"][0] is not None and results["ready"][0] < args.check_interval,
+              f"ready 上线耗时 {results['ready'][0] or 0:.2f}s，首次检测即可连接")
+        check(elapsed <= limit, f"总耗时 {elapsed:.2f}s，late 上线后即返回，未等超时 60s")
+    finally:
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+
+    if failures:
+        raise SystemExit(f"{len(failures)} 项检查未通过")
+    print("全部检查通过")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wake-on-LAN 发送性能测试")
+    parser.add_argument("--devices", type=int, default=1000, help="模拟设备数")
+    parser.add_argument("--rounds", type=int, default=20, help="批量唤醒轮数")
+    parser.add_argument("--reachability", action="store_true", help="检查启动检测的上线耗时、超时结果和提前返回")
+    parser.add_argument("--boot-delay", type=float, default=1.0, help="模拟设备启动耗时 (秒)")
+    parser.add_argument("--check-interval", type=float, default=0.2, help="启动检测轮询间隔 (秒)")
+    args = parser.parse_args()
+    if args.reachability:
+        asyncio.run(run_reachability(args))
+    else:
+        asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,79 @@
-import socket
+import ipaddress
 import re
-from typing import Dict, Set
+import time
+from typing import Dict, List, Set
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger, AstrBotConfig
 
+from .reachability import wait_until_reachable
+from .sender import MagicPacketSender
+from .status_sweeper import StatusSweeper
+
 
 @register("Wake-on-LAN", "cloudcranesss", "通过发送魔术包唤醒局域网内的设备", "1.0.0",
           "https://github.com/cloudcranesss/astrbot_plugins/astrbot_plugin_wake_on_lan")
 class WakeOnLan(Star):
+    MAC_PATTERN = re.compile(r'^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$')
+    # SecureOn 密码为 6 字节，写法与 MAC 地址相同
+    PASSWORD_PATTERN = re.compile(r'^([0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}$')
+
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.config = config
+        # 唤醒后的启动检测：轮询设备端口直到可以连接
+        self.verify_after_wake = bool(self.config.get("verify_after_wake", False))
+        self.check_ports = self._parse_ports(self.config.get("check_ports", "22,3389"))
+        self.boot_timeout = float(self.config.get("boot_timeout", 180))
+        self.check_interval = float(self.config.get("check_interval", 3))
+        self.connect_timeout = float(self.config.get("connect_timeout", 1))
         self.devices = self._load_devices()
         self.whitelist = self._load_whitelist()
+        # 每个设备发送魔术包的次数与相邻数据包的间隔 (毫秒)
+        self.repeat = max(1, int(self.config.get("repeat", 3)))
+        self.interval = max(0, int(self.config.get("interval", 20))) / 1000
+        self.sender = MagicPacketSender()
+        # 后台巡检设备在线状态，/wake ls 直接读取缓存
+        self.sweep_interval = float(self.config.get("sweep_interval", 60))
+        self.sweeper = StatusSweeper(
+            self._sweep_targets,
+            interval=self.sweep_interval,
+            concurrency=int(self.config.get("sweep_concurrency", 32)),
+            connect_timeout=self.connect_timeout
+        )
         logger.info(f"Wake-on-LAN 插件初始化完成，已加载 {len(self.devices)} 个设备，白名单用户: {len(self.whitelist)} 人")
 
-    def _load_devices(self) -> Dict[str, Dict[str, str]]:
+    @filter.on_astrbot_loaded()
+    async def on_start(self):
+        """AstrBot 加载完成后启动设备状态巡检"""
+        if self.sweep_interval > 0:
+            self.sweeper.start()
+
+    def _sweep_targets(self) -> Dict[str, tuple]:
+        return {
+            dev_name: (info["ip"], info["check_ports"])
+            for dev_name, info in self.devices.items()
+            if info["ip"] and info["check_ports"]
+        }
+
+    def _format_age(self, timestamp: float) -> str:
+        age = max(0, int(time.time() - timestamp))
+        if age < 60:
+            return f"{age} 秒前"
+        if age < 3600:
+            return f"{age // 60} 分钟前"
+        return f"{age // 3600} 小时前"
+
+    def _format_status(self, dev_name: str) -> str:
+        if not self.devices[dev_name]["ip"]:
+            return ""
+        state = self.sweeper.get(dev_name)
+        if state is None:
+            return "⚪ 未检测 "
+        status = "🟢 在线" if state["up"] else "🔴 离线"
+        return f"{status} (检测于 {self._format_age(state['checked_at'])}) "
+
+    def _load_devices(self) -> Dict[str, dict]:
         devices = {}
         devices_config = self.config.get("devices", [])
         for device in devices_config:
@@ -24,10 +81,56 @@ class WakeOnLan(Star):
             mac = device.get("mac", "").upper()
             broadcast = device.get("broadcast", "255.255.255.255")
             port = device.get("port", 9)
+            groups = self._parse_groups(device.get("group", ""))
+            password = device.get("password", "")
             if name and mac:
-                devices[name] = {"mac": mac, "broadcast": broadcast, "port": port}
+                devices[name] = self._make_device(mac, broadcast, port, groups, password)
+                # 启动检测使用的 IP、端口和超时，端口与超时未配置时使用全局设置
+                devices[name]["ip"] = device.get("ip", "").strip()
+                devices[name]["check_ports"] = self._parse_ports(device.get("check_ports", "")) or self.check_ports
+                devices[name]["boot_timeout"] = float(device.get("boot_timeout", 0) or self.boot_timeout)
         return devices
 
+    def _make_device(self, mac: str, broadcast: str, port: int, groups: List[str], password: str = "") -> dict:
+        """生成设备信息，魔术包在此预先构建，唤醒时直接发送"""
+        device = {"mac": mac, "broadcast": broadcast, "port": int(port), "groups": groups,
+                  "password": password, "packet": None, "error": None,
+                  "ip": "", "check_ports": self.check_ports, "boot_timeout": self.boot_timeout}
+        try:
+            device["packet"] = self._build_packet(mac, password)
+        except ValueError as e:
+            device["error"] = str(e)
+            logger.warning(f"设备 {mac} 配置无效: {e}")
+        return device
+
+    def _parse_groups(self, group: str) -> List[str]:
+        # 一个设备可属于多个分组，用逗号分隔
+        return [g.strip() for g in re.split(r"[,，]", group or "") if g.strip()]
+
+    def _parse_ports(self, ports) -> List[int]:
+        """解析检测端口，忽略 1-65535 以外的端口"""
+        if isinstance(ports, int):
+            values = [ports]
+        elif isinstance(ports, list):
+            values = [int(p) for p in ports if str(p).strip().isdigit()]
+        else:
+            values = [int(p) for p in re.split(r"[,，\s]+", ports or "") if p.strip().isdigit()]
+        invalid = [p for p in values if not 1 <= p <= 65535]
+        if invalid:
+            logger.warning(f"检测端口超出范围 1-65535，已忽略: {invalid}")
+        return [p for p in values if 1 <= p <= 65535]
+
+    def _resolve_targets(self, target: str) -> List[str]:
+        """将 /wake on 的参数解析为设备名列表：设备名、分组名或 all"""
+        if target in self.devices:
+            return [target]
+        members = [dev_name for dev_name, info in self.devices.items() if target in info["groups"]]
+        if members:
+            return members
+        if target.lower() == "all":
+            return list(self.devices.keys())
+        return []
+
     def _load_whitelist(self) -> Set[str]:
         whitelist_config = self.config.get("whitelist", [])
         return set(str(uid).strip() for uid in whitelist_config if uid)
@@ -39,37 +142,83 @@ class WakeOnLan(Star):
         return user_id in self.whitelist
 
     def _validate_mac(self, mac: str) -> bool:
-        pattern = r'^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$'
-        return bool(re.match(pattern, mac))
+        return bool(self.MAC_PATTERN.match(mac))
 
     def _mac_to_bytes(self, mac: str) -> bytes:
         mac_clean = mac.replace(":", "").replace("-", "").replace(" ", "")
         return bytes.fromhex(mac_clean)
 
-    async def _wake_device(self, mac: str, broadcast: str = "255.255.255.255", port: int = 9) -> bool:
+    def _build_packet(self, mac: str, password: str = "") -> bytes:
+        """魔术包: 6 个 0xFF + MAC 重复 16 次，启用 SecureOn 时再附加 6 字节密码"""
         try:
             mac_bytes = self._mac_to_bytes(mac)
-            magic_packet = b'\xff' * 6 + mac_bytes * 16
+        except ValueError:
+            mac_bytes = b""
+        if len(mac_bytes) != 6:
+            raise ValueError(f"MAC 地址无效: {mac}")
+        packet = b'\xff' * 6 + mac_bytes * 16
+        if password:
+            if not self.PASSWORD_PATTERN.match(password):
+                raise ValueError(f"SecureOn 密码格式错误: {password}")
+            packet += self._mac_to_bytes(password)
+        return packet
 
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            sock.sendto(magic_packet, (broadcast, port))
-            sock.close()
-            logger.info(f"成功发送 Wake-on-LAN 魔术包到 {mac}")
-            return True
-        except Exception as e:
-            logger.error(f"发送 Wake-on-LAN 魔术包失败: {e}")
-            return False
+    async def _wake_devices(self, names: List[str]) -> Dict[str, str]:
+        """唤醒多个设备，返回 {设备名: 错误信息}，成功的设备错误信息为 None"""
+        targets = []
+        results = {}
+        for dev_name in names:
+            device = self.devices[dev_name]
+            if device["packet"] is None:
+                results[dev_name] = device["error"]
+                continue
+            targets.append((dev_name, device["packet"], (device["broadcast"], device["port"])))
+        if targets:
+            try:
+                results.update(await self.sender.send_many(targets, self.repeat, self.interval))
+            except Exception as e:
+                logger.error(f"发送 Wake-on-LAN 魔术包失败: {e}")
+                for dev_name, _, _ in targets:
+                    results[dev_name] = str(e)
+        sent = sum(1 for error in results.values() if error is None)
+        logger.info(f"Wake-on-LAN 魔术包已发送: {sent}/{len(names)} 个设备")
+        return results
+
+    async def _verify_devices(self, names: List[str]) -> str:
+        """等待已唤醒的设备启动，返回每个设备的启动耗时报告"""
+        targets = {
+            dev_name: (self.devices[dev_name]["ip"], self.devices[dev_name]["check_ports"],
+                       self.devices[dev_name]["boot_timeout"])
+            for dev_name in names
+            if self.devices[dev_name]["ip"] and self.devices[dev_name]["check_ports"]
+        }
+        results = await wait_until_reachable(targets, self.check_interval, self.connect_timeout)
+        online = sum(1 for elapsed, _ in results.values() if elapsed is not None)
+        report = [f"启动检测结果: {online}/{len(targets)} 个设备已上线"]
+        for dev_name in names:
+            if dev_name not in results:
+                report.append(f"⚪ {dev_name}: 未配置 IP，跳过检测")
+                continue
+            elapsed, port = results[dev_name]
+            self.sweeper.update(dev_name, elapsed is not None, port)
+            if elapsed is not None:
+                report.append(f"✅ {dev_name}: {elapsed:.1f} 秒后可连接 (端口 {port})")
+            else:
+                report.append(f"❌ {dev_name}: {self.devices[dev_name]['boot_timeout']:.0f} 秒内未响应")
+        logger.info(f"Wake-on-LAN 启动检测完成: {online}/{len(targets)} 个设备已上线")
+        return "\n".join(report)
 
     def _get_help(self) -> str:
         return """Wake-on-LAN 使用指南:
 /wake on <设备名> - 唤醒指定设备
-/wake ls - 查看已配置的设备
-/wake add <设备名> <MAC> [广播] [端口] - 添加设备 (管理员)
+/wake on <分组名> - 唤醒分组内的所有设备
+/wake on all - 唤醒所有设备
+/wake ls - 查看已配置的设备及在线状态
+/wake add <设备名> <MAC> [广播] [端口] [分组] [SecureOn密码] [IP] - 添加设备 (管理员)，不需要的可选参数填 -
 /wake del <设备名> - 删除设备 (管理员)"""
 
     @filter.command("wake")
-    async def wake_command(self, event: AstrMessageEvent, action: str = "", name: str = "", mac: str = "", broadcast: str = "255.255.255.255", port: int = 9):
+    async def wake_command(self, event: AstrMessageEvent, action: str = "", name: str = "", mac: str = "", broadcast: str = "255.255.255.255", port: int = 9, group: str = "", password: str = "", ip: str = ""):
         if not self._is_allowed(event):
             yield event.plain_result("❌ 您不在白名单中，无法使用此功能")
             return
@@ -86,39 +235,92 @@ class WakeOnLan(Star):
                 return
             result = ["已配置的设备:"]
             for dev_name, info in self.devices.items():
-                result.append(f"• {dev_name}: {info['mac']} (广播: {info['broadcast']}, 端口: {info['port']})")
+                groups = f", 分组: {'/'.join(info['groups'])}" if info['groups'] else ""
+                secure_on = ", SecureOn" if info['password'] else ""
+                result.append(f"• {self._format_status(dev_name)}{dev_name}: {info['mac']} (广播: {info['broadcast']}, 端口: {info['port']}{groups}{secure_on})")
+            metrics = self.sweeper.metrics
+            if self.sweep_interval > 0 and metrics["last_sweep_at"]:
+                result.append(
+                    f"\n状态巡检: 每 {self.sweep_interval:g} 秒一次，共 {metrics['sweeps']} 轮，"
+                    f"上次 {self._format_age(metrics['last_sweep_at'])} 检测 {metrics['last_checked']} 个设备 "
+                    f"({metrics['last_online']} 在线)，耗时 {metrics['last_duration']:.2f} 秒"
+                )
             yield event.plain_result("\n".join(result))
             return
 
         if action == "on":
             if not name:
-                yield event.plain_result("用法: /wake on <设备名>")
+                yield event.plain_result("用法: /wake on <设备名|分组名|all>")
                 return
             name = name.strip()
-            if name not in self.devices:
+            names = self._resolve_targets(name)
+            if not names:
                 available = ", ".join(self.devices.keys()) if self.devices else "无"
-                yield event.plain_result(f"未找到设备: {name}\n可用设备: {available}")
+                groups = sorted({g for info in self.devices.values() for g in info["groups"]})
+                msg = f"未找到设备或分组: {name}\n可用设备: {available}"
+                if groups:
+                    msg += f"\n可用分组: {', '.join(groups)}"
+                yield event.plain_result(msg)
                 return
-            device = self.devices[name]
-            yield event.plain_result(f"正在唤醒设备: {name} ({device['mac']}) ...")
-            success = await self._wake_device(device['mac'], device['broadcast'], device['port'])
-            if success:
-                yield event.plain_result(f"✅ 设备 {name} 唤醒信号已发送！")
+            if len(names) == 1:
+                device = self.devices[names[0]]
+                yield event.plain_result(f"正在唤醒设备: {names[0]} ({device['mac']}) ...")
+            else:
+                yield event.plain_result(f"正在唤醒 {name} 中的 {len(names)} 个设备 ...")
+            results = await self._wake_devices(names)
+            sent = [dev_name for dev_name in names if results[dev_name] is None]
+            if len(names) == 1:
+                error = results[names[0]]
+                if error is None:
+                    yield event.plain_result(f"✅ 设备 {names[0]} 唤醒信号已发送！")
+                else:
+                    yield event.plain_result(f"❌ 设备 {names[0]} 唤醒失败: {error}")
             else:
-                yield event.plain_result(f"❌ 设备 {name} 唤醒失败")
+                report = [f"唤醒信号已发送: {len(sent)}/{len(names)}"]
+                for dev_name in names:
+                    error = results[dev_name]
+                    if error is None:
+                        report.append(f"✅ {dev_name}")
+                    else:
+                        report.append(f"❌ {dev_name}: {error}")
+                yield event.plain_result("\n".join(report))
+
+            if self.verify_after_wake and any(self.devices[dev_name]["ip"] for dev_name in sent):
+                yield event.plain_result("正在等待设备启动 ...")
+                yield event.plain_result(await self._verify_devices(sent))
             return
 
         if action == "add":
             if not name or not mac:
-                yield event.plain_result("用法: /wake add <设备名> <MAC地址> [广播地址] [端口]\n示例: /wake add 客厅电脑 AA:BB:CC:DD:EE:FF")
+                yield event.plain_result("用法: /wake add <设备名> <MAC地址> [广播地址] [端口] [分组] [SecureOn密码] [IP]\n"
+                                         "不需要的可选参数填 -\n"
+                                         "示例: /wake add 客厅电脑 AA:BB:CC:DD:EE:FF 255.255.255.255 9 - - 192.168.1.100")
                 return
+            # 用 - 占位跳过分组和密码，以便在后面填写 IP
+            group = "" if group == "-" else group
+            password = "" if password == "-" else password
+            ip = "" if ip == "-" else ip.strip()
             mac = mac.upper()
             if not self._validate_mac(mac):
                 yield event.plain_result(f"MAC 地址格式错误: {mac}\n正确格式: AA:BB:CC:DD:EE:FF")
                 return
-            self.devices[name] = {"mac": mac, "broadcast": broadcast, "port": port}
-            logger.info(f"添加设备: {name} - {mac}")
-            yield event.plain_result(f"✅ 设备 {name} (MAC: {mac}) 添加成功！")
+            password = password.upper()
+            if password and not self.PASSWORD_PATTERN.match(password):
+                yield event.plain_result(f"SecureOn 密码格式错误: {password}\n正确格式: AA:BB:CC:DD:EE:FF")
+                return
+            if ip:
+                try:
+                    ipaddress.ip_address(ip)
+                except ValueError:
+                    yield event.plain_result(f"IP 地址格式错误: {ip}\n正确格式: 192.168.1.100")
+                    return
+            # 覆盖同名设备时清除旧设备的在线状态
+            self.sweeper.forget(name)
+            self.devices[name] = self._make_device(mac, broadcast, port, self._parse_groups(group), password)
+            # 填写 IP 的设备使用全局的检测端口和超时，参与启动检测和状态巡检
+            self.devices[name]["ip"] = ip
+            logger.info(f"添加设备: {name} - {mac}{f' ({ip})' if ip else ''}")
+            yield event.plain_result(f"✅ 设备 {name} (MAC: {mac}{f', IP: {ip}' if ip else ''}) 添加成功！")
             return
 
         if action == "del" or action == "delete" or action == "remove":
@@ -127,6 +329,7 @@ class WakeOnLan(Star):
                 return
             if name in self.devices:
                 del self.devices[name]
+                self.sweeper.forget(name)
                 logger.info(f"删除设备: {name}")
                 yield event.plain_result(f"✅ 设备 {name} 已删除")
             else:
@@ -136,4 +339,5 @@ class WakeOnLan(Star):
         yield event.plain_result(f"未知指令: {action}\n" + self._get_help())
 
     async def terminate(self):
-        pass
+        self.sweeper.stop()
+        self.sender.close()
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+async def tcp_probe(host: str, ports: List[int], timeout: float = 1.0) -> Optional[int]:
+    """并发尝试连接设备的各个端口，返回第一个连接成功的端口，全部失败时返回 None
+
+    只有完成 TCP 握手才视为在线，端口拒绝连接不算。
+    """
+    async def connect(port):
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (OSError, asyncio.TimeoutError, ValueError, OverflowError):
+            # 无效的地址或端口也视为无法连接，不影响其他端口和设备的检测
+            return None
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return port
+
+    tasks = [asyncio.create_task(connect(port)) for port in ports]
+    try:
+        for future in asyncio.as_completed(tasks):
+            port = await future
+            if port is not None:
+                return port
+    finally:
+        for task in tasks:
+            task.cancel()
+    return None
+
+
+async def wait_until_reachable(targets: Dict[str, Tuple[str, List[int], float]],
+                               interval: float = 2.0,
+                               connect_timeout: float = 1.0) -> Dict[str, Tuple[Optional[float], Optional[int]]]:
+    """并发轮询多个设备直到可以连接或超时
+
+    targets: {设备名: (IP, 端口列表, 最长等待时间 (秒))}
+    返回 {设备名: (从开始等待到可连接的耗时, 连接成功的端口)}，超时的设备为 (None, None)。
+    所有设备都上线后立即返回，不会等满超时时间。
+    """
+    start = time.monotonic()
+
+    async def poll(host, ports, boot_timeout):
+        deadline = start + boot_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, None
+            port = await tcp_probe(host, ports, min(connect_timeout, remaining))
+            if port is not None:
+                return time.monotonic() - start, port
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, None
+            await asyncio.sleep(min(interval, remaining))
+
+    names = list(targets.keys())
+    results = await asyncio.gather(*(poll(*targets[name]) for name in names))
+    return dict(zip(names, results))
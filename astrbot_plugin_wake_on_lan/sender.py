@@ -0,0 +1,105 @@
+import asyncio
+import ipaddress
+import socket
+from typing import Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+
+class _WakeProtocol(asyncio.DatagramProtocol):
+    """记录发送时立即返回的错误，供调用方判断单个数据包是否发送成功"""
+
+    def __init__(self):
+        self.last_error: Optional[Exception] = None
+
+    def error_received(self, exc):
+        self.last_error = exc
+
+
+class MagicPacketSender:
+    """通过一个长期复用的非阻塞 UDP 端点发送魔术包
+
+    端点在第一次发送时创建，插件卸载时关闭。
+    广播地址为主机名时通过事件循环异步解析并缓存，sendto 本身不会触发阻塞的 DNS 查询。
+    """
+
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.protocol: Optional[_WakeProtocol] = None
+        self._lock = asyncio.Lock()
+        self._resolved: Dict[Tuple[str, int], Tuple[str, int]] = {}
+
+    async def _ensure_endpoint(self):
+        async with self._lock:
+            if self.transport is not None and not self.transport.is_closing():
+                return
+            loop = asyncio.get_running_loop()
+            self.transport, self.protocol = await loop.create_datagram_endpoint(
+                _WakeProtocol,
+                family=socket.AF_INET,
+                allow_broadcast=True
+            )
+
+    async def _resolve(self, addr: Tuple[str, int]) -> Tuple[str, int]:
+        host, port = addr
+        try:
+            ipaddress.IPv4Address(host)
+            return addr
+        except ValueError:
+            pass
+        if addr not in self._resolved:
+            loop = asyncio.get_running_loop()
+            infos = await loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            self._resolved[addr] = infos[0][4]
+        return self._resolved[addr]
+
+    def _send(self, packet: bytes, addr: Tuple[str, int]) -> Optional[str]:
+        """发送单个数据包，失败时返回错误信息"""
+        self.protocol.last_error = None
+        try:
+            self.transport.sendto(packet, addr)
+        except Exception as e:
+            return str(e)
+        if self.protocol.last_error is not None:
+            return str(self.protocol.last_error)
+        return None
+
+    async def send_many(self, targets: List[Tuple[str, bytes, Tuple[str, int]]],
+                        repeat: int = 3, interval: float = 0.02) -> Dict[str, Optional[str]]:
+        """按轮次向所有目标发送魔术包
+
+        targets: [(设备名, 魔术包, (广播地址, 端口))]
+        repeat: 每个设备发送的次数，UDP 不保证送达，多发几次提高成功率
+        interval: 相邻两个数据包之间的间隔 (秒)，避免瞬间打满交换机或网卡缓冲
+        返回 {设备名: 错误信息}，至少有一个数据包发送成功即视为成功 (None)
+        """
+        await self._ensure_endpoint()
+        results: Dict[str, Optional[str]] = {}
+        resolved = []
+        for name, packet, addr in targets:
+            try:
+                resolved.append((name, packet, await self._resolve(addr)))
+            except Exception as e:
+                results[name] = f"无法解析地址 {addr[0]}: {e}"
+
+        first = True
+        for _ in range(max(1, repeat)):
+            for name, packet, addr in resolved:
+                if not first and interval > 0:
+                    await asyncio.sleep(interval)
+                first = False
+                error = self._send(packet, addr)
+                if error is None:
+                    results[name] = None
+                elif results.get(name, error) is not None:
+                    results[name] = error
+        for name, error in results.items():
+            if error:
+                logger.error(f"发送 Wake-on-LAN 魔术包到 {name} 失败: {error}")
+        return results
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+            self.protocol = None
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .reachability import tcp_probe
+
+
+class StatusSweeper:
+    """后台定期检测所有设备是否在线，并缓存检测结果
+
+    get_targets: 返回 {设备名: (IP, 端口列表)} 的回调，每轮巡检时调用，设备增删后自动生效
+    interval: 两轮巡检之间的间隔 (秒)
+    concurrency: 同时检测的设备数上限
+    """
+
+    def __init__(self, get_targets: Callable[[], Dict[str, Tuple[str, List[int]]]],
+                 interval: float = 60, concurrency: int = 32, connect_timeout: float = 1.0):
+        self.get_targets = get_targets
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.connect_timeout = connect_timeout
+        # {设备名: {"up": 是否在线, "port": 连接成功的端口, "checked_at": 检测时间, "changed_at": 状态变化时间}}
+        self.states: Dict[str, dict] = {}
+        self.metrics = {
+            "sweeps": 0,
+            "last_sweep_at": None,
+            "last_duration": 0.0,
+            "last_checked": 0,
+            "last_online": 0,
+        }
+        # 设备被删除或覆盖的次数，巡检期间发生变化时丢弃旧设备的检测结果
+        self._generations: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Wake-on-LAN 设备状态巡检失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self):
+        """并发检测所有配置了 IP 的设备"""
+        targets = self.get_targets()
+        generations = {name: self._generations.get(name, 0) for name in targets}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.monotonic()
+
+        async def check(name, host, ports):
+            async with semaphore:
+                port = await tcp_probe(host, ports, self.connect_timeout)
+            if self._generations.get(name, 0) == generations[name]:
+                self.update(name, port is not None, port)
+
+        await asyncio.gather(*(check(name, host, ports) for name, (host, ports) in targets.items()))
+
+        # 清除已删除或不再检测的设备
+        for name in list(self.states.keys()):
+            if name not in targets:
+                del self.states[name]
+
+        duration = time.monotonic() - start
+        online = sum(1 for name in targets if self.states.get(name, {}).get("up"))
+        self.metrics.update({
+            "sweeps": self.metrics["sweeps"] + 1,
+            "last_sweep_at": time.time(),
+            "last_duration": duration,
+            "last_checked": len(targets),
+            "last_online": online,
+        })
+        logger.debug(f"Wake-on-LAN 设备状态巡检完成: {online}/{len(targets)} 在线，耗时 {duration:.2f}s")
+
+    def update(self, name: str, up: bool, port: Optional[int] = None):
+        """记录设备状态，启动检测的结果也通过这里写入缓存"""
+        now = time.time()
+        state = self.states.get(name)
+        changed_at = now if state is None or state["up"] != up else state["changed_at"]
+        self.states[name] = {"up": up, "port": port, "checked_at": now, "changed_at": changed_at}
+
+    def get(self, name: str) -> Optional[dict]:
+        return self.states.get(name)
+
+    def forget(self, name: str):
+        """清除设备的缓存状态，设备被删除或以同名重新添加时调用"""
+        self.states.pop(name, None)
+        self._generations[name] = self._generations.get(name, 0) + 1
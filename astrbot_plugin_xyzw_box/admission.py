@@ -0,0 +1,201 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from .metrics import mean_p95
+
+
+class RateLimiter:
+    """令牌桶限速，控制每秒发往 OCR 服务的请求数
+
+    rate: 每秒请求数，0 表示不限速
+    burst: 空闲后允许连续发出的请求数
+
+    令牌不足时先预留令牌 (余额可以为负) 再等待，等待期间不持有锁，各请求按调用顺序依次错开
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 2):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+
+    async def acquire(self) -> float:
+        """取得一个令牌，返回等待的时间 (秒)"""
+        if self.rate <= 0:
+            return 0.0
+        # 读取和更新余额之间没有 await，在事件循环中是原子的
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        wait = -self.tokens / self.rate
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # 取消的请求归还预留的令牌
+            self.tokens += 1
+            raise
+        return wait
+
+
+class QueueFull(Exception):
+    """排队的识别任务已达上限"""
+
+
+class AdmissionQueue:
+    """识别任务的准入队列
+
+    同时执行的任务数不超过 concurrency，其余任务排队。
+    出队时先在群之间轮询，再在同一个群的用户之间轮询，一个群或一个用户连续发送大量截图不会让其他人一直等待；
+    私聊按用户单独视为一个群。
+    """
+
+    # 计算平均值和 P95 使用的最近样本数
+    SAMPLES = 200
+    # 还没有完成的任务时，预计等待时间使用的单个任务耗时 (秒)
+    DEFAULT_JOB_TIME = 5.0
+
+    def __init__(self, concurrency: int = 4, max_queued: int = 32):
+        self.concurrency = max(1, concurrency)
+        self.max_queued = max(1, max_queued)
+        # {群: {用户: deque[(任务, future, 入队时间)]}}
+        self.groups: "OrderedDict[str, OrderedDict[str, deque]]" = OrderedDict()
+        self.queued = 0
+        self.running = 0
+        self.metrics = {
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_queued": 0,
+        }
+        self.wait_times: deque = deque(maxlen=self.SAMPLES)
+        self.run_times: deque = deque(maxlen=self.SAMPLES)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, group: str, user: str, job: Callable[[], Awaitable]) -> Tuple[asyncio.Future, int]:
+        """提交任务，返回 (任务结果的 future, 在队列中排第几位)，0 表示已开始执行"""
+        if self.queued >= self.max_queued:
+            self.metrics["rejected"] += 1
+            raise QueueFull("识别排队人数过多，请稍后重试")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (job, future, time.monotonic())
+        self.groups.setdefault(group, OrderedDict()).setdefault(user, deque()).append(entry)
+        self.queued += 1
+        self.metrics["max_queued"] = max(self.metrics["max_queued"], self.queued)
+        self._dispatch()
+        return future, self.position(entry)
+
+    def _order(self) -> List[tuple]:
+        """按轮询规则排出当前所有排队任务的出队顺序，不修改队列"""
+        groups = deque(
+            (group, deque((user, deque(entries)) for user, entries in users.items()))
+            for group, users in self.groups.items()
+        )
+        order = []
+        while groups:
+            group, users = groups.popleft()
+            user, entries = users.popleft()
+            order.append(entries.popleft())
+            if entries:
+                users.append((user, entries))
+            if users:
+                groups.append((group, users))
+        return order
+
+    def position(self, entry: tuple) -> int:
+        """任务在队列中排第几位，已出队时返回 0"""
+        for index, queued in enumerate(self._order()):
+            if queued is entry:
+                return index + 1
+        return 0
+
+    def eta(self, position: int) -> float:
+        """根据最近的任务耗时估算排在 position 位的任务还需等待多久 (秒)"""
+        if position <= 0:
+            return 0.0
+        job_time = sum(self.run_times) / len(self.run_times) if self.run_times else self.DEFAULT_JOB_TIME
+        return math.ceil(position / self.concurrency) * job_time
+
+    def _pop(self) -> Optional[tuple]:
+        while self.groups:
+            group, users = next(iter(self.groups.items()))
+            user, entries = next(iter(users.items()))
+            entry = entries.popleft()
+            self.queued -= 1
+            # 取出后移到队尾，实现轮询
+            if entries:
+                users.move_to_end(user)
+            else:
+                del users[user]
+            if users:
+                self.groups.move_to_end(group)
+            else:
+                del self.groups[group]
+            # 等待结果的用户已取消 (例如插件卸载) 时跳过
+            if not entry[1].done():
+                return entry
+        return None
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            entry = self._pop()
+            if entry is None:
+                return
+            self.running += 1
+            task = asyncio.create_task(self._run(*entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Callable[[], Awaitable], future: asyncio.Future, queued_at: float):
+        start = time.monotonic()
+        self.wait_times.append(start - queued_at)
+        try:
+            result = await job()
+        except asyncio.CancelledError:
+            # 任务被取消 (例如插件卸载) 时同时取消 future，等待结果的调用方不会一直挂起
+            self.metrics["failed"] += 1
+            future.cancel()
+            raise
+        except Exception as e:
+            self.metrics["failed"] += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.metrics["completed"] += 1
+            self.run_times.append(time.monotonic() - start)
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self.running -= 1
+            self._dispatch()
+
+    def cancel_all(self):
+        """取消排队和执行中的任务"""
+        for task in list(self._tasks):
+            task.cancel()
+        for users in self.groups.values():
+            for entries in users.values():
+                for _, future, _ in entries:
+                    future.cancel()
+        self.groups.clear()
+        self.queued = 0
+
+    def snapshot(self) -> dict:
+        """当前排队、执行中的任务数及最近样本的排队、执行耗时 (秒)"""
+        wait_avg, wait_p95 = mean_p95(self.wait_times)
+        run_avg, run_p95 = mean_p95(self.run_times)
+        return {
+            **self.metrics,
+            "queued": self.queued,
+            "running": self.running,
+            "wait_avg": wait_avg,
+            "wait_p95": wait_p95,
+            "run_avg": run_avg,
+            "run_p95": run_p95,
+        }
@@ -0,0 +1,684 @@
+"""宝箱识别图片处理流程压测
+
+在 AstrBot 环境中于仓库根目录运行:
+    python -m astrbot_plugin_xyzw_box.benchmark --images 50
+
+使用程序生成的模拟截图和本地模拟 OCR 服务 (/parse/image)，对比:
+- legacy: 旧流程，Base64 分块写入临时文件、裁剪结果保存为 JPEG 文件、OCR 前再读回，原图不删除
+- current: 当前流程，解码、裁剪、上传全部在内存中完成，默认两个区域拼接后只请求一次 OCR
+输出每张截图的平均/P95 耗时、OCR 请求数以及临时目录新增的文件数和字节数。
+
+图片处理阶段 (解码、裁剪) 在突发并发下的表现:
+    python -m astrbot_plugin_xyzw_box.benchmark --burst 32 --images 64
+分别使用线程和进程池、原始分辨率和缩小解码处理同一批截图，输出总耗时及图片处理阶段的排队、处理耗时。
+
+多个用户同时发送截图时的准入队列:
+    python -m astrbot_plugin_xyzw_box.benchmark --users 30 --groups 3 --ocr-rate 2
+第一个群的用户数占一半，对比不排队直接处理与经过准入队列处理时 OCR 服务的最大并发请求数、
+每秒请求数、排队耗时，以及每个群第一张截图的完成顺序。
+
+不符合要求的图片在读取过程中被拒绝的速度:
+    python -m astrbot_plugin_xyzw_box.benchmark --ingest
+对比旧流程 (完整下载或解码后再检查) 与当前流程被拒绝前服务端发送的字节数和耗时。
+
+OCR 偶尔出错时的区域重试:
+    python -m astrbot_plugin_xyzw_box.benchmark --fail-rate 0.2 --images 100
+对比关闭区域重试 (任一区域失败需用户重发整张截图) 与只重试失败区域时，每张截图的 OCR 请求数和用户重发次数。
+
+本地数字识别的准确率与耗时，分别按固定比例裁剪和定位面板后裁剪:
+    python -m astrbot_plugin_xyzw_box.benchmark --accuracy --images 200
+    python -m astrbot_plugin_xyzw_box.benchmark --accuracy --fixtures 截图目录 --templates 模板目录
+截图目录中的文件名需为真实值，格式: 预设积分_木头_白银_黄金_铂金.jpg，例如 4250_1200_345_67_8.jpg。
+未指定截图目录时使用随机数值、随机分辨率和随机布局 (普通手机、超长屏、模拟器、平板) 生成的模拟截图，
+按布局输出解析失败 (需要用户重发) 和结果错误的比例，以及面板定位耗时。
+
+批量识别与逐张识别的总耗时:
+    python -m astrbot_plugin_xyzw_box.benchmark --batch 20 --ocr-latency 0.3
+先按 --ocr-rate (默认与插件的 ocr_rate_limit 相同，为 2) 测试，再对比不限速时的表现。
+限速时两种方式的耗时都由 OCR 请求数和限速决定，批量识别的收益来自并发等待 OCR 响应。
+"""
+import argparse
+import asyncio
+import base64
+import io
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+import zlib
+
+import aiofiles
+import aiohttp
+from aiohttp import web
+from PIL import Image, ImageDraw, ImageFont
+
+from astrbot.api import logger
+
+from .image_stage import crop_image
+from .main import BaoXiangPlugin
+
+
+def make_screenshot(pre_code, counts, width=1080, height=2340, fmt="JPEG", seed=0, layout="phone"):
+    """生成模拟的游戏截图
+
+    预设积分绘制在顶部区域 (游戏画面高度 15%~30%，左半边)，四种宝箱数量横向排列在底部区域 (高度 75%~87%)。
+    layout 模拟不同设备的画面布局:
+    - phone: 游戏画面铺满截图
+    - tall: 超长屏，游戏按 16:9 设计，顶部面板贴顶部、底部面板贴底部，中间留出多余高度
+    - letterbox: 模拟器，游戏画面上下有黑边和标题栏
+    - pillarbox: 平板，游戏画面左右有黑边
+    """
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), (238, 214, 170))
+    # 游戏画面的位置和尺寸，以及面板纵向坐标的换算
+    left, top, game_width, game_height = 0, 0, width, height
+    if layout == "letterbox":
+        game_height = int(width * 2.17)
+        top = (height - game_height) // 2
+        img.paste((0, 0, 0), (0, 0, width, top))
+        img.paste((0, 0, 0), (0, top + game_height, width, height))
+    elif layout == "pillarbox":
+        game_width = int(height / 2.17)
+        left = (width - game_width) // 2
+        img.paste((0, 0, 0), (0, 0, left, height))
+        img.paste((0, 0, 0), (left + game_width, 0, width, height))
+
+    def y(fraction):
+        if layout == "tall":
+            design_height = width * 1.78
+            if fraction < 0.5:
+                return int(fraction * design_height)
+            return int(height - (1 - fraction) * design_height)
+        return top + int(fraction * game_height)
+
+    def x(fraction):
+        return left + int(fraction * game_width)
+
+    draw = ImageDraw.Draw(img)
+    if layout == "letterbox":
+        # 模拟器标题栏
+        draw.rectangle((0, 0, width, max(24, top // 3)), fill=(60, 60, 70))
+        draw.text((12, 4), "Emulator", fill=(220, 220, 220), font=ImageFont.load_default(size=max(12, top // 6)))
+    # 背景装饰，避免图片过于简单导致编码结果失真
+    for _ in range(60):
+        dx, dy = x(rng.random()), y(rng.random())
+        color = tuple(rng.randrange(120, 230) for _ in range(3))
+        draw.rectangle((dx, dy, min(dx + rng.randrange(20, 200), x(1) - 1),
+                        min(dy + rng.randrange(20, 120), y(1) - 1)), fill=color)
+
+    font = ImageFont.load_default(size=max(24, game_width // 16))
+    # 顶部面板
+    draw.rectangle((x(0), y(0.16), x(0.48), y(0.29)), fill=(250, 240, 220))
+    draw.text((x(0.06), y(0.2)), str(pre_code), fill=(40, 30, 20), font=font)
+    # 底部面板
+    draw.rectangle((x(0), y(0.76), x(1) - 1, y(0.86)), fill=(250, 240, 220))
+    for i, count in enumerate(counts):
+        draw.text((x(0.04 + i * 0.25), y(0.79)), str(count), fill=(40, 30, 20), font=font)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+class FakeOCRServer:
+    """模拟 OCR.space 的 /parse/image 接口
+
+    根据上传图片的宽高比区分顶部和底部区域，返回预先设定的文本。
+    请求文字坐标 (isOverlayRequired) 时视为拼接图，顶部文本位于图片上端，宝箱数量位于图片下端。
+    fail_rate: 模拟识别出错的概率，出错时随机漏掉最后一行文字，或把数字 0 识别为字母 O
+    """
+
+    def __init__(self, pre_code, counts, latency=0.05, fail_rate=0.0, seed=0):
+        self.pre_code = pre_code
+        self.counts = counts
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url = ""
+        self._runner = None
+
+    async def start(self, host="127.0.0.1"):
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post("/parse/image", self.handle_parse)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def text_for(self, img):
+        width, height = img.size
+        if width / height < 2.5:
+            return f"当前积分\n{self.pre_code}"
+        return "\n".join(str(count) for count in self.counts)
+
+    def overlay_for(self, img):
+        height = img.size[1]
+        lines = [{"LineText": str(self.pre_code), "MinTop": 10, "MaxHeight": 40}]
+        for i, count in enumerate(self.counts):
+            lines.append({"LineText": str(count), "MinTop": height - 50 * (len(self.counts) - i), "MaxHeight": 40})
+        return lines
+
+    def garble(self, lines):
+        """按 fail_rate 模拟识别错误"""
+        if self.rng.random() >= self.fail_rate:
+            return lines
+        if self.rng.random() < 0.5:
+            return lines[:-1]
+        return [line.replace("0", "O") for line in lines]
+
+    async def handle_parse(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            form = await request.post()
+            img = Image.open(io.BytesIO(form["file"].file.read()))
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        if form.get("isOverlayRequired") == "true":
+            lines = self.overlay_for(img)
+            texts = self.garble([line["LineText"] for line in lines])
+            lines = [dict(line, LineText=text) for line, text in zip(lines, texts)]
+            return web.json_response({"ParsedResults": [{
+                "ParsedText": "\n".join(line["LineText"] for line in lines),
+                "TextOverlay": {"Lines": lines, "HasOverlay": True}
+            }]})
+        text = "\n".join(self.garble(self.text_for(img).split("\n")))
+        return web.json_response({"ParsedResults": [{"ParsedText": text}]})
+
+
+async def legacy_process(plugin, base64_str, temp_dir):
+    """旧流程: 临时文件落盘"""
+    image_data = base64.b64decode(base64_str)
+    image_path = os.path.join(temp_dir, f"wx_image_{uuid.uuid4().hex}.jpg")
+    async with aiofiles.open(image_path, "wb") as f:
+        for i in range(0, len(image_data), 4096):
+            await f.write(image_data[i:i + 4096])
+
+    def crop(path):
+        img = Image.open(path)
+        img.load()
+        width, height = img.size
+        cut1_path = os.path.join(temp_dir, f"cut1_{uuid.uuid4().hex}.jpg")
+        cut2_path = os.path.join(temp_dir, f"cut2_{uuid.uuid4().hex}.jpg")
+        img.crop((0, int(height * 0.15), int(width * 0.5), int(height * 0.3))).save(cut1_path)
+        img.crop((0, int(height * 0.75), width, int(height * 0.87))).save(cut2_path)
+        return cut1_path, cut2_path
+
+    async def ocr(path):
+        async with aiofiles.open(path, "rb") as f:
+            data = await f.read()
+        return await plugin.async_ocr_text(data, os.path.basename(path))
+
+    cut1_path, cut2_path = await asyncio.to_thread(crop, image_path)
+    try:
+        cut1_text, cut2_text = await asyncio.gather(ocr(cut1_path), ocr(cut2_path))
+        pre_code = plugin.parse_pre_code(cut1_text)
+        materials = plugin.parse_materials(cut2_text)
+        return plugin.calculate_result(*materials, pre_code)
+    finally:
+        # 旧流程只删除裁剪结果，原图保留在临时目录
+        os.unlink(cut1_path)
+        os.unlink(cut2_path)
+
+
+async def current_process(plugin, base64_str):
+    return await plugin.process_image(plugin.decode_base64_image(base64_str))
+
+
+def dir_usage(path):
+    files = [os.path.join(path, name) for name in os.listdir(path)]
+    return len(files), sum(os.path.getsize(f) for f in files)
+
+
+def summarize(name, timings, requests, files, size):
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:8s} 平均 {statistics.mean(timings) * 1000:7.1f}ms  P95 {p95 * 1000:7.1f}ms  "
+          f"OCR 请求 {requests / len(timings):.1f} 次/张  临时目录新增 {files} 个文件 / {size / 1024:.0f} KiB")
+
+
+def load_fixtures(args):
+    """返回 [(文件名, 布局, 图片字节, (预设积分, (木头, 白银, 黄金, 铂金)))]"""
+    fixtures = []
+    if args.fixtures:
+        for name in sorted(os.listdir(args.fixtures)):
+            values = os.path.splitext(name)[0].split("_")
+            if len(values) != 5 or not all(v.isdigit() for v in values):
+                continue
+            with open(os.path.join(args.fixtures, name), "rb") as f:
+                data = f.read()
+            values = [int(v) for v in values]
+            fixtures.append((name, "fixtures", data, (values[0], tuple(values[1:]))))
+        return fixtures
+
+    rng = random.Random(0)
+    for i in range(args.images):
+        pre_code = rng.randrange(0, 10000)
+        counts = tuple(rng.randrange(0, 3000) for _ in range(4))
+        layout = rng.choice(["phone", "tall", "letterbox", "pillarbox"])
+        width = rng.choice([720, 1080, 1440])
+        if layout == "phone":
+            height = int(width * rng.choice([1.78, 2.0, 2.17, 2.22]))
+        elif layout == "tall":
+            height = int(width * rng.choice([2.4, 2.5, 2.6]))
+        elif layout == "letterbox":
+            height = int(width * rng.choice([2.4, 2.6, 2.8]))
+        else:
+            width, height = width * 2, int(width * 2 * rng.choice([1.33, 1.6]))
+        fmt = rng.choice(["JPEG", "PNG"])
+        data = make_screenshot(pre_code, counts, width=width, height=height, fmt=fmt, seed=i, layout=layout)
+        fixtures.append((f"{layout}_{width}x{height}.{fmt.lower()}", layout, data, (pre_code, counts)))
+    return fixtures
+
+
+async def run_accuracy(args):
+    logger.setLevel(logging.WARNING)
+    plugin = BaoXiangPlugin(None, {"ocr_engine": "local", "local_ocr_templates": args.templates})
+    fixtures = load_fixtures(args)
+    if not fixtures:
+        print("没有可用的截图")
+        return
+
+    total = len(fixtures)
+    for detect_layout in (False, True):
+        timings, detect_timings = [], []
+        correct, pre_code_correct, materials_correct = 0, 0, 0
+        # {布局: [截图数, 解析失败数, 结果错误数, 出现不可靠本地结果的截图数]}
+        by_layout = {}
+        for name, layout, data, expected in fixtures:
+            crops = crop_image(data, min_width=args.decode_min_width, detect_layout=detect_layout)
+            detect_timings.append(crops["detect_time"])
+            counts = by_layout.setdefault(layout, [0, 0, 0, 0])
+            counts[0] += 1
+            unreliable = plugin.local_stats["unreliable"]
+            start = time.perf_counter()
+            try:
+                result = (await plugin._ocr_separately(crops))[:2]
+            except Exception as e:
+                result = (None, None)
+                counts[1] += 1
+                if args.verbose:
+                    print(f"{name}: 解析失败 {e}")
+            # 未配置OCR服务，不可靠的本地结果会先重试二值化放大后的图片，仍不可靠时报错；配置后改用OCR服务识别
+            counts[3] += plugin.local_stats["unreliable"] > unreliable
+            timings.append(time.perf_counter() - start)
+            pre_code_correct += result[0] == expected[0]
+            materials_correct += result[1] == expected[1]
+            if result == expected:
+                correct += 1
+            elif result[0] is not None:
+                counts[2] += 1
+                if args.verbose:
+                    print(f"{name}: 期望 {expected}，识别为 {result}")
+
+        print(f"=== 本地数字识别: {total} 张截图，{'定位面板后裁剪' if detect_layout else '按固定比例裁剪'} ===")
+        print(f"完全正确: {correct / total:.1%}  预设积分: {pre_code_correct / total:.1%}  宝箱数量: {materials_correct / total:.1%}")
+        timings.sort()
+        print(f"识别 平均 {statistics.mean(timings) * 1000:.1f}ms  P95 {timings[max(0, int(total * 0.95) - 1)] * 1000:.1f}ms")
+        if detect_layout:
+            detect_timings.sort()
+            print(f"面板定位 平均 {statistics.mean(detect_timings) * 1000:.1f}ms  "
+                  f"P95 {detect_timings[max(0, int(total * 0.95) - 1)] * 1000:.1f}ms")
+        for layout, (count, failed, wrong, unreliable) in sorted(by_layout.items()):
+            print(f"  {layout:10s} {count:4d} 张  解析失败 {failed / count:6.1%}  结果错误 {wrong / count:6.1%}  "
+                  f"本地不可靠 {unreliable / count:6.1%}")
+    await plugin.terminate()
+
+
+async def run_burst(args):
+    logger.setLevel(logging.WARNING)
+    images = [
+        make_screenshot(4250, (1200, 345, 67, 8), width=1440, height=3120, fmt="JPEG", seed=i)
+        for i in range(args.images)
+    ]
+    print(f"=== {args.images} 张 1440x3120 JPEG 截图，每批 {args.burst} 张并发 ===")
+    for workers, min_width in ((0, 0), (0, args.decode_min_width), (args.image_workers, 0),
+                               (args.image_workers, args.decode_min_width)):
+        plugin = BaoXiangPlugin(None, {
+            "image_workers": workers, "image_queue_size": args.burst, "decode_min_width": min_width, "cache_ttl": 0
+        })
+        # 预先启动进程，避免把进程启动时间计入结果
+        await plugin.crop_image(images[0])
+        plugin.image_stage.wait_times.clear()
+        plugin.image_stage.run_times.clear()
+
+        start = time.perf_counter()
+        for i in range(0, len(images), args.burst):
+            await asyncio.gather(*(plugin.crop_image(data) for data in images[i:i + args.burst]))
+        elapsed = time.perf_counter() - start
+
+        stats = plugin.image_stage.snapshot()
+        mode = f"{workers} 进程" if workers else "线程"
+        scale = f"宽度≥{min_width}" if min_width else "原始分辨率"
+        print(f"{mode:5s} {scale:8s} 总耗时 {elapsed * 1000:7.0f}ms  {len(images) / elapsed:6.1f} 张/秒  "
+              f"排队 平均 {stats['wait_avg'] * 1000:6.1f}ms P95 {stats['wait_p95'] * 1000:6.1f}ms  "
+              f"处理 平均 {stats['run_avg'] * 1000:5.1f}ms  最大排队 {stats['max_queue_depth']}")
+        await plugin.terminate()
+
+
+async def run_admission(args):
+    logger.setLevel(logging.ERROR)
+    pre_code, counts = 4250, (1200, 345, 67, 8)
+    image = make_screenshot(pre_code, counts)
+    # 第一个群占一半用户，其余用户平均分到其他群
+    users = [("g0", f"u{i}") if i < args.users // 2 or args.groups == 1 else (f"g{1 + i % (args.groups - 1)}", f"u{i}")
+             for i in range(args.users)]
+    print(f"=== {args.users} 个用户 / {args.groups} 个群同时发送截图，OCR 延迟 {args.ocr_latency * 1000:.0f}ms ===")
+
+    for queued in (False, True):
+        server = FakeOCRServer(pre_code, counts, latency=args.ocr_latency)
+        await server.start()
+        plugin = BaoXiangPlugin(None, {
+            "ocr_url": server.url, "ocr_api_key": "test", "cache_ttl": 0, "image_workers": 0,
+            "image_queue_size": args.users, "max_queued_jobs": args.users,
+            "max_concurrent_jobs": args.max_jobs, "ocr_rate_limit": args.ocr_rate if queued else 0
+        })
+        finished = []
+
+        async def send(group, user):
+            if queued:
+                future, _ = plugin.admission.submit(group, user, lambda: plugin.process_image(image))
+                await future
+            else:
+                await plugin.process_image(image)
+            finished.append(group)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(group, user) for group, user in users))
+        elapsed = time.perf_counter() - start
+
+        first_done = {group: finished.index(group) + 1 for group in sorted(set(finished))}
+        line = (f"{'准入队列' if queued else '直接处理':6s} 总耗时 {elapsed:5.1f}s  OCR 最大并发 {server.max_in_flight:3d}  "
+                f"{server.requests / elapsed:5.1f} 次/秒  各群第一张完成顺序 {first_done}")
+        if queued:
+            stats = plugin.admission.snapshot()
+            line += f"  排队 平均 {stats['wait_avg']:.1f}s P95 {stats['wait_p95']:.1f}s"
+        print(line)
+        await plugin.terminate()
+        await server.stop()
+
+
+def png_with_size(width, height, payload):
+    """声明指定尺寸、像素数据为 payload 的 PNG，用于模拟分辨率过大的图片"""
+    def chunk(kind, data):
+        return len(data).to_bytes(4, "big") + kind + data + zlib.crc32(kind + data).to_bytes(4, "big")
+
+    ihdr = width.to_bytes(4, "big") + height.to_bytes(4, "big") + bytes([8, 2, 0, 0, 0])
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", payload) + chunk(b"IEND", b"")
+
+
+class FakeImageHost:
+    """分块发送图片的 HTTP 服务，记录每个请求实际发送的字节数"""
+
+    def __init__(self, files):
+        self.files = files
+        self.sent = {}
+        self.url = ""
+        self._runner = None
+
+    async def start(self, host="127.0.0.1"):
+        app = web.Application()
+        app.router.add_get("/{name}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        self.url = f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def handle(self, request):
+        name = request.match_info["name"]
+        data = self.files[name]
+        # 不声明 Content-Length，只能在读取过程中检查大小
+        response = web.StreamResponse()
+        await response.prepare(request)
+        self.sent[name] = 0
+        try:
+            for i in range(0, len(data), 64 * 1024):
+                await response.write(data[i:i + 64 * 1024])
+                self.sent[name] += len(data[i:i + 64 * 1024])
+                await asyncio.sleep(0.002)
+        except (ConnectionResetError, ConnectionError):
+            pass
+        return response
+
+
+async def run_ingest(args):
+    logger.setLevel(logging.ERROR)
+    noise = Image.frombytes("RGB", (1600, 1600), os.urandom(1600 * 1600 * 3))
+    buffer = io.BytesIO()
+    noise.save(buffer, format="PNG")
+    files = {
+        "oversized.png": buffer.getvalue(),
+        "page.html": b"<html><body>" + b"<p>not an image</p>" * 200_000 + b"</body></html>",
+        "huge.png": png_with_size(8000, 8000, zlib.compress(bytes(8000 * 3 + 1) * 1000)),
+    }
+    host = FakeImageHost(files)
+    await host.start()
+    plugin = BaoXiangPlugin(None, {"cache_ttl": 0})
+    session = aiohttp.ClientSession()
+
+    async def legacy(name):
+        # 旧流程: 完整下载后检查大小，再由裁剪阶段解码时发现不是有效图片
+        async with session.get(f"{host.url}/{name}") as response:
+            data = await response.read()
+        if len(data) > 5 * 1024 * 1024:
+            raise ValueError("图片过大")
+        Image.open(io.BytesIO(data)).load()
+
+    async def current(name):
+        await plugin.download_image(f"{host.url}/{name}")
+
+    print("=== 不符合要求的图片 (服务端不声明 Content-Length) ===")
+    for name, data in files.items():
+        for label, fetch in (("legacy", legacy), ("current", current)):
+            start = time.perf_counter()
+            try:
+                await fetch(name)
+                error = "未拒绝"
+            except Exception as e:
+                error = str(e)
+            elapsed = time.perf_counter() - start
+            await asyncio.sleep(0.05)
+            print(f"{name:14s} {label:8s} 文件 {len(data) / 1024:6.0f} KiB  已发送 {host.sent.get(name, 0) / 1024:6.0f} KiB  "
+                  f"耗时 {elapsed * 1000:6.0f}ms  {error[:40]}")
+
+    await session.close()
+    await plugin.terminate()
+    await host.stop()
+
+
+async def run_retry(args):
+    logger.setLevel(logging.CRITICAL)
+    pre_code, counts = 4250, (1200, 345, 67, 8)
+    images = [make_screenshot(pre_code, counts, seed=i) for i in range(args.images)]
+    print(f"=== {args.images} 张截图，OCR 出错概率 {args.fail_rate:.0%}，识别失败时用户最多重发 5 次 ===")
+
+    for region_retry in (False, True):
+        server = FakeOCRServer(pre_code, counts, latency=0, fail_rate=args.fail_rate, seed=1)
+        await server.start()
+        plugin = BaoXiangPlugin(None, {
+            "ocr_url": server.url, "ocr_api_key": "test", "ocr_mode": args.ocr_mode, "cache_ttl": 0,
+            "ocr_rate_limit": 0, "image_workers": 0, "region_retry": region_retry
+        })
+        resends, failed, wrong = 0, 0, 0
+        for data in images:
+            for attempt in range(6):
+                try:
+                    result = await plugin.process_image(data)
+                except Exception:
+                    if attempt == 5:
+                        failed += 1
+                    else:
+                        resends += 1
+                    continue
+                wrong += not result.startswith(f"📦 木头箱: {counts[0]}\n🥈 白银箱: {counts[1]}")
+                break
+
+        print(f"{'区域重试' if region_retry else '整图重发':6s} OCR 请求 {server.requests / len(images):.2f} 次/张  "
+              f"用户重发 {resends / len(images):.2f} 次/张  最终失败 {failed}  结果错误 {wrong}  "
+              f"区域重试统计 {plugin.region_stats}")
+        await plugin.terminate()
+        await server.stop()
+
+
+async def run_batch(args):
+    logger.setLevel(logging.CRITICAL)
+    pre_code, counts = 4250, (1200, 345, 67, 8)
+    sources = [
+        ("base64", base64.b64encode(make_screenshot(pre_code, counts, seed=i)).decode())
+        for i in range(args.batch)
+    ]
+    server = FakeOCRServer(pre_code, counts, latency=args.ocr_latency)
+    await server.start()
+
+    def make_plugin(ocr_rate):
+        # 每种流程使用新的插件实例，限速的令牌桶都从满的状态开始
+        return BaoXiangPlugin(None, {
+            "ocr_url": server.url, "ocr_api_key": "test", "ocr_mode": args.ocr_mode, "cache_ttl": 0,
+            "ocr_rate_limit": ocr_rate, "image_workers": 0, "max_concurrent_jobs": args.max_jobs,
+            "batch_concurrency": args.max_jobs
+        })
+
+    try:
+        # 先按给定的限速 (默认与插件配置相同) 测试，再对比不限速时的表现
+        for ocr_rate in dict.fromkeys([args.ocr_rate, 0]):
+            print(f"=== {args.batch} 张截图，OCR 延迟 {args.ocr_latency * 1000:.0f}ms，"
+                  f"每秒 OCR 请求上限 {ocr_rate:g}{'' if ocr_rate else ' (不限速)'} ===")
+
+            # 逐张识别：每次发送一张截图，等待结果后再发送下一张
+            plugin = make_plugin(ocr_rate)
+            server.requests = 0
+            start = time.perf_counter()
+            for source in sources:
+                await plugin.process_image(await plugin.load_image(source))
+            sequential = time.perf_counter() - start
+            await plugin.terminate()
+            print(f"逐张识别  总耗时 {sequential:.2f}s  {sequential / len(sources) * 1000:.0f}ms/张  "
+                  f"OCR 请求 {server.requests} 次")
+
+            plugin = make_plugin(ocr_rate)
+            server.requests = server.max_in_flight = 0
+            semaphore = asyncio.Semaphore(plugin.batch_concurrency)
+            start = time.perf_counter()
+            tasks = [
+                asyncio.create_task(plugin.recognize_source(source, "group", "officer", semaphore))
+                for source in sources
+            ]
+            table = await plugin.collect_batch(tasks)
+            batch = time.perf_counter() - start
+            await plugin.terminate()
+            print(f"批量识别  总耗时 {batch:.2f}s  {batch / len(sources) * 1000:.0f}ms/张  "
+                  f"OCR 请求 {server.requests} 次  OCR 最大并发 {server.max_in_flight}  加速 {sequential / batch:.2f}x")
+            print(table.splitlines()[0])
+            if ocr_rate:
+                # 超过令牌桶容量的请求按限速依次发出，两种方式的耗时都不低于该下限
+                burst = plugin.ocr_limiter.burst
+                floor = max(0, server.requests - burst) / ocr_rate
+                print(f"限速下限  {server.requests} 次请求至少需要 {floor:.2f}s，批量识别只能减少等待 OCR 响应的时间")
+    finally:
+        await server.stop()
+
+
+async def run_benchmark(args):
+    # 压测时关闭插件的处理日志
+    logger.setLevel(logging.WARNING)
+    pre_code, counts = 4250, (1200, 345, 67, 8)
+    server = FakeOCRServer(pre_code, counts, latency=args.ocr_latency)
+    await server.start()
+
+    plugin = BaoXiangPlugin(None, {"ocr_url": server.url, "ocr_api_key": "test", "ocr_mode": args.ocr_mode,
+                                   "ocr_rate_limit": 0})
+    images = [
+        base64.b64encode(make_screenshot(pre_code, counts, fmt=args.format, seed=i)).decode()
+        for i in range(args.images)
+    ]
+    print(f"=== {args.images} 张 {args.format} 截图，平均 {sum(len(b) for b in images) * 3 / 4 / len(images) / 1024:.0f} KiB ===")
+
+    temp_dir = tempfile.mkdtemp(prefix="xyzw_bench_")
+    try:
+        timings = []
+        for b64 in images:
+            start = time.perf_counter()
+            await legacy_process(plugin, b64, temp_dir)
+            timings.append(time.perf_counter() - start)
+        summarize("legacy", timings, server.requests, *dir_usage(temp_dir))
+        server.requests = 0
+
+        shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+        # 预先启动图片处理进程，避免把进程启动时间计入结果
+        await plugin.crop_image(base64.b64decode(images[0]))
+        # 当前流程不应写入任何临时文件
+        tempfile.tempdir, saved_tempdir = temp_dir, tempfile.tempdir
+        try:
+            timings = []
+            for b64 in images:
+                start = time.perf_counter()
+                await current_process(plugin, b64)
+                timings.append(time.perf_counter() - start)
+        finally:
+            tempfile.tempdir = saved_tempdir
+        summarize("current", timings, server.requests, *dir_usage(temp_dir))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        await plugin.terminate()
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="宝箱识别图片处理流程压测")
+    parser.add_argument("--images", type=int, default=50, help="截图数量")
+    parser.add_argument("--format", choices=["JPEG", "PNG"], default="JPEG", help="截图格式")
+    parser.add_argument("--accuracy", action="store_true", help="测试本地数字识别的准确率与耗时")
+    parser.add_argument("--fixtures", default="", help="带真实值文件名的截图目录")
+    parser.add_argument("--templates", default="", help="本地数字识别的模板目录")
+    parser.add_argument("--verbose", action="store_true", help="输出每张识别失败的截图")
+    parser.add_argument("--ocr-mode", choices=["stitch", "separate"], default="stitch", help="当前流程的 OCR 模式")
+    parser.add_argument("--ocr-latency", type=float, default=0.05, help="模拟 OCR 服务延迟 (秒)")
+    parser.add_argument("--burst", type=int, default=0, help="测试图片处理阶段，每批并发处理的截图数")
+    parser.add_argument("--image-workers", type=int, default=2, help="图片处理进程数")
+    parser.add_argument("--decode-min-width", type=int, default=720, help="JPEG 缩小解码后的最小宽度")
+    parser.add_argument("--users", type=int, default=0, help="测试准入队列，同时发送截图的用户数")
+    parser.add_argument("--groups", type=int, default=3, help="用户所在的群数")
+    parser.add_argument("--max-jobs", type=int, default=4, help="同时执行的识别任务数")
+    parser.add_argument("--ocr-rate", type=float, default=2, help="每秒 OCR 请求数上限")
+    parser.add_argument("--ingest", action="store_true", help="测试不符合要求的图片被拒绝前读取的数据量")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="测试区域重试，模拟 OCR 出错的概率")
+    parser.add_argument("--batch", type=int, default=0, help="测试批量识别，一次会话中的截图数")
+    args = parser.parse_args()
+    if args.accuracy:
+        asyncio.run(run_accuracy(args))
+    elif args.burst:
+        asyncio.run(run_burst(args))
+    elif args.users:
+        asyncio.run(run_admission(args))
+    elif args.ingest:
+        asyncio.run(run_ingest(args))
+    elif args.fail_rate:
+        asyncio.run(run_retry(args))
+    elif args.batch:
+        asyncio.run(run_batch(args))
+    else:
+        asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
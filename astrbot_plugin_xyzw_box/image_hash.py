@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+# 预设积分区域和宝箱数量区域的缩略图尺寸 (宽, 高)
+TOP_THUMB = (96, 48)
+BOTTOM_THUMB = (192, 48)
+
+
+def _thumbnail(img: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    return np.asarray(img.convert("L").resize(size, Image.BOX), dtype=np.uint8)
+
+
+def _dhash(thumb: np.ndarray) -> int:
+    """64 位差值哈希: 缩小到 9x8，比较相邻像素的明暗"""
+    small = np.asarray(Image.fromarray(thumb).resize((9, 8), Image.BOX), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def fingerprint(top: Image.Image, bottom: Image.Image) -> Tuple[int, np.ndarray, np.ndarray]:
+    """计算两个识别区域的指纹: (128 位差值哈希, 顶部缩略图, 底部缩略图)"""
+    top_thumb = _thumbnail(top, TOP_THUMB)
+    bottom_thumb = _thumbnail(bottom, BOTTOM_THUMB)
+    return (_dhash(top_thumb) << 64) | _dhash(bottom_thumb), top_thumb, bottom_thumb
+
+
+def _block_diff(a: np.ndarray, b: np.ndarray, block: int = 4) -> float:
+    """按 block x block 分块求平均灰度差，返回最大的分块差值"""
+    diff = np.abs(a.astype(np.int16) - b.astype(np.int16)).astype(np.float32)
+    height, width = diff.shape[0] // block * block, diff.shape[1] // block * block
+    blocks = diff[:height, :width].reshape(height // block, block, width // block, block)
+    return float(blocks.mean(axis=(1, 3)).max())
+
+
+class ResultCache:
+    """按图片指纹缓存识别结果，重复发送的截图无需再次OCR
+
+    先用差值哈希的汉明距离筛选候选，再比较缩略图的分块灰度差确认:
+    重新压缩的同一张截图分块差很小，而数字变化会在对应分块产生明显差异，
+    仅靠哈希无法区分只差一位数字的两张截图。
+    缩放过的截图裁剪位置会有偏差，通常不会命中缓存，仍会正常识别。
+    """
+
+    # 分块灰度差的上限 (0-255)
+    MAX_BLOCK_DIFF = 12
+
+    def __init__(self, ttl: float = 600, max_distance: int = 10, max_size: int = 128):
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_size = max_size
+        self.entries: "OrderedDict[int, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._next_id = 0
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self.entries.items() if entry["expires"] <= now]:
+            del self.entries[key]
+
+    def get(self, fp: Tuple[int, np.ndarray, np.ndarray]) -> Optional[tuple]:
+        """查找相似截图的识别结果，未命中时返回None"""
+        self._expire()
+        hash_value, top_thumb, bottom_thumb = fp
+        for entry in reversed(self.entries.values()):
+            if bin(entry["hash"] ^ hash_value).count("1") > self.max_distance:
+                continue
+            if (_block_diff(entry["top"], top_thumb) <= self.MAX_BLOCK_DIFF
+                    and _block_diff(entry["bottom"], bottom_thumb) <= self.MAX_BLOCK_DIFF):
+                self.hits += 1
+                return entry["result"]
+        self.misses += 1
+        return None
+
+    def put(self, fp: Tuple[int, np.ndarray, np.ndarray], result: tuple):
+        hash_value, top_thumb, bottom_thumb = fp
+        self.entries[self._next_id] = {
+            "hash": hash_value,
+            "top": top_thumb,
+            "bottom": bottom_thumb,
+            "result": result,
+            "expires": time.monotonic() + self.ttl
+        }
+        self._next_id += 1
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
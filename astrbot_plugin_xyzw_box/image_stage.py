@@ -0,0 +1,225 @@
+import asyncio
+import io
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageFile
+
+from .image_hash import fingerprint
+from .layout import fixed_regions, locate_regions, otsu_threshold
+from .metrics import mean_p95
+
+# 允许加载截断的图片，进程级设置，导入时设置一次即可
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+
+def decode_image(image_data: bytes, min_width: int = 0) -> Image.Image:
+    """解码图片，JPEG 使用 draft 模式按 1/2、1/4、1/8 缩小解码
+
+    min_width: 解码后宽度的下限，取不低于该宽度的最小缩放比例，0 表示按原始分辨率解码
+    """
+    img = Image.open(io.BytesIO(image_data))
+    if min_width and img.format == "JPEG" and img.width > min_width:
+        img.draft(img.mode, (min_width, img.height * min_width // img.width))
+    img.load()
+    if img.mode not in ("RGB", "L"):
+        # JPEG不支持透明通道和调色板模式
+        img = img.convert("RGB")
+    return img
+
+
+def encode_jpeg(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def preprocess_region(image_data: bytes, scale: int = 2) -> bytes:
+    """灰度化、放大并二值化，得到白底黑字的 PNG，用于识别失败后的重试"""
+    img = decode_image(image_data).convert("L")
+    img = img.resize((img.width * scale, img.height * scale), Image.LANCZOS)
+    gray = np.asarray(img)
+    dark = gray <= otsu_threshold(gray)
+    # 图片边缘占多数的一侧视为背景
+    border = np.concatenate((dark[0], dark[-1], dark[:, 0], dark[:, -1]))
+    text = ~dark if border.mean() > 0.5 else dark
+    buffer = io.BytesIO()
+    Image.fromarray(np.where(text, 0, 255).astype(np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def preprocess_task(image_data: bytes) -> dict:
+    """在图片处理进程中执行 preprocess_region，返回 {"data": PNG 字节, "started_at": 开始处理的时间, "elapsed": 处理耗时}"""
+    started_at = time.time()
+    start = time.perf_counter()
+    data = preprocess_region(image_data)
+    return {"data": data, "started_at": started_at, "elapsed": time.perf_counter() - start}
+
+
+def stitch_images(top: Image.Image, bottom: Image.Image) -> tuple[bytes, int, int]:
+    """将两个区域上下拼接，中间留出空白分隔区域，返回拼接图及分隔区域的上下边界"""
+    gap = max(32, min(top.height, bottom.height) // 2)
+    canvas = Image.new(top.mode, (max(top.width, bottom.width), top.height + gap + bottom.height), "white")
+    canvas.paste(top, (0, 0))
+    canvas.paste(bottom, (0, top.height + gap))
+    return encode_jpeg(canvas), top.height, top.height + gap
+
+
+def crop_image(image_data: bytes, stitch: bool = False, with_fingerprint: bool = False,
+               min_width: int = 0, detect_layout: bool = False) -> dict:
+    """解码一次图片，裁剪两个区域并编码为JPEG字节
+
+    在图片处理进程中执行，只使用可序列化的参数和返回值。
+    detect_layout: 先定位两个面板再裁剪，否则按固定比例裁剪
+    返回 {"top": 顶部区域, "bottom": 底部区域, "stitched": 拼接图或None,
+          "split_top": 分隔区域上边界, "split_bottom": 分隔区域下边界, "fingerprint": 区域指纹或None,
+          "size": 解码后的尺寸, "detected": 是否检测到面板, "detect_time": 定位耗时,
+          "started_at": 开始处理的时间, "elapsed": 处理耗时}
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    img = decode_image(image_data, min_width)
+
+    # 顶部区域（预设积分）和底部区域（宝箱数量）
+    detected, detect_time = False, 0.0
+    if detect_layout:
+        detect_start = time.perf_counter()
+        box_top, box_bottom, detected = locate_regions(img)
+        detect_time = time.perf_counter() - detect_start
+        # 平板截图两侧有黑边，游戏画面比截图窄，缩小解码后分辨率不足时按原始分辨率重新解码
+        if min_width and box_bottom[2] - box_bottom[0] < min_width:
+            full = decode_image(image_data)
+            if full.width > img.width:
+                factor = full.width / img.width
+                box_top, box_bottom = (tuple(int(v * factor) for v in box) for box in (box_top, box_bottom))
+                img = full
+    else:
+        box_top, box_bottom = fixed_regions((0, 0, img.width, img.height))
+
+    # 裁剪并编码到内存
+    cut1, cut2 = img.crop(box_top), img.crop(box_bottom)
+    crops = {
+        "top": encode_jpeg(cut1),
+        "bottom": encode_jpeg(cut2),
+        "stitched": None,
+        "split_top": 0,
+        "split_bottom": 0,
+        "fingerprint": fingerprint(cut1, cut2) if with_fingerprint else None,
+        "size": img.size,
+        "detected": detected,
+        "detect_time": detect_time,
+        "started_at": started_at
+    }
+    if stitch:
+        crops["stitched"], crops["split_top"], crops["split_bottom"] = stitch_images(cut1, cut2)
+    crops["elapsed"] = time.perf_counter() - start
+    return crops
+
+
+class StageBusy(Exception):
+    """排队的图片处理任务已达上限"""
+
+
+class ImageStage:
+    """图片处理阶段的专用进程池
+
+    PIL 的解码和编码会占用 GIL，多核服务器上并发较多时可以改为在独立进程中执行。
+    workers: 进程数，0 (默认) 表示不使用进程池，在线程中执行；单核时进程池的调度和序列化开销大于收益
+    max_pending: 排队和处理中的任务上限，超过时直接拒绝
+    """
+
+    # 计算平均值和 P95 使用的最近样本数
+    SAMPLES = 200
+
+    def __init__(self, workers: int = 0, max_pending: int = 16):
+        self.workers = max(0, workers)
+        self.max_pending = max(1, max_pending)
+        self.pending = 0
+        self.metrics = {
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_queue_depth": 0,
+            "detected": 0,
+            "undetected": 0,
+        }
+        self.wait_times: deque = deque(maxlen=self.SAMPLES)
+        self.run_times: deque = deque(maxlen=self.SAMPLES)
+        self.detect_times: deque = deque(maxlen=self.SAMPLES)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def queue_depth(self) -> int:
+        """等待空闲进程的任务数"""
+        return max(0, self.pending - max(1, self.workers))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn 不会复制事件循环和其他线程的状态
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def crop(self, image_data: bytes, stitch: bool = False, with_fingerprint: bool = False,
+                   min_width: int = 0, detect_layout: bool = False) -> dict:
+        crops = await self._submit(crop_image, image_data, stitch, with_fingerprint, min_width, detect_layout)
+        if detect_layout:
+            self.metrics["detected" if crops["detected"] else "undetected"] += 1
+            self.detect_times.append(crops["detect_time"])
+        return crops
+
+    async def preprocess(self, image_data: bytes) -> bytes:
+        """二值化放大单个区域，用于该区域识别失败后的重试"""
+        return (await self._submit(preprocess_task, image_data))["data"]
+
+    async def _submit(self, func, *args) -> dict:
+        """在进程池或线程中执行 func，返回值需包含 started_at 和 elapsed"""
+        if self.pending >= self.max_pending:
+            self.metrics["rejected"] += 1
+            raise StageBusy("图片处理繁忙，请稍后重试")
+
+        self.pending += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self.queue_depth)
+        submitted_at = time.time()
+        try:
+            if self.workers:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._get_executor(), func, *args)
+            else:
+                result = await asyncio.to_thread(func, *args)
+        except Exception:
+            self.metrics["failed"] += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.metrics["completed"] += 1
+        self.wait_times.append(max(0.0, result["started_at"] - submitted_at))
+        self.run_times.append(result["elapsed"])
+        return result
+
+    def snapshot(self) -> dict:
+        """当前队列深度及最近样本的排队、处理耗时 (秒)"""
+        wait_avg, wait_p95 = mean_p95(self.wait_times)
+        run_avg, run_p95 = mean_p95(self.run_times)
+        detect_avg, detect_p95 = mean_p95(self.detect_times)
+        return {
+            **self.metrics,
+            "workers": self.workers,
+            "pending": self.pending,
+            "queue_depth": self.queue_depth,
+            "wait_avg": wait_avg,
+            "wait_p95": wait_p95,
+            "run_avg": run_avg,
+            "run_p95": run_p95,
+            "detect_avg": detect_avg,
+            "detect_p95": detect_p95,
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,129 @@
+import base64
+import binascii
+import io
+import os
+import re
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+import aiohttp
+from PIL import Image
+
+from astrbot.api import logger
+
+
+class IngestError(ValueError):
+    """图片不符合要求，错误信息可直接回复给用户"""
+
+
+class ImageIngest:
+    """统一读取 URL、本地路径和 Base64 三种来源的图片
+
+    读取过程中累计字节数，超过 max_bytes 立即停止，不会先完整下载或解码再检查大小；
+    根据文件头识别格式和尺寸，非图片、格式不支持或像素数超过 max_pixels 的输入在完整读取前即被拒绝。
+    """
+
+    # 支持的图片格式
+    FORMATS = ("JPEG", "PNG", "WEBP", "BMP", "GIF", "MPO")
+    # 识别文件头最多读取的字节数，JPEG 的 EXIF 等元数据位于尺寸信息之前
+    HEADER_LIMIT = 256 * 1024
+    # 流式读取的块大小
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, max_bytes: int = 5 * 1024 * 1024, max_pixels: int = 25_000_000):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+
+    def _too_large(self) -> IngestError:
+        return IngestError(f"图片过大，请发送小于{self.max_bytes / 1024 / 1024:g}MB的截图")
+
+    def sniff(self, header: bytes) -> Optional[Tuple[str, Tuple[int, int]]]:
+        """从文件头识别图片格式和尺寸，数据不足以识别时返回None
+
+        Image.open 只解析文件头，不会解码像素数据
+        """
+        try:
+            with Image.open(io.BytesIO(header)) as img:
+                return img.format, img.size
+        except Image.DecompressionBombError:
+            raise IngestError("图片分辨率过大")
+        except Exception:
+            return None
+
+    def _check_header(self, header: bytes, complete: bool = False) -> bool:
+        """检查文件头，识别成功返回True；数据不足时返回False，已读取足够数据仍无法识别时抛出异常"""
+        info = self.sniff(header)
+        if info is None:
+            if complete or len(header) >= self.HEADER_LIMIT:
+                raise IngestError("无法识别的图片格式，请发送JPG或PNG截图")
+            return False
+        image_format, (width, height) = info
+        if image_format not in self.FORMATS:
+            raise IngestError(f"不支持的图片格式: {image_format}")
+        if width * height > self.max_pixels:
+            raise IngestError(f"图片分辨率过大: {width}x{height}")
+        logger.info(f"图片格式: {image_format} {width}x{height}")
+        return True
+
+    async def _collect(self, chunks: AsyncIterator[bytes]) -> bytes:
+        buffer = bytearray()
+        checked = False
+        async for chunk in chunks:
+            buffer += chunk
+            if len(buffer) > self.max_bytes:
+                raise self._too_large()
+            if not checked:
+                checked = self._check_header(bytes(buffer))
+        if not checked:
+            self._check_header(bytes(buffer), complete=True)
+        return bytes(buffer)
+
+    async def from_url(self, session: aiohttp.ClientSession, url: str) -> bytes:
+        """流式下载图片，声明或实际大小超过上限时中断下载"""
+        async with session.get(url) as response:
+            if response.status != 200:
+                raise Exception(f"下载图片失败: HTTP {response.status}")
+            if response.content_length is not None and response.content_length > self.max_bytes:
+                raise self._too_large()
+            data = await self._collect(response.content.iter_chunked(self.CHUNK_SIZE))
+        logger.info(f"图片下载完成: {len(data)} 字节")
+        return data
+
+    async def from_path(self, path: str) -> bytes:
+        """读取本地图片，先按文件大小检查"""
+        if os.path.getsize(path) > self.max_bytes:
+            raise self._too_large()
+
+        async def chunks():
+            async with aiofiles.open(path, "rb") as f:
+                while True:
+                    chunk = await f.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        return await self._collect(chunks())
+
+    def from_base64(self, base64_str: str) -> bytes:
+        """解码Base64图片，先按编码长度估算大小，并只解码开头部分识别文件头"""
+        base64_str = re.sub(r"^base64://", "", base64_str)
+        # 进一步移除非Base64字符（只保留字母、数字、+、/、=）
+        base64_str = re.sub(r"[^a-zA-Z0-9+/=]", "", base64_str)
+        logger.info(f"Base64图片解码中: {len(base64_str)} 字符")
+        if len(base64_str) * 3 // 4 - base64_str[-2:].count("=") > self.max_bytes:
+            raise self._too_large()
+
+        try:
+            # 每 4 个字符对应 3 个字节，按 4 的倍数截取开头部分
+            header_chars = self.HEADER_LIMIT // 3 * 4
+            if len(base64_str) > header_chars:
+                self._check_header(base64.b64decode(base64_str[:header_chars]), complete=True)
+                image_data = base64.b64decode(base64_str)
+            else:
+                image_data = base64.b64decode(base64_str)
+                self._check_header(image_data, complete=True)
+        except binascii.Error as e:
+            raise IngestError(f"Base64解码失败: {str(e)}")
+
+        logger.info(f"Base64图片解码成功: {len(image_data)} 字节")
+        return image_data
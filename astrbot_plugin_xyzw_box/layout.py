@@ -0,0 +1,165 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+Box = Tuple[int, int, int, int]
+
+# 游戏画面中两个区域的默认位置 (left, top, right, bottom)，按游戏画面的宽高比例
+TOP_REGION = (0.0, 0.15, 0.5, 0.3)
+BOTTOM_REGION = (0.0, 0.75, 1.0, 0.87)
+
+# 检测时缩小到的大致宽度
+DETECT_WIDTH = 160
+# 行、列的标准差低于该值视为纯色边框 (模拟器、平板的黑边)
+BORDER_STD = 4.0
+# 标题栏下方的边框平均亮度低于该值时视为黑边
+DARK = 32
+# 一行中面板像素超过该比例时视为面板所在的行
+PANEL_FILL = 0.5
+# 面板高度占游戏画面高度的范围
+PANEL_HEIGHT = (0.03, 0.25)
+# 面板上下额外保留的边距，按面板高度的比例
+PANEL_MARGIN = 0.1
+
+
+def fixed_regions(content: Box) -> Tuple[Box, Box]:
+    """按默认比例计算两个区域"""
+    left, top, right, bottom = content
+    width, height = right - left, bottom - top
+
+    def scale(region):
+        return (
+            left + int(width * region[0]), top + int(height * region[1]),
+            left + int(width * region[2]), top + int(height * region[3])
+        )
+
+    return scale(TOP_REGION), scale(BOTTOM_REGION)
+
+
+def otsu_threshold(values: np.ndarray) -> int:
+    """计算灰度值 (0-255 的整数) 的 Otsu 阈值"""
+    hist = np.bincount(values.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean[-1] * weight - mean * total) ** 2 / (weight * (total - weight))
+    between = np.nan_to_num(between[:-1], nan=-1.0, posinf=-1.0)
+    return int(between.argmax())
+
+
+def _trim(profile: np.ndarray) -> Tuple[int, int]:
+    """去掉两端标准差很低的行或列，返回保留部分的 [start, end)"""
+    varied = np.flatnonzero(profile >= BORDER_STD)
+    if not len(varied):
+        return 0, len(profile)
+    return int(varied[0]), int(varied[-1]) + 1
+
+
+def content_box(gray: np.ndarray) -> Box:
+    """去掉四周的纯色边框，返回游戏画面的位置"""
+    top, bottom = _trim(gray.std(axis=1))
+    left, right = _trim(gray[top:bottom].std(axis=0))
+    # 模拟器标题栏与游戏画面之间通常还有一段黑边
+    inner = gray[top:bottom, left:right]
+    rows = (inner.std(axis=1) < BORDER_STD) & (inner.mean(axis=1) < DARK)
+    height = bottom - top
+    for start in np.flatnonzero(rows[:height // 4]):
+        run_end = start
+        while run_end < height and rows[run_end]:
+            run_end += 1
+        if run_end - start >= max(2, height // 50):
+            top += run_end
+            break
+    return left, top, right, bottom
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """返回 mask 中连续 True 的区间 [start, end)"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    diff = np.diff(padded)
+    return list(zip(np.flatnonzero(diff == 1).tolist(), np.flatnonzero(diff == -1).tolist()))
+
+
+def _close(mask: np.ndarray, gap: int) -> np.ndarray:
+    """填补 mask 中长度不超过 gap 的空隙 (面板中文字所在的行)"""
+    mask = mask.copy()
+    runs = _runs(mask)
+    for (_, end), (start, _) in zip(runs, runs[1:]):
+        if start - end <= gap:
+            mask[end:start] = True
+    return mask
+
+
+def _find_panel(panel: np.ndarray, columns: slice, expected: float, lower: float, upper: float) -> Optional[Box]:
+    """在 panel 掩码中查找中心最接近 expected 的面板，返回 (left, top, right, bottom)
+
+    columns: 计算行占比使用的列范围；lower/upper: 面板中心允许的纵向范围，均按高度比例
+    """
+    height, width = panel.shape
+    rows = panel[:, columns].mean(axis=1) >= PANEL_FILL
+    rows = _close(rows, max(1, height // 60))
+    best, best_distance = None, None
+    for start, end in _runs(rows):
+        center = (start + end) / 2 / height
+        if not lower <= center <= upper:
+            continue
+        if not PANEL_HEIGHT[0] <= (end - start) / height <= PANEL_HEIGHT[1]:
+            continue
+        distance = abs(center - expected)
+        if best_distance is None or distance < best_distance:
+            best, best_distance = (start, end), distance
+    if best is None:
+        return None
+
+    top, bottom = best
+    cols = _close(panel[top:bottom].mean(axis=0) >= PANEL_FILL, max(1, width // 20))
+    col_runs = _runs(cols)
+    if not col_runs:
+        return None
+    left, right = max(col_runs, key=lambda run: run[1] - run[0])
+    return left, top, right, bottom
+
+
+def locate_regions(img: Image.Image) -> Tuple[Box, Box, bool]:
+    """定位预设积分和宝箱数量两个区域
+
+    先去掉模拟器、平板截图四周的纯色边框，再在缩小后的灰度图中按行、列投影查找两个明亮的面板。
+    返回 (顶部区域, 底部区域, 是否检测到面板)，检测不到面板时按默认比例在游戏画面中裁剪。
+    """
+    # 按整数倍缩小比任意尺寸的重采样快得多
+    small = img.reduce(max(1, img.width // DETECT_WIDTH)).convert("L")
+    scale_x, scale_y = img.width / small.width, img.height / small.height
+    gray = np.asarray(small, dtype=np.uint8)
+
+    left, top, right, bottom = content_box(gray)
+    content = gray[top:bottom, left:right]
+    if content.size == 0:
+        return (*fixed_regions((0, 0, img.width, img.height)), False)
+
+    def to_image(box):
+        return (
+            int((box[0] + left) * scale_x), int((box[1] + top) * scale_y),
+            min(img.width, int((box[2] + left) * scale_x)), min(img.height, int((box[3] + top) * scale_y))
+        )
+
+    full = to_image((0, 0, right - left, bottom - top))
+    # 面板是画面中最亮的大块区域：在亮侧再求一次阈值，分开面板和背景
+    threshold = otsu_threshold(content)
+    light = content[content > threshold]
+    if len(light):
+        threshold = threshold + 1 + otsu_threshold(light.astype(np.int16) - threshold - 1)
+    panel = content > threshold
+
+    width = right - left
+    top_panel = _find_panel(panel, slice(0, width // 2), 0.225, 0.05, 0.45)
+    bottom_panel = _find_panel(panel, slice(0, width), 0.81, 0.55, 0.95)
+    if top_panel is None or bottom_panel is None:
+        return (*fixed_regions(full), False)
+
+    def expand(box):
+        margin = int((box[3] - box[1]) * PANEL_MARGIN) + 1
+        return box[0], max(0, box[1] - margin), box[2], min(bottom - top, box[3] + margin)
+
+    return to_image(expand(top_panel)), to_image(expand(bottom_panel)), True
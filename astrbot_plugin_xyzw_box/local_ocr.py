@@ -0,0 +1,257 @@
+import io
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from astrbot.api import logger
+
+from .layout import otsu_threshold
+
+
+class LocalDigitOCR:
+    """离线数字识别，只识别 0-9
+
+    流程: 灰度化 -> Otsu 二值化 -> 连通域分割 -> 最近邻模板匹配。
+    截图中常有背景、面板、文字三种亮度，除全图 Otsu 阈值外还会在亮、暗两侧各自再求一次阈值，
+    取识别出数字最多且最接近模板的二值化结果。
+    每个字符记录与最近的其他数字模板的差距，差距低于 MIN_MARGIN 时 (例如低分辨率下的 3 和 8) 结果不可靠，
+    由调用方改用 OCR 服务。
+    模板优先从 template_dir 中加载 (文件名以数字开头，例如 0.png、7_small.png，可直接从游戏截图中裁剪)，
+    没有模板目录时使用字体渲染的数字作为模板，font_path 为空时使用 Pillow 自带字体。
+    识别结果按行输出，同一行中间距较大的数字视为不同的数值，各占一行，与 OCR 服务的输出格式保持一致。
+    """
+
+    # 模板尺寸，字符按高度缩放后水平居中
+    SIZE = 24
+    # 与最近模板的平均像素差超过该值时视为非数字 (汉字、装饰等)
+    MAX_DISTANCE = 0.3
+    # 同一行中字符间距超过字符高度的该比例时视为新的数值
+    GAP_RATIO = 0.6
+    # 字符外接矩形内文字像素的最大占比，超过时视为色块
+    MAX_FILL = 0.85
+    # 最近模板与最近的其他数字模板的平均像素差之差低于该值时视为不可靠 (约 3 个像素)
+    MIN_MARGIN = 0.005
+
+    def __init__(self, template_dir: str = "", font_path: str = ""):
+        self.labels, self.templates = self._load_templates(template_dir, font_path)
+
+    def _load_templates(self, template_dir: str, font_path: str) -> Tuple[np.ndarray, np.ndarray]:
+        samples: List[Tuple[str, np.ndarray]] = []
+        if template_dir and os.path.isdir(template_dir):
+            for name in sorted(os.listdir(template_dir)):
+                match = re.match(r"(\d)", name)
+                if not match:
+                    continue
+                try:
+                    with Image.open(os.path.join(template_dir, name)) as img:
+                        binary = self._binarize(np.asarray(img.convert("L")))
+                    glyph = self._extract_glyph(binary)
+                    if glyph is not None:
+                        samples.append((match.group(1), glyph))
+                except Exception as e:
+                    logger.warning(f"加载数字模板 {name} 失败: {e}")
+        if not samples:
+            samples = self._render_templates(font_path)
+        logger.info(f"本地数字识别已加载 {len(samples)} 个模板")
+        labels = np.array([label for label, _ in samples])
+        templates = np.stack([glyph.ravel() for _, glyph in samples]).astype(np.float32)
+        return labels, templates
+
+    def _render_templates(self, font_path: str) -> List[Tuple[str, np.ndarray]]:
+        samples = []
+        for size in (24, 36, 48):
+            try:
+                font = ImageFont.truetype(font_path, size) if font_path else ImageFont.load_default(size=size)
+            except Exception:
+                font = ImageFont.load_default()
+            for digit in "0123456789":
+                img = Image.new("L", (size * 2, size * 2), 255)
+                ImageDraw.Draw(img).text((size // 2, size // 4), digit, fill=0, font=font)
+                glyph = self._extract_glyph(self._binarize(np.asarray(img)))
+                if glyph is not None:
+                    samples.append((digit, glyph))
+        return samples
+
+    def _extract_glyph(self, binary: np.ndarray) -> Optional[np.ndarray]:
+        rows = np.flatnonzero(binary.any(axis=1))
+        cols = np.flatnonzero(binary.any(axis=0))
+        if not len(rows) or not len(cols):
+            return None
+        return self._normalize(binary[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1])
+
+    def _normalize(self, glyph: np.ndarray) -> np.ndarray:
+        """按高度缩放到 SIZE，宽度等比缩放后水平居中，保留 1 等窄字符的宽高比"""
+        height, width = glyph.shape
+        new_width = min(self.SIZE, max(1, round(width * self.SIZE / height)))
+        row_index = np.arange(self.SIZE) * height // self.SIZE
+        col_index = np.arange(new_width) * width // new_width
+        scaled = glyph[row_index[:, None], col_index[None, :]]
+        canvas = np.zeros((self.SIZE, self.SIZE), dtype=bool)
+        offset = (self.SIZE - new_width) // 2
+        canvas[:, offset:offset + new_width] = scaled
+        return canvas
+
+    def _thresholds(self, gray: np.ndarray) -> List[int]:
+        """全图 Otsu 阈值，以及暗侧、亮侧各自的 Otsu 阈值"""
+        threshold = otsu_threshold(gray)
+        thresholds = {threshold}
+        for side in (gray[gray <= threshold], gray[gray > threshold]):
+            if side.size:
+                thresholds.add(otsu_threshold(side))
+        return sorted(thresholds)
+
+    def _binarize(self, gray: np.ndarray, threshold: Optional[int] = None) -> np.ndarray:
+        """阈值二值化 (默认 Otsu)，图片边缘占多数的一侧视为背景，另一侧视为文字"""
+        if threshold is None:
+            threshold = otsu_threshold(gray)
+        dark = gray <= threshold
+        border = np.concatenate((dark[0], dark[-1], dark[:, 0], dark[:, -1]))
+        return ~dark if border.mean() > 0.5 else dark
+
+    @staticmethod
+    def _components(binary: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """基于行程的 8 连通域标记，返回每个连通域的 (top, bottom, left, right)，边界均为闭区间"""
+        padded = np.zeros((binary.shape[0], binary.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = binary
+        diff = np.diff(padded, axis=1)
+        start_rows, starts = np.nonzero(diff == 1)
+        _, ends = np.nonzero(diff == -1)
+        ends = ends - 1
+        if not len(starts):
+            return []
+
+        parent = np.arange(len(starts))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        row_bounds = np.searchsorted(start_rows, np.arange(binary.shape[0] + 1))
+        for row in range(binary.shape[0] - 1):
+            a, a_end = row_bounds[row], row_bounds[row + 1]
+            b, b_end = row_bounds[row + 1], row_bounds[row + 2]
+            # 相邻两行的行程按列有序，双指针合并重叠 (含对角相邻) 的行程
+            while a < a_end and b < b_end:
+                if starts[a] <= ends[b] + 1 and starts[b] <= ends[a] + 1:
+                    root_a, root_b = find(a), find(b)
+                    if root_a != root_b:
+                        parent[root_b] = root_a
+                if ends[a] < ends[b]:
+                    a += 1
+                else:
+                    b += 1
+
+        roots = np.array([find(i) for i in range(len(starts))])
+        labels, inverse = np.unique(roots, return_inverse=True)
+        top = np.full(len(labels), binary.shape[0])
+        bottom = np.zeros(len(labels), dtype=int)
+        left = np.full(len(labels), binary.shape[1])
+        right = np.zeros(len(labels), dtype=int)
+        np.minimum.at(top, inverse, start_rows)
+        np.maximum.at(bottom, inverse, start_rows)
+        np.minimum.at(left, inverse, starts)
+        np.maximum.at(right, inverse, ends)
+        return list(zip(top.tolist(), bottom.tolist(), left.tolist(), right.tolist()))
+
+    def _classify(self, glyphs: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """最近邻匹配，返回每个字符的数字、平均像素差，以及与最近的其他数字模板的差距"""
+        samples = np.stack([glyph.ravel() for glyph in glyphs]).astype(np.float32)
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab，二值图下即为不同像素的个数
+        distances = (
+            (samples ** 2).sum(axis=1)[:, None]
+            + (self.templates ** 2).sum(axis=1)[None, :]
+            - 2 * samples @ self.templates.T
+        )
+        best = distances.argmin(axis=1)
+        best_distances = distances[np.arange(len(best)), best]
+        # 与最近匹配的数字不同的模板中，最接近的一个
+        other = np.where(self.labels[None, :] == self.labels[best][:, None], np.inf, distances).min(axis=1)
+        pixels = self.templates.shape[1]
+        return self.labels[best], best_distances / pixels, (other - best_distances) / pixels
+
+    def _find_chars(self, binary: np.ndarray) -> Tuple[List[Tuple[Tuple[int, int, int, int], str]], float, float]:
+        """在二值图中查找数字，返回 [(外接矩形, 数字)]、平均模板距离及各字符中最小的匹配差距"""
+        boxes = self._components(binary)
+        if not boxes:
+            return [], 1.0, 0.0
+
+        # 过滤明显不是数字的连通域 (被裁剪边缘截断的元素、过宽或接近实心的装饰块) 和噪点
+        image_height, image_width = binary.shape
+        candidates = []
+        for top, bottom, left, right in boxes:
+            height, width = bottom - top + 1, right - left + 1
+            if top == 0 or left == 0 or bottom == image_height - 1 or right == image_width - 1:
+                continue
+            if height < 6 or width > height * 1.2:
+                continue
+            if binary[top:bottom + 1, left:right + 1].mean() > self.MAX_FILL:
+                continue
+            candidates.append((top, bottom, left, right))
+        if not candidates:
+            return [], 1.0, 0.0
+        max_height = max(bottom - top + 1 for top, bottom, _, _ in candidates)
+        candidates = [box for box in candidates if box[1] - box[0] + 1 >= max_height * 0.3]
+
+        glyphs = [self._normalize(binary[top:bottom + 1, left:right + 1]) for top, bottom, left, right in candidates]
+        digits, distances, margins = self._classify(glyphs)
+        accepted = distances <= self.MAX_DISTANCE
+        chars = [(box, str(digit)) for box, digit, ok in zip(candidates, digits, accepted) if ok]
+        if not accepted.any():
+            return chars, 1.0, 0.0
+        return chars, float(distances[accepted].mean()), float(margins[accepted].min())
+
+    def recognize_lines(self, image_data: bytes) -> List[Tuple[str, float, float]]:
+        """识别图片中的数字，返回 [(行文本, 行顶部y, 行底部y)]"""
+        return self.read(image_data)[0]
+
+    def read(self, image_data: bytes) -> Tuple[List[Tuple[str, float, float]], bool]:
+        """识别图片中的数字，返回 ([(行文本, 行顶部y, 行底部y)], 结果是否可靠)
+
+        没有识别出数字或任一字符与其他数字模板的差距低于 MIN_MARGIN 时结果不可靠
+        """
+        with Image.open(io.BytesIO(image_data)) as img:
+            gray = np.asarray(img.convert("L"))
+
+        chars, best_score, margin = [], None, 0.0
+        for threshold in self._thresholds(gray):
+            found, distance, found_margin = self._find_chars(self._binarize(gray, threshold))
+            score = (len(found), -distance)
+            if best_score is None or score > best_score:
+                chars, best_score, margin = found, score, found_margin
+
+        # 按垂直位置分行：与当前行的垂直范围重叠即属于同一行
+        chars.sort(key=lambda item: (item[0][0] + item[0][1]) / 2)
+        rows: List[Dict] = []
+        for box, digit in chars:
+            top, bottom = box[0], box[1]
+            center = (top + bottom) / 2
+            if rows and rows[-1]["top"] <= center <= rows[-1]["bottom"]:
+                row = rows[-1]
+                row["top"], row["bottom"] = min(row["top"], top), max(row["bottom"], bottom)
+                row["chars"].append((box, digit))
+            else:
+                rows.append({"top": top, "bottom": bottom, "chars": [(box, digit)]})
+
+        lines = []
+        for row in rows:
+            row_chars = sorted(row["chars"], key=lambda item: item[0][2])
+            height = row["bottom"] - row["top"] + 1
+            number, last_right = "", None
+            for (top, bottom, left, right), digit in row_chars:
+                if last_right is not None and left - last_right > height * self.GAP_RATIO:
+                    lines.append((number, float(row["top"]), float(row["bottom"] + 1)))
+                    number = ""
+                number += digit
+                last_right = right
+            if number:
+                lines.append((number, float(row["top"]), float(row["bottom"] + 1)))
+        return lines, margin >= self.MIN_MARGIN
+
+    def recognize(self, image_data: bytes) -> str:
+        """识别图片中的数字，每个数值一行"""
+        return "\n".join(text for text, _, _ in self.recognize_lines(image_data))
@@ -1,20 +1,20 @@
 import asyncio
-import base64
-import binascii
-import os
+import math
 import re
-import tempfile
 import json
-import uuid
 from typing import Dict, Optional, Any, Coroutine
-import aiofiles
 import aiohttp
-from PIL import Image
-from astrbot.api.event import filter, AstrMessageEvent
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger, AstrBotConfig
 from astrbot.core.star.filter.event_message_type import EventMessageType
 
+from .admission import AdmissionQueue, QueueFull, RateLimiter
+from .image_hash import ResultCache
+from .image_stage import ImageStage, StageBusy
+from .ingest import ImageIngest, IngestError
+from .local_ocr import LocalDigitOCR
+
 
 @register("咸鱼之王-宝箱识别", "cloudcranesss", "通过OCR识别咸鱼之王游戏中的宝箱数量", "1.0.2")
 class BaoXiangPlugin(Star):
@@ -25,6 +25,53 @@ class BaoXiangPlugin(Star):
         self.timeout_tasks: Dict[str, asyncio.Task] = {}  # 用户ID: 超时任务
         self.ocr_url = self.config.get("ocr_url", "")
         self.ocr_key = self.config.get("ocr_api_key", "")
+        # stitch: 两个区域拼接为一张图只请求一次OCR，无法可靠拆分时回退为分别识别
+        self.ocr_mode = self.config.get("ocr_mode", "stitch")
+        # local: 使用离线数字识别代替OCR服务
+        self.ocr_engine = self.config.get("ocr_engine", "remote")
+        # 识别结果缓存，重复发送相同截图时直接返回结果
+        cache_ttl = int(self.config.get("cache_ttl", 600))
+        self.result_cache: Optional[ResultCache] = None
+        if cache_ttl > 0:
+            self.result_cache = ResultCache(cache_ttl, int(self.config.get("cache_distance", 10)))
+        # 读取图片时限制大小和分辨率，超过时立即停止读取
+        self.ingest = ImageIngest(
+            int(float(self.config.get("max_image_size", 5)) * 1024 * 1024),
+            int(self.config.get("max_image_pixels", 25_000_000))
+        )
+        # 图片解码和裁剪默认在线程中执行，配置进程数后在独立进程中执行；JPEG 按不低于该宽度的最小比例缩小解码
+        self.image_stage = ImageStage(
+            int(self.config.get("image_workers", 0)),
+            int(self.config.get("image_queue_size", 16))
+        )
+        self.decode_min_width = int(self.config.get("decode_min_width", 720))
+        # 裁剪前定位两个面板，适配超长屏、平板和模拟器截图
+        self.auto_layout = bool(self.config.get("auto_layout", True))
+        # 识别任务排队执行，并限制每秒发往OCR服务的请求数
+        self.admission = AdmissionQueue(
+            int(self.config.get("max_concurrent_jobs", 4)),
+            int(self.config.get("max_queued_jobs", 32))
+        )
+        ocr_rate = float(self.config.get("ocr_rate_limit", 2))
+        self.ocr_limiter = RateLimiter(ocr_rate, max(1, math.ceil(ocr_rate)))
+        # 单个区域识别失败或无法解析时，只对该区域重试：先用二值化放大后的图片，再换用其他OCR引擎
+        self.region_retry = bool(self.config.get("region_retry", True))
+        self.retry_ocr_engine = str(self.config.get("retry_ocr_engine", "1")).strip()
+        self.region_stats = {"retries": 0, "recovered": 0, "low_confidence": 0, "failed": 0}
+        # 批量识别：一次会话中收集多张截图，收到后立即开始识别，结束时汇总为一张表
+        self.batch_sessions: Dict[str, dict] = {}  # 用户ID: {"tasks": 识别任务列表, "semaphore": 并发上限}
+        self.batch_timeout_tasks: Dict[str, asyncio.Task] = {}  # 用户ID: 批量会话的超时任务
+        self.batch_window = int(self.config.get("batch_window", 120))
+        self.batch_max_images = int(self.config.get("batch_max_images", 20))
+        self.batch_concurrency = int(self.config.get("batch_concurrency", 4))
+        self.local_ocr: Optional[LocalDigitOCR] = None
+        # 本地识别结果不可靠的次数，以及其中改用OCR服务的次数
+        self.local_stats = {"unreliable": 0, "fallback": 0}
+        if self.ocr_engine == "local":
+            self.local_ocr = LocalDigitOCR(
+                self.config.get("local_ocr_templates", ""),
+                self.config.get("local_ocr_font", "")
+            )
         logger.info(f"ocr_url {self.ocr_url} ocr_key: {self.ocr_key}")
         logger.info("宝箱识别插件已初始化")
         self.session: Optional[aiohttp.ClientSession] = None
@@ -36,6 +83,15 @@ class BaoXiangPlugin(Star):
             task.cancel()
         self.timeout_tasks.clear()
         self.waiting_for_image.clear()
+        for task in self.batch_timeout_tasks.values():
+            task.cancel()
+        self.batch_timeout_tasks.clear()
+        for session in self.batch_sessions.values():
+            for task in session["tasks"]:
+                task.cancel()
+        self.batch_sessions.clear()
+        self.admission.cancel_all()
+        self.image_stage.close()
 
         # 关闭会话
         if self.session:
@@ -49,7 +105,7 @@ class BaoXiangPlugin(Star):
         user_id = event.get_sender_id()
 
         # 检查是否已有等待中的请求
-        if user_id in self.waiting_for_image:
+        if user_id in self.waiting_for_image or user_id in self.batch_sessions:
             yield event.plain_result("⚠️ 您已有待处理的图片请求，请先发送截图或输入 'q' 退出")
             return
 
@@ -72,11 +128,82 @@ class BaoXiangPlugin(Star):
         task = asyncio.create_task(timeout_task())
         self.timeout_tasks[user_id] = task
 
+    @filter.command("xyzw_batch", alias={"批量识别"})
+    async def batch_command(self, event: AstrMessageEvent):
+        """命令触发：批量识别多张截图，汇总为一张表"""
+        user_id = event.get_sender_id()
+
+        if user_id in self.waiting_for_image or user_id in self.batch_sessions:
+            yield event.plain_result("⚠️ 您已有待处理的图片请求，请先发送截图或输入 'q' 退出")
+            return
+
+        self.batch_sessions[user_id] = {"tasks": [], "semaphore": asyncio.Semaphore(max(1, self.batch_concurrency))}
+        yield event.plain_result(
+            f"🖼️ 请在{self.batch_window}秒内发送宝箱截图，可一次发送多张或分多条发送，最多{self.batch_max_images}张\n"
+            f"发送 '完成' 立即汇总结果，输入 'q' 可退出批量识别"
+        )
+
+        # 超时后汇总已收到的截图
+        async def timeout_task():
+            await asyncio.sleep(self.batch_window)
+            self.batch_timeout_tasks.pop(user_id, None)
+            session = self.batch_sessions.pop(user_id, None)
+            if session is None:
+                return
+            if not session["tasks"]:
+                logger.info(f"用户 {user_id} 批量识别超时，未收到截图")
+                await event.send(MessageChain().message("❌ 未收到截图，批量识别已结束"))
+                return
+            result = await self.collect_batch(session["tasks"])
+            await event.send(MessageChain().message(result))
+
+        self.batch_timeout_tasks[user_id] = asyncio.create_task(timeout_task())
+
+    @filter.command("xyzw_stats")
+    async def stats_command(self, event: AstrMessageEvent):
+        """查看识别队列、图片处理队列和识别缓存的统计"""
+        queue = self.admission.snapshot()
+        stats = self.image_stage.snapshot()
+        mode = f"{stats['workers']} 个进程" if stats["workers"] else "线程"
+        lines = [
+            f"📋 识别任务: 执行中 {queue['running']}，排队 {queue['queued']} (峰值 {queue['max_queued']})，"
+            f"完成 {queue['completed']}，失败 {queue['failed']}，拒绝 {queue['rejected']}",
+            f"⏳ 任务排队: 平均 {queue['wait_avg']:.1f}s，P95 {queue['wait_p95']:.1f}s；"
+            f"执行: 平均 {queue['run_avg']:.1f}s，P95 {queue['run_p95']:.1f}s",
+            f"🖼 图片处理: {mode}，处理中 {stats['pending']}，排队 {stats['queue_depth']} (峰值 {stats['max_queue_depth']})",
+            f"✅ 完成 {stats['completed']}，失败 {stats['failed']}，拒绝 {stats['rejected']}",
+            f"⏳ 图片排队: 平均 {stats['wait_avg'] * 1000:.0f}ms，P95 {stats['wait_p95'] * 1000:.0f}ms",
+            f"⚙ 图片处理耗时: 平均 {stats['run_avg'] * 1000:.0f}ms，P95 {stats['run_p95'] * 1000:.0f}ms",
+        ]
+        if self.auto_layout:
+            lines.append(
+                f"🧭 面板定位: 成功 {stats['detected']}，按默认比例 {stats['undetected']}，"
+                f"耗时 平均 {stats['detect_avg'] * 1000:.1f}ms，P95 {stats['detect_p95'] * 1000:.1f}ms"
+            )
+        if self.local_ocr is not None:
+            lines.append(
+                f"🔢 本地识别: 结果不可靠 {self.local_stats['unreliable']} 次，"
+                f"改用OCR服务 {self.local_stats['fallback']} 次"
+            )
+        lines.append(
+            f"🔁 区域重试: {self.region_stats['retries']} 次，重试成功 {self.region_stats['recovered']}，"
+            f"低可信度 {self.region_stats['low_confidence']}，失败 {self.region_stats['failed']}"
+        )
+        if self.result_cache:
+            lines.append(f"💾 识别缓存: 命中 {self.result_cache.hits}，未命中 {self.result_cache.misses}")
+        yield event.plain_result("\n".join(lines))
+
     @filter.event_message_type(EventMessageType.ALL)
     async def handle_image(self, event: AstrMessageEvent):
         """处理所有消息，检查是否为图片消息或退出指令"""
         user_id = event.get_sender_id()
 
+        # 批量识别会话中的消息单独处理
+        if user_id in self.batch_sessions:
+            async for result in self.handle_batch_message(event):
+                yield result
+            return
+
         # 首先检查退出指令
         if user_id in self.waiting_for_image and event.get_message_outline().strip().lower() == "q":
             # 清除等待状态
@@ -113,191 +240,377 @@ class BaoXiangPlugin(Star):
 
         message_chain = event.get_messages()
         logger.info(f"用户 {user_id} 发送了图片消息")
-        logger.info(message_chain)
+        # 不输出完整的消息链，Base64 图片可能有数MB
+        logger.info(f"消息组件: {[getattr(msg, 'type', '') for msg in message_chain]}")
         # with open(f"data/{uuid.uuid4()}.txt", "w") as f:
         #     f.write(str(message_chain))
         #     logger.info(f"文本保存成功: {f.name}")
 
-        image_path = None
-        image_url = None
-
-        for msg in message_chain:
-            if getattr(msg, 'type', '') == 'Image':
-                try:
-                    # 1. 优先处理URL图片
-                    if hasattr(msg, 'url') and msg.url:
-                        if msg.url.startswith("http"):
-                            image_url = msg.url
-                        else:
-                            image_path = msg.url
-                        break
-
-                    # 2. 其次处理Base64图片
-                    if hasattr(msg, 'file') and msg.file:
-                        logger.info({msg.file})
-                        image_path = await self.save_base64_image(msg.file)
-                        break
-                except Exception as e:
-                    logger.error(f"图片处理失败: {str(e)}")
-                    yield event.plain_result("❌ 图片解析失败，请重试")
-                    return
-
-        if not image_path and not image_url:
+        sources = self.extract_images(message_chain)
+        if not sources:
             logger.error("消息中未检测到有效图片")
             yield event.plain_result("❌ 未检测到有效图片格式，请发送标准截图")
             return
 
+        group_id = event.get_group_id() or f"private:{user_id}"
+
+        # 一条消息中有多张截图时按批量识别处理
+        if len(sources) > 1:
+            sources = sources[:self.batch_max_images]
+            yield event.plain_result(f"🔍 开始批量识别 {len(sources)} 张截图...")
+            semaphore = asyncio.Semaphore(max(1, self.batch_concurrency))
+            tasks = [
+                asyncio.create_task(self.recognize_source(source, group_id, user_id, semaphore))
+                for source in sources
+            ]
+            yield event.plain_result(await self.collect_batch(tasks))
+            return
+
         try:
             yield event.plain_result("🔍 开始处理图片...")
 
-            # 下载网络图片
-            if image_url and not image_path:
-                image_path = await self.download_image(image_url)
-
-            # 验证图片大小 (最大5MB)
-            if os.path.getsize(image_path) > 5 * 1024 * 1024:
-                raise ValueError("图片过大，请发送小于5MB的截图")
+            # 读取图片，全程只在内存中处理，超过大小上限或不是图片时立即停止
+            image_data = await self.load_image(sources[0])
 
-            # 处理图片并获取结果
-            result = await self.process_image(image_path)
+            # 排队处理图片并获取结果，群与群、用户与用户之间轮流处理
+            future, position = self.admission.submit(group_id, user_id, lambda: self.process_image(image_data))
+            if position:
+                eta = self.admission.eta(position)
+                logger.info(f"用户 {user_id} 的识别任务排在第 {position} 位，预计等待 {eta:.0f} 秒")
+                yield event.plain_result(f"⏳ 当前识别人数较多，您排在第 {position} 位，预计等待 {eta:.0f} 秒")
+            result = await future
             yield event.plain_result(f"✅ 识别完成\n{result}")
 
+        except IngestError as e:
+            logger.warning(f"图片不符合要求: {str(e)}")
+            yield event.plain_result(f"❌ {str(e)}")
+        except QueueFull as e:
+            logger.warning(f"识别队列已满: {self.admission.queued} 个任务")
+            yield event.plain_result(f"❌ {str(e)}")
         except Exception as e:
             logger.error(f"处理失败: {str(e)}")
             yield event.plain_result(f"❌ 处理失败: {str(e)}")
-        # finally:
-        #     # 清理临时文件
-        #     if image_path and os.path.exists(image_path):
-        #         os.unlink(image_path)
-
-    async def save_base64_image(self, base64_str: str) -> str:
-        pattern = r"base64://"
-        base64_str = re.sub(pattern, "", base64_str)
-        # 进一步移除非Base64字符（只保留字母、数字、+、/、=）
-        base64_str = re.sub(r'[^a-zA-Z0-9+/=]', '', base64_str)
-        logger.info(f"Base64图片保存中: {base64_str}")
-        logger.info({len(base64_str)})
-
-        temp_dir = tempfile.gettempdir()
-        file_name = f"wx_image_{uuid.uuid4().hex}.jpg"
-        temp_path = os.path.join(temp_dir, file_name)
-
-        os.makedirs(temp_dir, exist_ok=True)
 
-        try:
-            decoder = base64.b64decode(base64_str)
-        except binascii.Error as e:
-            raise ValueError(f"Base64解码失败: {str(e)}")
-
-        CHUNK_SIZE = 4096
-        async with aiofiles.open(temp_path, "wb") as f:
-            for i in range(0, len(decoder), CHUNK_SIZE):
-                chunk = decoder[i:i + CHUNK_SIZE]
-                await f.write(chunk)
+    async def handle_batch_message(self, event: AstrMessageEvent):
+        """批量识别会话：收集截图并立即开始识别，收到完成指令、达到数量上限或超时后汇总"""
+        user_id = event.get_sender_id()
+        session = self.batch_sessions[user_id]
+        text = event.get_message_outline().strip().lower()
+
+        if text == "q":
+            del self.batch_sessions[user_id]
+            if user_id in self.batch_timeout_tasks:
+                self.batch_timeout_tasks.pop(user_id).cancel()
+            for task in session["tasks"]:
+                task.cancel()
+            yield event.plain_result("已退出批量识别")
+            return
 
-        logger.info(f"Base64图片保存成功: {temp_path}")
-        return temp_path
+        if text not in ("完成", "ok", "done"):
+            sources = self.extract_images(event.get_messages())
+            if not sources:
+                return
+            room = self.batch_max_images - len(session["tasks"])
+            group_id = event.get_group_id() or f"private:{user_id}"
+            for source in sources[:room]:
+                session["tasks"].append(asyncio.create_task(
+                    self.recognize_source(source, group_id, user_id, session["semaphore"])
+                ))
+            logger.info(f"用户 {user_id} 批量识别已收到 {len(session['tasks'])} 张截图")
+            if len(session["tasks"]) < self.batch_max_images:
+                yield event.plain_result(f"📥 已收到 {len(session['tasks'])} 张截图，可继续发送，发送 '完成' 汇总结果")
+                return
+            if len(sources) > room:
+                yield event.plain_result(f"⚠️ 最多识别 {self.batch_max_images} 张截图，多出的 {len(sources) - room} 张已忽略")
+
+        # 结束会话并汇总结果
+        del self.batch_sessions[user_id]
+        if user_id in self.batch_timeout_tasks:
+            self.batch_timeout_tasks.pop(user_id).cancel()
+        if not session["tasks"]:
+            yield event.plain_result("❌ 未收到截图，批量识别已结束")
+            return
+        yield event.plain_result(f"🔍 正在汇总 {len(session['tasks'])} 张截图的识别结果...")
+        yield event.plain_result(await self.collect_batch(session["tasks"]))
 
-    async def download_image(self, url: str) -> str:
-        """异步下载图片到本地临时文件"""
+    def extract_images(self, message_chain: list) -> list[tuple[str, str]]:
+        """提取消息中的所有图片，返回 [(来源类型 url/path/base64, 值)]"""
+        sources = []
+        for msg in message_chain:
+            if getattr(msg, 'type', '') == 'Image':
+                # 1. 优先处理URL图片
+                if hasattr(msg, 'url') and msg.url:
+                    if msg.url.startswith("http"):
+                        sources.append(("url", msg.url))
+                    else:
+                        sources.append(("path", msg.url))
+                    continue
+
+                # 2. 其次处理Base64图片
+                if hasattr(msg, 'file') and msg.file:
+                    logger.info(f"Base64图片: {len(msg.file)} 字符")
+                    sources.append(("base64", msg.file))
+        return sources
+
+    async def load_image(self, source: tuple[str, str]) -> bytes:
+        """按来源读取图片，返回图片字节"""
+        kind, value = source
+        if kind == "url":
+            return await self.download_image(value)
+        if kind == "path":
+            return await self.ingest.from_path(value)
+        return self.decode_base64_image(value)
+
+    async def recognize_source(self, source: tuple[str, str], group_id: str, user_id: str,
+                               semaphore: asyncio.Semaphore) -> tuple[int, int, int, int, int]:
+        """读取并识别批量中的一张截图，返回 (预设积分, 木头, 白银, 黄金, 铂金)
+
+        semaphore 限制同一批次中同时读取和排队的截图数，一次批量不会占满识别队列
+        """
+        async with semaphore:
+            image_data = await self.load_image(source)
+            future, _ = self.admission.submit(group_id, user_id, lambda: self.recognize(image_data))
+            return await future
+
+    async def collect_batch(self, tasks: list[asyncio.Task]) -> str:
+        """等待批量识别任务完成，汇总为一张表"""
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        succeeded = [result for result in results if not isinstance(result, BaseException)]
+        lines = [
+            f"📊 批量识别完成: 成功 {len(succeeded)}/{len(results)}",
+            "序号 | 木头 | 白银 | 黄金 | 铂金 | 积分 | 轮数 | 还需"
+        ]
+        failures = []
+        totals = [0] * 6
+        for index, result in enumerate(results, 1):
+            if isinstance(result, BaseException):
+                reason = "已取消" if isinstance(result, asyncio.CancelledError) else str(result)
+                logger.warning(f"批量识别第 {index} 张失败: {reason}")
+                failures.append(f"❌ 第 {index} 张: {reason}")
+                continue
+            pre_code, wooden, silver, gold, platinum = result
+            total, rounds, surplus = self.score(wooden, silver, gold, platinum, pre_code)
+            row = (wooden, silver, gold, platinum, total, rounds)
+            totals = [a + b for a, b in zip(totals, row)]
+            lines.append(f"{index} | {' | '.join(str(value) for value in row)} | {surplus}")
+        if len(succeeded) > 1:
+            lines.append(f"合计 | {' | '.join(str(value) for value in totals)} | -")
+        return "\n".join(lines + failures)
+
+    def decode_base64_image(self, base64_str: str) -> bytes:
+        """解码Base64图片，返回图片字节"""
+        return self.ingest.from_base64(base64_str)
+
+    async def download_image(self, url: str) -> bytes:
+        """异步流式下载图片到内存"""
         if not self.session:
             self.session = aiohttp.ClientSession()
 
         try:
-            async with self.session.get(url) as response:
-                if response.status != 200:
-                    raise Exception(f"下载图片失败: HTTP {response.status}")
-
-                # 创建临时文件
-                _, ext = os.path.splitext(url)
-                if not ext or ext not in [".jpg", ".jpeg", ".png"]:
-                    ext = ".jpg"
-
-                temp_dir = tempfile.gettempdir()
-                file_name = f"download_{uuid.uuid4().hex}{ext}"
-                temp_path = os.path.join(temp_dir, file_name)
-
-                # 使用 aiofiles 异步写入
-                async with aiofiles.open(temp_path, "wb") as f:
-                    # 分块读取和写入，优化大文件处理
-                    CHUNK_SIZE = 1024 * 1024  # 1MB 分块
-                    while True:
-                        chunk = await response.content.read(CHUNK_SIZE)
-                        if not chunk:
-                            break
-                        await f.write(chunk)
-
-                return temp_path
-
+            return await self.ingest.from_url(self.session, url)
+        except IngestError:
+            raise
         except Exception as e:
             logger.error(f"图片下载失败: {str(e)}")
             raise Exception("图片下载失败，请重试")
 
-    async def process_image(self, image_path: str) -> str:
+    async def process_image(self, image_data: bytes) -> str:
         """处理图片并返回结果"""
-        cut1_path, cut2_path = None, None
+        pre_code, wooden, silver, gold, platinum = await self.recognize(image_data)
+        # 计算积分
+        return await asyncio.to_thread(
+            self.calculate_result, wooden, silver, gold, platinum, pre_code
+        )
+
+    async def recognize(self, image_data: bytes) -> tuple[int, int, int, int, int]:
+        """识别图片，返回 (预设积分, 木头, 白银, 黄金, 铂金)"""
         try:
             # 1. 裁剪图片
-            cut1_path, cut2_path = await asyncio.to_thread(self.crop_image, image_path)
-
-            # 2. 异步并发执行OCR识别
-            cut1_text, cut2_text = await asyncio.gather(
-                self.async_ocr_text(cut1_path),
-                self.async_ocr_text(cut2_path)
-            )
-
-            # 3. 数据解析
-            pre_code = await asyncio.to_thread(self.parse_pre_code, cut1_text)
-            wooden, silver, gold, platinum = await asyncio.to_thread(
-                self.parse_materials, cut2_text
-            )
-
-            # 4. 计算积分
-            return await asyncio.to_thread(
-                self.calculate_result, wooden, silver, gold, platinum, pre_code
-            )
+            # 本地识别没有请求次数限制，无需拼接
+            stitch = self.ocr_mode == "stitch" and self.local_ocr is None
+            crops = await self.crop_image(image_data, stitch, self.result_cache is not None)
+
+            # 2. 相同截图直接使用缓存的结果
+            cached = self.result_cache.get(crops["fingerprint"]) if self.result_cache else None
+            if cached:
+                logger.info(f"命中识别缓存: {cached}")
+                return cached
+
+            # 3. OCR识别并解析数据，拼接模式只需一次请求
+            parsed = None
+            if crops["stitched"]:
+                parsed = await self._ocr_stitched(crops)
+            if parsed is None:
+                parsed = await self._ocr_separately(crops)
+            pre_code, (wooden, silver, gold, platinum), confidence = parsed
+            result = (pre_code, wooden, silver, gold, platinum)
+            # 只缓存可信的结果，纠正过误识别字符的结果在重发时重新识别
+            if self.result_cache and confidence >= 1:
+                self.result_cache.put(crops["fingerprint"], result)
+            return result
 
         finally:
             logger.info("图片处理完成")
-            # 清理临时文件
-            for path in [cut1_path, cut2_path]:
-                if path and os.path.exists(path):
-                    os.unlink(path)
-
-    def crop_image(self, image_path: str) -> tuple[str, str]:
-        """裁剪图片并返回路径"""
-        try:
-            # 允许加载截断的图片
-            from PIL import ImageFile
-            ImageFile.LOAD_TRUNCATED_IMAGES = True
-
-            img = Image.open(image_path)
-            img.load()  # 强制加载所有数据
-            width, height = img.size
 
-            # 顶部区域（预设积分）
-            box_top = (0, int(height * 0.15), int(width * 0.5), int(height * 0.3))
-            # 底部区域（宝箱数量）
-            box_bottom = (0, int(height * 0.75), width, int(height * 0.87))
-
-            # 创建临时文件
-            dir_path = os.path.dirname(image_path)
-            cut1_path = os.path.join(dir_path, f"cut1_{uuid.uuid4().hex}.jpg")
-            cut2_path = os.path.join(dir_path, f"cut2_{uuid.uuid4().hex}.jpg")
+    async def _ocr_separately(self, crops: dict) -> tuple[int, tuple[int, int, int, int], float]:
+        """两个区域分别OCR识别，返回 (预设积分, 宝箱数量, 两个区域中较低的可信度)"""
+        # 异步并发执行OCR识别
+        (pre_code, top_confidence), (materials, bottom_confidence) = await asyncio.gather(
+            self._recognize_region("top", crops["top"]),
+            self._recognize_region("bottom", crops["bottom"])
+        )
+        return pre_code, materials, min(top_confidence, bottom_confidence)
 
-            # 裁剪并保存
-            img.crop(box_top).save(cut1_path)
-            img.crop(box_bottom).save(cut2_path)
+    async def _ocr_stitched(self, crops: dict) -> Optional[tuple[int, tuple[int, int, int, int], float]]:
+        """对拼接图进行一次OCR识别，按文字行的位置拆回两个区域，无法拆分时返回None
 
-            return cut1_path, cut2_path
+        拆分后某个区域无法解析时，只对该区域重新识别
+        """
+        try:
+            lines = await self.async_ocr_lines(crops["stitched"], "stitched.jpg")
+            texts = self.split_stitched_text(lines, crops["split_top"], crops["split_bottom"])
+            if texts is None:
+                raise ValueError("文字行跨越分隔区域或缺少坐标")
+        except Exception as e:
+            logger.warning(f"拼接识别失败，回退为分别识别: {str(e)}")
+            return None
 
+        top = bottom = None
+        try:
+            top = self.score_pre_code(texts[0])
+        except ValueError as e:
+            logger.warning(f"cut1 拼接识别结果无法解析: {str(e)}")
+        try:
+            bottom = self.score_materials(texts[1])
+        except ValueError as e:
+            logger.warning(f"cut2 拼接识别结果无法解析: {str(e)}")
+        (pre_code, top_confidence), (materials, bottom_confidence) = await asyncio.gather(
+            self._recognize_region("top", crops["top"], top),
+            self._recognize_region("bottom", crops["bottom"], bottom)
+        )
+        return pre_code, materials, min(top_confidence, bottom_confidence)
+
+    async def _recognize_region(self, region: str, image_data: bytes, prior: Optional[tuple] = None) -> tuple:
+        """识别并解析单个区域，无法解析时只重试该区域，返回 (结果, 可信度)
+
+        region: "top" 预设积分 / "bottom" 宝箱数量
+        prior: 已解析出的 (结果, 可信度) (例如拼接识别拆分出的结果)，直接返回
+        依次尝试: 原图 -> 二值化放大后的图片 -> 换用其他OCR引擎识别原图，解析成功即返回。
+        纠正过误识别字符的结果 (可信度0.5) 不再重试，只是不写入识别缓存
+        """
+        score = self.score_pre_code if region == "top" else self.score_materials
+        name = "cut1" if region == "top" else "cut2"
+        if prior is not None:
+            if prior[1] < 1:
+                self.region_stats["low_confidence"] += 1
+            return prior
+
+        attempts = [("原图", "2")]
+        if self.region_retry:
+            attempts.append(("二值化放大", None))
+            if self.local_ocr is None and self.retry_ocr_engine and self.retry_ocr_engine != "2":
+                attempts.append((f"OCR引擎{self.retry_ocr_engine}", self.retry_ocr_engine))
+
+        errors = []
+        for index, (label, engine) in enumerate(attempts):
+            if index:
+                self.region_stats["retries"] += 1
+            try:
+                if engine is None:
+                    data = await self.image_stage.preprocess(image_data)
+                    text = await self.async_ocr_text(data, f"{name}.png")
+                else:
+                    text = await self.async_ocr_text(image_data, f"{name}.jpg", engine)
+                value, confidence = score(text)
+            except Exception as e:
+                logger.warning(f"{name} 第{index + 1}次识别失败 ({label}): {str(e)}")
+                errors.append(str(e))
+                continue
+
+            if index:
+                self.region_stats["recovered"] += 1
+                logger.info(f"{name} 重试识别成功 ({label}): {value}")
+            if confidence < 1:
+                self.region_stats["low_confidence"] += 1
+                logger.info(f"{name} 识别结果纠正了误识别字符 ({label}): {value}")
+            return value, confidence
+
+        self.region_stats["failed"] += 1
+        raise ValueError(errors[-1] if errors else f"{name} 识别失败")
+
+    def split_stitched_text(self, lines: list[tuple[str, float, float]], split_top: int,
+                            split_bottom: int) -> Optional[tuple[str, str]]:
+        """按行坐标将拼接图的OCR结果拆分为顶部和底部文本
+
+        lines: [(行文本, 行顶部y, 行底部y)]
+        split_top/split_bottom: 分隔区域的上下边界，行必须完整落在分隔区域中线的一侧，
+        跨越中线说明两个区域的文字被合并为同一行，无法可靠拆分
+        """
+        middle = (split_top + split_bottom) / 2
+        top_lines, bottom_lines = [], []
+        for text, line_top, line_bottom in lines:
+            if line_bottom <= middle:
+                top_lines.append(text)
+            elif line_top >= middle:
+                bottom_lines.append(text)
+            else:
+                return None
+        if not top_lines or not bottom_lines:
+            return None
+        return "\n".join(top_lines), "\n".join(bottom_lines)
+
+    async def crop_image(self, image_data: bytes, stitch: bool = False, with_fingerprint: bool = False) -> dict:
+        """在图片处理进程中解码并裁剪两个区域，返回结构见 image_stage.crop_image"""
+        try:
+            crops = await self.image_stage.crop(
+                image_data, stitch, with_fingerprint, self.decode_min_width, self.auto_layout
+            )
+        except StageBusy:
+            logger.warning(f"图片处理队列已满: {self.image_stage.pending} 个任务")
+            raise
         except Exception as e:
             logger.error(f"图片裁剪失败: {str(e)}")
             raise Exception("图片处理失败，请确保发送的是有效的游戏截图")
+        if self.auto_layout and not crops["detected"]:
+            logger.info("未检测到面板，按默认比例裁剪")
+        logger.info(f"图片裁剪完成: 解码尺寸 {crops['size']}，耗时 {crops['elapsed'] * 1000:.1f}ms")
+        return crops
 
-    async def async_ocr_text(self, image_path: str) -> str:
+    async def async_ocr_text(self, image_data: bytes, filename: str = "image.jpg", engine: str = "2") -> str:
         """异步OCR识别文本"""
-        logger.info(f"使用异步OCR处理图片: {image_path}")
+        result = await self._ocr_request(image_data, filename, engine=engine)
+        return result["ParsedText"]
+
+    async def async_ocr_lines(self, image_data: bytes, filename: str = "image.jpg") -> list[tuple[str, float, float]]:
+        """异步OCR识别文本行及其坐标，返回 [(行文本, 行顶部y, 行底部y)]"""
+        result = await self._ocr_request(image_data, filename, overlay=True)
+        try:
+            return [
+                (line["LineText"], float(line["MinTop"]), float(line["MinTop"]) + float(line["MaxHeight"]))
+                for line in result["TextOverlay"]["Lines"]
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"解析OCR文字坐标失败: {str(e)}")
+            raise Exception("OCR响应缺少文字坐标")
+
+    async def _ocr_request(self, image_data: bytes, filename: str, overlay: bool = False, engine: str = "2") -> dict:
+        """请求OCR服务，返回第一个识别结果"""
+        if self.local_ocr is not None:
+            result = await asyncio.to_thread(self._local_ocr_request, image_data)
+            if result is not None:
+                return result
+            # 本地识别的数字与多个模板同样接近时，不返回可能错误的结果
+            self.local_stats["unreliable"] += 1
+            if not self.ocr_url:
+                logger.warning(f"本地识别结果不可靠: {filename}")
+                raise Exception("本地识别结果不可靠，请发送更清晰的截图")
+            self.local_stats["fallback"] += 1
+            logger.warning(f"本地识别结果不可靠，改用OCR服务: {filename}")
+
+        throttled = await self.ocr_limiter.acquire()
+        if throttled:
+            logger.info(f"OCR请求限速，等待 {throttled:.2f} 秒")
+        logger.info(f"使用异步OCR处理图片: {filename} ({len(image_data)} 字节)")
 
         if not self.session:
             self.session = aiohttp.ClientSession()
@@ -306,13 +619,11 @@ class BaoXiangPlugin(Star):
         data = aiohttp.FormData()
         data.add_field('apikey', self.ocr_key)
         data.add_field('language', 'chs')
-        data.add_field('OCREngine', '2')
-
-        # 使用 aiofiles 异步读取图片文件
-        async with aiofiles.open(image_path, "rb") as f:
-            image_data = await f.read()
+        data.add_field('OCREngine', engine)
+        if overlay:
+            data.add_field('isOverlayRequired', 'true')
 
-        data.add_field('file', image_data, filename=os.path.basename(image_path))
+        data.add_field('file', image_data, filename=filename)
 
         try:
             async with self.session.post(url, data=data) as response:
@@ -322,7 +633,7 @@ class BaoXiangPlugin(Star):
                     raise Exception(f"OCR服务错误: HTTP {response.status}")
 
                 response_data = await response.json()
-                return response_data["ParsedResults"][0]["ParsedText"]
+                return response_data["ParsedResults"][0]
 
         except (KeyError, IndexError) as e:
             logger.error(f"解析OCR响应失败: {str(e)}")
@@ -337,26 +648,55 @@ class BaoXiangPlugin(Star):
             logger.error(f"OCR请求失败: {str(e)}")
             raise Exception("OCR服务请求失败")
 
+    def _local_ocr_request(self, image_data: bytes) -> Optional[dict]:
+        """本地识别，返回与OCR服务相同结构的结果，结果不可靠时返回None"""
+        try:
+            lines, reliable = self.local_ocr.read(image_data)
+        except Exception as e:
+            logger.error(f"本地识别失败: {str(e)}")
+            raise Exception("本地识别失败")
+        if not reliable:
+            return None
+        return {
+            "ParsedText": "\n".join(text for text, _, _ in lines),
+            "TextOverlay": {
+                "Lines": [
+                    {"LineText": text, "MinTop": top, "MaxHeight": bottom - top}
+                    for text, top, bottom in lines
+                ]
+            }
+        }
+
+    # OCR常见的数字误识别
+    DIGIT_FIXES = str.maketrans({"o": "0", "O": "0", "l": "1", "L": "1", "I": "1", "i": "1", "|": "1", "!": "1"})
+
     def parse_pre_code(self, text: str) -> int:
         """解析预设积分"""
-        match = re.search(r"\d+", text)
+        return self.score_pre_code(text)[0]
+
+    def score_pre_code(self, text: str) -> tuple[int, float]:
+        """解析预设积分，返回 (预设积分, 可信度)，需要纠正误识别字符时可信度为0.5"""
+        match = re.search(r"[\dOoIl|!]*\d[\dOoIl|!]*", text)
         if not match:
             raise ValueError("无法解析预设积分")
-        return int(match.group())
+        token = match.group()
+        return int(token.translate(self.DIGIT_FIXES)), 1.0 if token.isdigit() else 0.5
 
     def parse_materials(self, text: str) -> tuple[int, int, int, int]:
         """解析四种宝箱数量"""
+        return self.score_materials(text)[0]
+
+    def score_materials(self, text: str) -> tuple[tuple[int, int, int, int], float]:
+        """解析四种宝箱数量，返回 (宝箱数量, 可信度)
+
+        每行都是纯数字 (允许空格和千分位逗号) 时可信度为1，需要纠正误识别字符或丢弃其他字符时为0.5
+        """
         lines = [line.strip() for line in text.splitlines() if line.strip()]
         if len(lines) < 4:
             raise ValueError(f"OCR结果行数不足: {text}")
 
-        cleaned = [
-            line.replace("o", "0").replace("O", "0")
-            .replace("l", "1").replace("L", "1")
-            .replace("I", "1").replace("i", "1")
-            .replace("|", "1").replace("!", "1")
-            for line in lines[:4]
-        ]
+        exact = all(re.fullmatch(r"[\d\s,]+", line) for line in lines[:4])
+        cleaned = [line.translate(self.DIGIT_FIXES) for line in lines[:4]]
 
         # 仅保留数字字符
         cleaned = [re.sub(r"[^\d]", "", line) for line in cleaned]
@@ -365,13 +705,14 @@ class BaoXiangPlugin(Star):
         if any(not line for line in cleaned):
             raise ValueError(f"OCR结果包含无效数字: {cleaned}")
 
-        return (
+        values = (
             int(cleaned[0]), int(cleaned[1]),
             int(cleaned[2]), int(cleaned[3])
         )
+        return values, 1.0 if exact else 0.5
 
-    def calculate_result(self, wooden: int, silver: int, gold: int, platinum: int, pre_code: int) -> str:
-        """计算并返回结果字符串"""
+    def score(self, wooden: int, silver: int, gold: int, platinum: int, pre_code: int) -> tuple[int, int, int]:
+        """计算 (当前积分, 可完成轮数, 下一轮还需积分)"""
         total = wooden + silver * 10 + gold * 20 + platinum * 50
         NEED_CODE = 3340  # 一轮所需积分
         adjusted_code = self.adjust_pre_code(pre_code)
@@ -384,6 +725,11 @@ class BaoXiangPlugin(Star):
         else:
             surplus = adjusted_code - total
             rounds = 0
+        return total, rounds, surplus
+
+    def calculate_result(self, wooden: int, silver: int, gold: int, platinum: int, pre_code: int) -> str:
+        """计算并返回结果字符串"""
+        total, rounds, surplus = self.score(wooden, silver, gold, platinum, pre_code)
 
         return (
             f"📦 木头箱: {wooden}\n"
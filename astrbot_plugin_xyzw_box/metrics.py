@@ -0,0 +1,9 @@
+from typing import Iterable, Tuple
+
+
+def mean_p95(samples: Iterable[float]) -> Tuple[float, float]:
+    """计算样本的平均值和 P95，没有样本时均为 0"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0, 0.0
+    return sum(ordered) / len(ordered), ordered[max(0, int(len(ordered) * 0.95) - 1)]